@@ -1,4 +1,5 @@
 #! /usr/bin/env python
+# -*- coding: utf-8 -*-
 
 # SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
 # Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
@@ -20,114 +21,168 @@
 
 import sys
 import os
-import yaml
 import approx_common
 import time
+import numpy as np
 
 from optparse import OptionParser
-from schedule_common import Core, GPU, MoldSchedule, TaskRect
-
-in_data = None
-seq_only = False
-
-def get_parallel_time_cpu(task_str):
-    global in_data
-    global seq_only
+from schedule_common import Core, GPU, PUQueue, PUIntervals, MoldSchedule, TaskRect, get_pid_blocks
+from instance_common import as_scheduling_instance
+from schedule_validation import check_schedule
+from instrumentation import get_profiler, finish_profiler
 
+def get_parallel_times_cpu(instance, seq_only):
+    # best CPU time of every task (on one core if seq_only)
     if seq_only:
-        ptime = in_data["cpudata"][task_str][0]
-    else:
-        ptime = min(in_data["cpudata"][task_str])
-
-    return ptime
-
-
-def get_time_gpu(task_str):
-    global in_data
-    return in_data["gpudata"][task_str]
-
-def lpt_first(a, b):
-    global in_data
-
-    cpu_a = get_parallel_time_cpu(a)
-    gpu_a = get_time_gpu(a)
-    #max_a = max(cpu_a, gpu_a)
-    max_a = min(cpu_a, gpu_a)
-
-    cpu_b = get_parallel_time_cpu(b)
-    gpu_b = get_time_gpu(b)
-    #max_b = max(cpu_b, gpu_b)
-    max_b = min(cpu_b, gpu_b)
-
-    if max_a - max_b < 0:
-        ret = 1
-    elif max_a - max_b > 0:
-        ret = -1
-    else:
-        ret = 0
+        return instance.get_seq_times()
+    return instance.get_min_cpu_times()
+
+def order_by_key_desc(instance, key):
+    # task ids by decreasing key, ties keep the task order
+    return instance.task_ids[np.argsort(-key, kind="mergesort")].tolist()
+
+def lpt_order(instance, seq_only):
+    #ptime = np.maximum(get_parallel_times_cpu(instance, seq_only), instance.gpudata)
+    ptime = np.minimum(get_parallel_times_cpu(instance, seq_only), instance.gpudata)
+    return order_by_key_desc(instance, ptime)
+
+def spt_order(instance, seq_only):
+    task_id_list = lpt_order(instance, seq_only)
+    task_id_list.reverse()
+    return task_id_list
+
+def largest_ratio_order(instance, seq_only):
+    ratio = get_parallel_times_cpu(instance, seq_only) / instance.gpudata
+    return order_by_key_desc(instance, ratio)
+
+# prio name -> function(instance, seq_only) returning the task ids
+# in the order in which they are scheduled
+priorities = {
+    "lpt"   : lpt_order,
+    "spt"   : spt_order,
+    "ratio" : largest_ratio_order
+}
+
+def register_priority(prio, order_func):
+    priorities[prio] = order_func
+
+
+def place_by_insertion(in_data, task_id_list, seq_only, schedule):
+    """
+    Insertion policy of build_heft_schedule: the PUs keep their idle
+    gaps (PUIntervals) and a task goes where it finishes first, into the
+    earliest gap that fits if that is not later than behind a PU. Both
+    lookups cost O(log) per task.
+
+    Unless seq_only, a CPU task runs on one core or on the p cores that
+    free up first, for the p (1..m) with the earliest finish time, and
+    the cores that free up before the p-th one get a gap. Comparing the
+    m allotments takes O(m) per task. Gaps belong to one PU, so only
+    one-core and GPU placements fill them. With seq_only every task
+    starts at the lasttime of its PU, no gap opens and the schedule is
+    the one of the append policy.
+
+    Returns the number of tasks put into gaps.
+    """
+    m = in_data.m
+    # only one-core and GPU placements fill gaps, shorter gaps stay empty
+    min_seq_time = min_gpu_time = 0.0
+    if in_data.n > 0:
+        min_seq_time = float(in_data.get_seq_times().min())
+        min_gpu_time = float(in_data.gpudata.min())
+    core_index = PUIntervals(m, min_seq_time)
+    gpu_index = PUIntervals(in_data.k, min_gpu_time)
+    all_procs = np.arange(1, m+1)
+    nb_gap_fills = 0
 
-    return ret
+    for task_id in task_id_list:
 
-def largest_ratio_first(a, b):
-    global in_data
+        chosen_arch_id = Core.arch_id
+
+        # one core, in a gap or behind a core
+        seq_time = in_data.get_seq_time(task_id)
+        eft_best, selected_pid, selected_gap = core_index.earliest_finish(seq_time)
+        selected_nb_cores = 1
+
+        if not seq_only and m > 1:
+            # p cores from the p-th smallest lasttime on
+            order = core_index.get_order()
+            times = in_data.get_times_by_procs(np.full(m, task_id-1, dtype=np.int64), all_procs)
+            efts = core_index.lasttimes[order] + times
+            nb_cores = int(np.argmin(efts)) + 1
+            if efts[nb_cores-1] < eft_best:
+                eft_best = float(efts[nb_cores-1])
+                selected_nb_cores = nb_cores
+
+        if len(gpu_index) > 0:
+            gpu_time = in_data.get_gpu_time(task_id)
+            eft_gpu, gpu_pid, gpu_gap = gpu_index.earliest_finish(gpu_time)
+            if eft_gpu < eft_best:
+                chosen_arch_id = GPU.arch_id
+                eft_best = eft_gpu
 
-    ret = 0
+        if approx_common.debug == 1:
+            print "task", task_id, "arch", chosen_arch_id, "nb_cores", selected_nb_cores, "eft", eft_best
 
-    cpu_a = get_parallel_time_cpu(a)
-    gpu_a = get_time_gpu(a)
-    ratio_a = cpu_a / gpu_a
+        if chosen_arch_id == GPU.arch_id:
+            index, pids, gap, duration = gpu_index, [ gpu_pid ], gpu_gap, gpu_time
+        elif selected_nb_cores == 1:
+            index, pids, gap, duration = core_index, [ selected_pid ], selected_gap, seq_time
+        else:
+            index, pids, gap = core_index, order[:selected_nb_cores].tolist(), None
 
-    cpu_b = get_parallel_time_cpu(b)
-    gpu_b = get_time_gpu(b)
-    ratio_b = cpu_b / gpu_b
+        if gap != None:
+            task_start_time = index.fill_gap(gap, duration)
+            nb_gap_fills += 1
+        else:
+            task_start_time = float(index.lasttimes[pids].max())
+            index.append(pids, task_start_time, eft_best)
+        resources = get_pid_blocks(pids)
 
-    if ratio_a - ratio_b < 0:
-        ret = 1
-    elif ratio_a - ratio_b > 0:
-        ret = -1
-    else:
-        ret = 0
+        # 0 in 3rd means nothing (simply a computation)
+        task_rect = TaskRect(task_id, chosen_arch_id, 0)
+        task_rect.set_procs(resources)
+        task_rect.set_times(task_start_time, eft_best)
 
-    return ret
+        schedule.add_task_rect(task_rect)
 
+    return nb_gap_fills
 
-def build_heft_schedule(input_data, sequential_only, prio, jedfile, csvfile=None):
-    global in_data
-    global seqonly
 
-    in_data = input_data
+def build_heft_schedule(input_data, sequential_only, prio, jedfile, csvfile=None, insertion=False):
+    in_data = as_scheduling_instance(input_data)
     seq_only = sequential_only
 
     approx_common.init_system()
 
-    start_time = time.clock()
+    prof = get_profiler("build_heft_schedule")
+    if prof != None:
+        prof.start_phase("setup")
 
-    nb_tasks = int(input_data["meta"]["n"])
-    Core.nb_pus = int(input_data["meta"]["m"])
-    GPU.nb_pus = int(input_data["meta"]["k"])
+    start_time = time.time()
 
-    # gimme m cores and k GPUs
-    cores = [ Core(i) for i in xrange(0, Core.nb_pus) ]
-    gpus  = [ GPU(i) for i in xrange(0, GPU.nb_pus) ]
+    nb_tasks = in_data.n
+    Core.nb_pus = in_data.m
+    GPU.nb_pus = in_data.k
 
     schedule = MoldSchedule(Core.nb_pus, GPU.nb_pus)
 
-    task_id_list = []
-    for i in xrange(0, nb_tasks):
-        task_id = approx_common.get_task_str(i+1)
-        task_id_list.append(task_id)
+    task_id_list = in_data.task_ids.tolist()
 
     if approx_common.debug == 1:
         print "unsorted:", task_id_list
 
+    if prof != None:
+        prof.start_phase("order")
+
+    nb_sorts = 0
     if prio != None:
-        if prio == "lpt":
-            task_id_list.sort(cmp=lpt_first)
-        elif prio == "spt":
-            task_id_list.sort(cmp=lpt_first)
-            task_id_list.reverse()
-        elif prio == "ratio":
-            task_id_list.sort(cmp=largest_ratio_first)
+        if prio in priorities:
+            # the cmp comparators read a module-level seq_only that was
+            # never set, so tasks are ranked by their best parallel time
+            # in both modes
+            task_id_list = priorities[prio](in_data, False)
+            nb_sorts = int(nb_tasks > 1)
         else:
             print >> sys.stderr, "unknown prio option:", prio
     else:
@@ -138,89 +193,114 @@ def build_heft_schedule(input_data, sequential_only, prio, jedfile, csvfile=None
 
     if approx_common.debug == 1:
         if prio == "ratio":
-            for i in xrange(0, nb_tasks):
-                task_id = approx_common.get_task_str(i+1)
-                cpu_a = get_parallel_time_cpu(task_id)
-                gpu_a = get_time_gpu(task_id)
-                ratio_a = cpu_a / gpu_a
-                print "task", task_id, "ratio:", ratio_a
+            ratio = get_parallel_times_cpu(in_data, False) / in_data.gpudata
+            for task_id in in_data.task_ids.tolist():
+                print "task", task_id, "ratio:", float(ratio[task_id-1])
 
-    for task_id in task_id_list:
+    if prof != None:
+        prof.start_phase("placement")
 
-        task_idx = task_id.replace("t", "")
+    nb_gap_fills = 0
+    if insertion:
+        nb_gap_fills = place_by_insertion(in_data, task_id_list, seq_only, schedule)
+    else:
+        # gimme m cores and k GPUs
+        cores = [ Core(i) for i in xrange(0, Core.nb_pus) ]
+        gpus  = [ GPU(i) for i in xrange(0, GPU.nb_pus) ]
 
-        if approx_common.debug == 1:
-            print "scheduling", task_id
-        chosen_device_id = 0
+        # earliest available PUs first
+        core_queue = PUQueue(cores)
+        gpu_queue  = PUQueue(gpus)
+
+        for task_id in task_id_list:
 
-        selected_core_idx = 0
-        selected_nb_cores = Core.nb_pus
-        eft_best = sys.float_info.max
+            if approx_common.debug == 1:
+                print "scheduling", task_id
+            chosen_device_id = 0
 
-        if seq_only:
+            selected_core_idx = 0
+            selected_nb_cores = Core.nb_pus
+            selected_core = None
+            selected_gpu  = None
+            eft_best = sys.float_info.max
 
-            selected_nb_cores = 1
+            if seq_only:
 
-            for core_idx in xrange(0, Core.nb_pus):
-                eft_core = cores[core_idx].get_lasttime() + input_data["cpudata"][task_id][0]
-                if eft_core < eft_best:
-                    eft_best = eft_core
-                    selected_core_idx = core_idx
+                selected_nb_cores = 1
+                seq_time = in_data.get_seq_time(task_id)
 
-        else:
-            eft_best = cores[0].get_lasttime() + input_data["cpudata"][task_id][Core.nb_pus-1]
+                if len(core_queue) > 0:
+                    eft_best, selected_core = core_queue.pop(seq_time)
+                    selected_core_idx = selected_core.get_pid()
 
-        if approx_common.debug == 1:
-            print "eft cpu", eft_best
+            else:
+                eft_best = cores[0].get_lasttime() + in_data.get_time_by_procs(task_id, Core.nb_pus)
 
-        for gpu_id in xrange(0, GPU.nb_pus):
-            device_id = gpu_id + 1
-            eft_current = gpus[gpu_id].get_lasttime() + input_data["gpudata"][task_id]
             if approx_common.debug == 1:
-                print "eft gpu", gpu_id, " : ", eft_current
-            if eft_current < eft_best:
-                chosen_device_id = device_id
-                eft_best = eft_current
+                print "eft cpu", eft_best
 
-        if chosen_device_id == 0:
+            if len(gpu_queue) > 0:
+                eft_gpu, selected_gpu = gpu_queue.pop(in_data.get_gpu_time(task_id))
+                if approx_common.debug == 1:
+                    print "eft gpu", selected_gpu.get_pid(), " : ", eft_gpu
+                if eft_gpu < eft_best:
+                    chosen_device_id = selected_gpu.get_pid() + 1
+                    eft_best = eft_gpu
 
-            if seq_only:
+            if chosen_device_id == 0:
 
-                task_start_time = cores[selected_core_idx].get_lasttime()
-                task_end_time   = eft_best
+                if seq_only:
+
+                    task_start_time = cores[selected_core_idx].get_lasttime()
+                    task_end_time   = eft_best
+
+                    cores[selected_core_idx].set_lasttime(eft_best)
+
+                else:
+
+                    task_start_time = cores[0].get_lasttime()
+                    task_end_time   = eft_best
 
-                cores[selected_core_idx].set_lasttime(eft_best)
+                    for core in cores:
+                        core.set_lasttime(eft_best)
+
+                # 0 in 3rd means nothing (simply a computation)
+                task_rect = TaskRect(task_id, Core.arch_id, 0)
+                task_rect.set_procs([(selected_core_idx, selected_nb_cores)])
+                task_rect.set_times(task_start_time, task_end_time)
+
+                schedule.add_task_rect(task_rect)
 
             else:
 
-                task_start_time = cores[0].get_lasttime()
+                task_start_time = gpus[chosen_device_id-1].get_lasttime()
                 task_end_time   = eft_best
 
-                for core in cores:
-                    core.set_lasttime(eft_best)
+                gpus[chosen_device_id-1].set_lasttime(eft_best)
 
-            # 0 in 3rd means nothing (simply a computation)
-            task_rect = TaskRect(task_idx, Core.arch_id, 0)
-            task_rect.set_procs([(selected_core_idx, selected_nb_cores)])
-            task_rect.set_times(task_start_time, task_end_time)
+                # 0 in 3rd means nothing (simply a computation)
+                task_rect = TaskRect(task_id, GPU.arch_id, 0)
+                task_rect.set_procs([(chosen_device_id-1, 1)])
+                task_rect.set_times(task_start_time, task_end_time)
 
-            schedule.add_task_rect(task_rect)
+                schedule.add_task_rect(task_rect)
 
-        else:
+            # put PUs back with their (possibly) new lasttime
+            if selected_core != None:
+                core_queue.push(selected_core)
+            if selected_gpu != None:
+                gpu_queue.push(selected_gpu)
 
-            task_start_time = gpus[chosen_device_id-1].get_lasttime()
-            task_end_time   = eft_best
+    end_time = time.time()
 
-            gpus[chosen_device_id-1].set_lasttime(eft_best)
+    if prof != None:
+        prof.start_phase("checks")
 
-            # 0 in 3rd means nothing (simply a computation)
-            task_rect = TaskRect(task_idx, GPU.arch_id, 0)
-            task_rect.set_procs([(chosen_device_id-1, 1)])
-            task_rect.set_times(task_start_time, task_end_time)
+    if approx_common.validate == 1:
+        check_schedule(in_data, schedule)
 
-            schedule.add_task_rect(task_rect)
-
-    end_time = time.clock()
+    if prof != None:
+        prof.start_phase("output")
 
     if jedfile != None and jedfile != "":
         approx_common.write_jedfile(jedfile, schedule)
@@ -231,12 +311,30 @@ def build_heft_schedule(input_data, sequential_only, prio, jedfile, csvfile=None
     print "total_solve_time:", (end_time-start_time)
     print "prio:", prio
     print "seq_only: %d" % ( int(seq_only) )
+    if insertion:
+        print "insertion: 1"
+        print "gap_fills: %d" % ( nb_gap_fills )
 
     makespan = schedule.get_makespan()
     print "makespan:", makespan
 
+    if prof != None:
+        # every task gets the same EFT queries: one per arch, m for the
+        # p-core allotments of the insertion policy
+        nb_cpu_evaluations = int(in_data.m > 0)
+        if insertion and not seq_only and in_data.m > 1:
+            nb_cpu_evaluations += in_data.m
+        prof.add_count("eft_evaluations", nb_tasks * (nb_cpu_evaluations + int(in_data.k > 0)))
+        prof.add_count("sorts", nb_sorts)
+        prof.add_count("rect_allocations", schedule.get_nb_task_rects())
+        if insertion:
+            prof.add_count("gap_fills", nb_gap_fills)
+        finish_profiler(prof, schedule)
+
     sys.stdout.flush()
 
+    return schedule
+
 if __name__ == "__main__":
 
 
@@ -270,6 +368,12 @@ if __name__ == "__main__":
                        help    = "sequential processing only",
                        default = False )
 
+    parser.add_option( "-g", "--gaps",
+                       action  = "store_true",
+                       dest    = "insertion",
+                       help    = "insertion policy: CPU tasks on the best number of cores, idle gaps are filled (with -s same as without -g)",
+                       default = False )
+
     ( options, args ) = parser.parse_args()
 
     if options.ininst == None or not os.path.exists(options.ininst):
@@ -277,11 +381,6 @@ if __name__ == "__main__":
         parser.print_help()
         sys.exit(1)
 
-    fh = open(options.ininst)
-    input_content = fh.readlines()
-    fh.close()
-    input_content = "".join(input_content)
-
-    input_data = yaml.load(input_content)
+    input_data = approx_common.load_instance(options.ininst)
 
-    build_heft_schedule(input_data, options.prio, options.seqonly, options.jedule)
+    build_heft_schedule(input_data, options.seqonly, options.prio, options.jedfile, insertion=options.insertion)
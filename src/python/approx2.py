@@ -0,0 +1,344 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# greedy 2-approximation without Julia (like approx2.jl)
+#
+# lambda is found by bisection between compute_lowerbound and
+# compute_upperbound of approx_common.jl. At every probe, a task is
+# CPU-only if its GPU time exceeds lambda, GPU-only if no core count
+# meets lambda and hybrid otherwise. GPU-only tasks (by decreasing GPU
+# time), then hybrids (by decreasing CPU time / GPU time) go to the
+# least loaded GPU as long as the GPU work is <= k * lambda. The other
+# tasks go to the gamma least loaded cores by decreasing gamma and must
+# end by 2 * lambda.
+#
+# classification and sorting are array operations over all tasks, and
+# the GPU work is a prefix sum, so a probe only simulates the cores
+# (a heap of their end times). The schedule itself is built once, for
+# the best lambda, with PUHeap, which breaks ties between PUs like the
+# PriorityQueue of approx2.jl.
+
+import sys
+import os
+import time
+import heapq
+import numpy as np
+
+import approx_common
+import bounds
+
+from itertools import izip
+from optparse import OptionParser
+from schedule_common import Core, GPU, MoldSchedule, TaskRect, get_pid_blocks
+from instance_common import as_scheduling_instance
+from schedule_validation import check_schedule
+from instrumentation import get_profiler, finish_profiler
+
+stats = {}
+
+# largest infeasible lambda of the last run, kept out of the printed
+# stats, which are those of approx2.jl
+lower_bound = None
+
+
+class PUHeap:
+    """
+    Min-heap of PUs by lasttime with the sift rules of
+    Collections.PriorityQueue (Julia 0.4), so that PUs with the same
+    lasttime come out in the same order as in approx2.jl.
+    """
+
+    def __init__(self, pus):
+        self.pus = []
+        for pu in pus:
+            self.push(pu)
+
+    def __len__(self):
+        return len(self.pus)
+
+    def push(self, pu):
+        pus = self.pus
+        pus.append(pu)
+        lasttime = pu.lasttime
+        i = len(pus) - 1
+        while i > 0:
+            parent = (i-1) // 2
+            if not lasttime < pus[parent].lasttime:
+                break
+            pus[i] = pus[parent]
+            i = parent
+        pus[i] = pu
+
+    def pop(self):
+        pus = self.pus
+        top = pus[0]
+        pu = pus.pop()
+        nb_pus = len(pus)
+        if nb_pus > 0:
+            lasttime = pu.lasttime
+            i = 0
+            while 2*i + 1 < nb_pus:
+                # the right child wins ties between the children
+                child = 2*i + 1
+                if child + 1 < nb_pus and not pus[child].lasttime < pus[child+1].lasttime:
+                    child += 1
+                if not pus[child].lasttime < lasttime:
+                    break
+                pus[i] = pus[child]
+                i = child
+            pus[i] = pu
+        return top
+
+
+def get_placement(instance, lambval):
+    """
+    Task indices (0-based) in the order in which they go to the GPUs
+    and to the cores at lambval, and gamma of all tasks. None if a task
+    fits neither on the cores nor on a GPU, or if the GPU-only tasks
+    exceed the GPU work.
+    """
+    gpudata = instance.gpudata
+    procs = instance.get_procs_by_lambda_all(lambval)
+    on_gpu = ~(gpudata > lambval)
+    on_cpu = procs <= instance.m
+    if (~on_gpu & ~on_cpu).any():
+        return None
+
+    # sorted by increasing key (stable, like sort in Julia) and taken
+    # from the end
+    gpu_only = np.flatnonzero(on_gpu & ~on_cpu)
+    gpu_only = gpu_only[np.argsort(gpudata[gpu_only], kind="mergesort")][::-1]
+    hybrid = np.flatnonzero(on_gpu & on_cpu)
+    ratio = instance.get_times_by_procs(hybrid, procs[hybrid]) / gpudata[hybrid]
+    hybrid = hybrid[np.argsort(ratio, kind="mergesort")]
+
+    # a task goes to a GPU if the GPU work before it is <= k * lambda
+    to_gpu = np.concatenate((gpu_only, hybrid[::-1]))
+    nb_to_gpu = 0
+    if instance.k > 0 and len(to_gpu) > 0:
+        work = np.cumsum(gpudata[to_gpu])
+        nb_to_gpu = 1 + int(np.searchsorted(work[:-1], lambval * instance.k, side="right"))
+    if nb_to_gpu < len(gpu_only):
+        return None
+
+    to_cpu = np.concatenate((np.flatnonzero(~on_gpu), hybrid[:len(to_gpu)-nb_to_gpu]))
+    to_cpu = to_cpu[np.argsort(procs[to_cpu], kind="mergesort")][::-1]
+
+    return to_gpu[:nb_to_gpu], to_cpu, procs
+
+def cores_fit(instance, tasks, procs, limit):
+    # True if the tasks (in order) end by limit on the gamma least loaded cores
+    heap = [ 0.0 ] * instance.m
+    times = instance.get_times_by_procs(tasks, procs[tasks]).tolist()
+    for duration, nb_cores in izip(times, procs[tasks].tolist()):
+        # start when the nb_cores-th least loaded core is free
+        for i in xrange(1, nb_cores):
+            heapq.heappop(heap)
+        end_time = heap[0] + duration
+        if end_time > limit:
+            return False
+        heapq.heapreplace(heap, end_time)
+        for i in xrange(1, nb_cores):
+            heapq.heappush(heap, end_time)
+    return True
+
+def is_feasible(instance, lambval):
+    placement = get_placement(instance, lambval)
+    if placement == None:
+        return False
+    gpu_tasks, cpu_tasks, procs = placement
+    return cores_fit(instance, cpu_tasks, procs, 2 * lambval)
+
+def build_2approx_schedule(instance, lambval):
+    """
+    Schedule of approx2.jl at lambval, None if lambval is infeasible.
+    """
+    placement = get_placement(instance, lambval)
+    if placement == None:
+        return None
+    gpu_tasks, cpu_tasks, procs = placement
+
+    Core.nb_pus = instance.m
+    GPU.nb_pus = instance.k
+    schedule = MoldSchedule(Core.nb_pus, GPU.nb_pus)
+
+    gpu_heap = PUHeap([ GPU(i) for i in xrange(0, GPU.nb_pus) ])
+    for task_idx, duration in izip(gpu_tasks.tolist(), instance.gpudata[gpu_tasks].tolist()):
+        gpu = gpu_heap.pop()
+        task_start_time = gpu.get_lasttime()
+        gpu.set_lasttime(task_start_time + duration)
+
+        task_rect = TaskRect(task_idx+1, GPU.arch_id, 0)
+        task_rect.set_procs([(gpu.get_pid(), 1)])
+        task_rect.set_times(task_start_time, gpu.get_lasttime())
+        schedule.add_task_rect(task_rect)
+
+        gpu_heap.push(gpu)
+
+    core_heap = PUHeap([ Core(i) for i in xrange(0, Core.nb_pus) ])
+    times = instance.get_times_by_procs(cpu_tasks, procs[cpu_tasks]).tolist()
+    for task_idx, duration, nb_cores in izip(cpu_tasks.tolist(), times, procs[cpu_tasks].tolist()):
+        cores = [ core_heap.pop() for i in xrange(0, nb_cores) ]
+        task_start_time = cores[-1].get_lasttime()
+        task_end_time = task_start_time + duration
+        if task_end_time > 2 * lambval:
+            return None
+
+        for core in cores:
+            core.set_lasttime(task_end_time)
+            core_heap.push(core)
+
+        task_rect = TaskRect(task_idx+1, Core.arch_id, 0)
+        task_rect.set_procs(get_pid_blocks([ core.get_pid() for core in cores ]))
+        task_rect.set_times(task_start_time, task_end_time)
+        schedule.add_task_rect(task_rect)
+
+    return schedule
+
+def solve_problem_2approx(input_data, jedfile=None, csvfile=None):
+    """
+    Runs the 2-approximation and returns the schedule of the smallest
+    feasible lambda (None if no probe was feasible).
+    """
+    global lower_bound
+
+    instance = as_scheduling_instance(input_data)
+
+    approx_common.init_system()
+
+    prof = get_profiler("solve_problem_2approx")
+    if prof != None:
+        prof.start_phase("search")
+
+    lower = bounds.get_base_lower_bound(instance)
+    upper = bounds.get_base_upper_bound(instance)
+
+    if approx_common.debug == 1:
+        print "lb:", lower
+        print "ub:", upper
+
+    stats.clear()
+    lower_bound = None
+    stats["nb_of_iterations"] = 0
+    stats["mean_solve_time"] = 0.0
+    stats["total_solve_time"] = 0.0
+
+    best_lambda = -1.0
+
+    start_time = time.time()
+
+    while upper/lower > approx_common.cutoff_ratio:
+
+        bisect = lower + (upper-lower)/2.0
+
+        if approx_common.debug == 1:
+            print "lambda=", bisect
+
+        if is_feasible(instance, bisect):
+            upper = bisect
+            best_lambda = bisect
+        else:
+            lower = bisect
+
+        stats["nb_of_iterations"] += 1
+
+    if prof != None:
+        prof.start_phase("placement")
+
+    schedule = None
+    if best_lambda != -1.0:
+        schedule = build_2approx_schedule(instance, best_lambda)
+
+    end_time = time.time()
+
+    stats["total_solve_time"] = end_time - start_time
+    if stats["nb_of_iterations"] > 0:
+        stats["mean_solve_time"] = stats["total_solve_time"] / stats["nb_of_iterations"]
+    lower_bound = lower
+
+    if schedule == None:
+        print "could not find solution"
+        return None
+
+    if prof != None:
+        prof.start_phase("checks")
+
+    if approx_common.validate == 1:
+        check_schedule(instance, schedule)
+
+    if prof != None:
+        prof.start_phase("output")
+
+    print "best lambda: %f" % ( best_lambda )
+    for key in sorted(stats.keys()):
+        print "%s: %s" % ( key, stats[key] )
+    print "bound: %f" % ( 2 * best_lambda )
+    print "makespan: %f" % ( schedule.get_makespan() )
+
+    if jedfile != None and jedfile != "":
+        approx_common.write_jedfile(jedfile, schedule)
+
+    if csvfile != None and csvfile != "":
+        approx_common.write_csv_output(csvfile, schedule)
+
+    if prof != None:
+        prof.add_count("probes", stats["nb_of_iterations"])
+        prof.add_count("rect_allocations", schedule.get_nb_task_rects())
+        finish_profiler(prof, schedule)
+
+    sys.stdout.flush()
+
+    return schedule
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser( usage = "usage: %prog [options]" )
+
+    parser.add_option( "-i", "--input",
+                       action  = "store",
+                       dest    = "ininst",
+                       type    = "string",
+                       help    = "file with input data" )
+
+    parser.add_option( "-j", "--jedule",
+                       action  = "store",
+                       dest    = "jedfile",
+                       type    = "string",
+                       help    = "file name for jedule output" )
+
+    parser.add_option( "-c", "--csv",
+                       action  = "store",
+                       dest    = "csvfile",
+                       type    = "string",
+                       help    = "file name for csv output" )
+
+    ( options, args ) = parser.parse_args()
+
+    if options.ininst == None or not os.path.exists(options.ininst):
+        print >> sys.stderr, "input file invalid"
+        parser.print_help()
+        sys.exit(1)
+
+    approx_common.init_system()
+
+    inputdata = approx_common.load_instance(options.ininst)
+
+    schedule = solve_problem_2approx(inputdata, options.jedfile, options.csvfile)
+    if schedule == None:
+        sys.exit(1)
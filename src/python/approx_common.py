@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 
 # SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
 # Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
@@ -18,11 +19,28 @@
 
 
 import os
+import bz2
+import gzip
+import json
 import yaml
 
+from instance_common import SchedulingInstance, GammaTable, NO_PROCS, as_scheduling_instance, instance_from_dict
+from instance_cache import load_cached_instance
+from jedule_output import write_jedule_output
+
 # do not use, use environment
 debug = 0
 
+# check every schedule with schedule_validation (prints problems only)
+validate = 1
+
+# phase timers/counters and trace file, see instrumentation.py
+profile = 0
+trace_file = None
+
+# SQLite file with MIP feasibility results, see feasibility_cache.py
+feasibility_cache_file = None
+
 dual_approx_pathname = None
 
 use_cplex = 0
@@ -44,15 +62,25 @@ GLPSOL_PATH="/usr/bin/glpsol"
 #SYMPHONY_PATH="symphony"
 SYMPHONY_PATH="/usr/bin/symphony"
 
+# libyaml is only used for input files that are not JSON
+yaml_loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def init_system():
-    global debug
+    global debug, profile, trace_file, feasibility_cache_file
 
     if os.environ.has_key("DUALAPPROX_DEBUG_LEVEL"):
         debug = int(os.environ.get("DUALAPPROX_DEBUG_LEVEL"))
     else:
         debug = 0
 
+    if os.environ.has_key("DUALAPPROX_PROFILE"):
+        profile = int(os.environ.get("DUALAPPROX_PROFILE"))
+    if os.environ.has_key("DUALAPPROX_TRACE"):
+        trace_file = os.environ.get("DUALAPPROX_TRACE")
+    if os.environ.has_key("DUALAPPROX_FEASIBILITY_CACHE"):
+        feasibility_cache_file = os.environ.get("DUALAPPROX_FEASIBILITY_CACHE")
+
 def get_approx_code_basename():
     global dual_approx_pathname
     if dual_approx_pathname == None:
@@ -63,24 +91,52 @@ def get_task_str(task_id):
     return "t%d" % ( int(task_id) )
 
 def write_jedfile(fname, schedule):
-    content = schedule.get_jedule_output()
-    content.dump(fname)
+    # .jed.bz2 and .jed.gz are written compressed
+    write_jedule_output(fname, schedule)
 
-def write_csv_output(fname, schedule):
-    schedule.write_csv_output(fname)
+def write_csv_output(fname, schedule, **kwargs):
+    # .csv.bz2 and .csv.gz are written compressed, see output_csv.py
+    schedule.write_csv_output(fname, **kwargs)
+
+def open_data_file(filename):
+    # bz2 and gzip files are decompressed while reading (detected by magic number)
+    fh = open(filename, "rb")
+    magic = fh.read(3)
+    fh.close()
+
+    if magic == "BZh":
+        return bz2.BZ2File(filename, "rb")
+    elif magic[:2] == "\x1f\x8b":
+        return gzip.GzipFile(filename, "rb")
+    return open(filename, "rb")
 
 def load_json_file(filename):
-    fh = open(filename)
-    file_content = fh.readlines()
+    fh = open_data_file(filename)
+    content = fh.read()
     fh.close()
-    content = "".join(file_content)
-    data = yaml.load(content)
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = yaml.load(content, Loader=yaml_loader)
     return data
 
+def load_instance(filename, use_cache=True):
+    # .in, .in.bz2 or .in.gz file -> SchedulingInstance
+    # a valid binary side file (see instance_cache.py) is memory-mapped instead
+    if use_cache:
+        instance = load_cached_instance(filename)
+        if instance != None:
+            return instance
+    return instance_from_dict(load_json_file(filename))
+
 
 def get_procs_by_lambda(cpu_data_hash, task_str, h_bound):
+    # cpu_data_hash may also be a SchedulingInstance (task_str: id or "t%d")
+    if isinstance(cpu_data_hash, SchedulingInstance):
+        return cpu_data_hash.get_procs_by_lambda(task_str, h_bound)
+
     #ret_nb_procs = sys.maxint
-    ret_nb_procs = 100000
+    ret_nb_procs = NO_PROCS
 
     time_arr = cpu_data_hash[task_str]
 
@@ -96,4 +152,10 @@ def get_procs_by_lambda(cpu_data_hash, task_str, h_bound):
     return ret_nb_procs
 
 def get_time_by_procs(cpu_data_hash, task_str, procs):
+    if isinstance(cpu_data_hash, SchedulingInstance):
+        return cpu_data_hash.get_time_by_procs(task_str, procs)
     return cpu_data_hash[task_str][procs-1]
+
+def get_gamma_table(input_data, lambval):
+    # gamma(j, lambda), gamma(j, lambda/2), gamma(j, 3/2 lambda) of all tasks
+    return GammaTable(as_scheduling_instance(input_data), lambval)
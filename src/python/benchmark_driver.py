@@ -0,0 +1,296 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# runs the schedulers on all instances of a directory (like benchmark.jl)
+# with a process pool
+#
+# one job per instance: the worker loads the instance once and runs all
+# selected algorithms on it. Result rows are appended to one CSV file in
+# the order of the sorted instance names, whatever the order in which
+# the workers finish. Rerunning with the same output file skips all
+# (instance, alg) pairs that are already in it.
+#
+# solve_time is the time of the scheduler alone, without validation and
+# output files. A run that raises is reported on stderr and gets a row
+# with NA values, the other runs go on.
+
+import sys
+import os
+import time
+import traceback
+import multiprocessing
+
+import approx_common
+import apply_heft
+import approx2
+import dual_approx
+
+from mip_solver import find_solver
+from schedule_validation import validate_schedule
+
+from optparse import OptionParser
+
+RESULT_COLUMNS = [ "instance", "alg", "n", "m", "k", "makespan", "solve_time", "bound" ]
+
+INSTANCE_SUFFIXES = [ ".in", ".in.bz2", ".in.gz" ]
+
+
+def run_heft(prio, seq_only, insertion=False):
+    def run(instance):
+        schedule = apply_heft.build_heft_schedule(instance, seq_only, prio, None, None, insertion)
+        return schedule, None
+    return run
+
+def run_approx32(instance):
+    # bound: largest infeasible lambda of the bisection
+    schedule = dual_approx.solve_problem(instance)
+    return schedule, dual_approx.stats.get("lower_bound")
+
+def run_approx2(instance):
+    # bound: largest infeasible lambda of the bisection
+    schedule = approx2.solve_problem_2approx(instance)
+    return schedule, approx2.lower_bound
+
+# alg name -> func(instance) -> (schedule, bound or None)
+algorithms = {}
+
+def register_algorithm(alg, func):
+    algorithms[alg] = func
+
+for prio in [ "lpt", "spt", "ratio" ]:
+    for seq_only in [ 0, 1 ]:
+        register_algorithm("heft_%s_%d" % ( prio, seq_only ), run_heft(prio, seq_only))
+    # with seq_only no gap ever opens and the insertion policy gives the
+    # schedules of heft_<prio>_1, so it only runs without
+    register_algorithm("heft_%s_ins" % ( prio ), run_heft(prio, 0, True))
+
+register_algorithm("approx2", run_approx2)
+
+# only if glpsol or symphony is installed
+if find_solver() != None:
+    register_algorithm("approx32", run_approx32)
+
+
+def get_instance_name(fname):
+    base = os.path.basename(fname)
+    for suffix in INSTANCE_SUFFIXES:
+        if base.endswith(suffix):
+            return base[:-len(suffix)]
+    return base
+
+def find_instances(indir):
+    fnames = []
+    for fname in sorted(os.listdir(indir)):
+        if any([ fname.endswith(suffix) for suffix in INSTANCE_SUFFIXES ]):
+            fnames.append(os.path.join(indir, fname))
+    return fnames
+
+def read_done(outfile):
+    """
+    (instance, alg) pairs in an existing result file. A partial last
+    line (interrupted run) is cut off.
+    """
+    done = set()
+    if not os.path.exists(outfile):
+        return done
+
+    fh = open(outfile, "rb+")
+    content = fh.read()
+    if content and not content.endswith("\n"):
+        fh.truncate(content.rfind("\n") + 1)
+        content = content[:content.rfind("\n") + 1]
+    fh.close()
+
+    for line in content.splitlines()[1:]:
+        fields = line.split(";")
+        if len(fields) == len(RESULT_COLUMNS):
+            done.add( (fields[0], fields[1]) )
+    return done
+
+def get_output_fname(outdir, name, alg, ext):
+    if outdir == None:
+        return None
+    return os.path.join(outdir, "%s_%s.%s" % ( name, alg, ext ))
+
+def format_value(value):
+    if value == None:
+        return "NA"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def run_instance(job):
+    # worker: load the instance once, run the algorithms, return rows
+    fname, algs, outdir, create_jed, create_csv = job
+    name = get_instance_name(fname)
+    instance = approx_common.load_instance(fname)
+
+    # solve_time covers the scheduler only, the schedule is checked and
+    # written afterwards
+    validate = approx_common.validate
+    approx_common.validate = 0
+
+    rows = []
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        for alg in algs:
+            start_time = time.time()
+            try:
+                schedule, bound = algorithms[alg](instance)
+            except Exception:
+                # one failed run must not stop the sweep
+                error = traceback.format_exception_only(*sys.exc_info()[:2])[-1].strip()
+                print >> sys.stderr, "%s %s failed: %s" % ( name, alg, error )
+                rows.append([ name, alg, instance.n, instance.m, instance.k, None, None, None ])
+                continue
+            solve_time = time.time() - start_time
+
+            makespan = None
+            if schedule != None:
+                makespan = schedule.get_makespan()
+                if validate == 1:
+                    for problem in validate_schedule(instance, schedule):
+                        print >> sys.stderr, "%s %s invalid schedule: %s" % ( name, alg, problem )
+                if create_jed:
+                    approx_common.write_jedfile(get_output_fname(outdir, name, alg, "jed"), schedule)
+                if create_csv:
+                    approx_common.write_csv_output(get_output_fname(outdir, name, alg, "csv"), schedule)
+
+            rows.append([ name, alg, instance.n, instance.m, instance.k,
+                          makespan, solve_time, bound ])
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        approx_common.validate = validate
+
+    return rows
+
+def run_benchmark(fnames, algs, outfile, nb_procs, outdir=None, create_jed=False, create_csv=False):
+    done = read_done(outfile)
+
+    jobs = []
+    for fname in fnames:
+        name = get_instance_name(fname)
+        todo = [ alg for alg in algs if (name, alg) not in done ]
+        if todo:
+            jobs.append( (fname, todo, outdir, create_jed, create_csv) )
+
+    write_header = not os.path.exists(outfile) or os.path.getsize(outfile) == 0
+    fh = open(outfile, "a")
+    if write_header:
+        fh.write(";".join(RESULT_COLUMNS) + "\n")
+        fh.flush()
+
+    pool = multiprocessing.Pool(processes=nb_procs)
+    try:
+        # imap keeps the job order, rows are written as soon as they are in order
+        for rows in pool.imap(run_instance, jobs):
+            for row in rows:
+                fh.write(";".join([ format_value(v) for v in row ]) + "\n")
+            fh.flush()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        fh.close()
+
+    return len(jobs)
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser( usage = "usage: %prog [options]" )
+
+    parser.add_option( "-i", "--in",
+                       action  = "store",
+                       dest    = "indir",
+                       type    = "string",
+                       help    = "directory with instances" )
+
+    parser.add_option( "-r", "--results",
+                       action  = "store",
+                       dest    = "outfile",
+                       type    = "string",
+                       help    = "result file (csv), existing results are kept" )
+
+    parser.add_option( "-a", "--algorithms",
+                       action  = "store",
+                       dest    = "algs",
+                       type    = "string",
+                       help    = "comma separated list (default: all of %s)" % ( ",".join(sorted(algorithms.keys())) ) )
+
+    parser.add_option( "-p", "--processes",
+                       action  = "store",
+                       dest    = "nb_procs",
+                       type    = "int",
+                       default = multiprocessing.cpu_count(),
+                       help    = "number of worker processes" )
+
+    parser.add_option( "-o", "--out",
+                       action  = "store",
+                       dest    = "outdir",
+                       type    = "string",
+                       help    = "directory for output files (jedule/csv)" )
+
+    parser.add_option( "-j", "--jedule",
+                       action  = "store_true",
+                       dest    = "jedule",
+                       help    = "create jedule output",
+                       default = False )
+
+    parser.add_option( "-c", "--csv",
+                       action  = "store_true",
+                       dest    = "csv",
+                       help    = "create csv output",
+                       default = False )
+
+    ( options, args ) = parser.parse_args()
+
+    if options.indir == None or not os.path.isdir(options.indir):
+        print >> sys.stderr, "input directory invalid"
+        parser.print_help()
+        sys.exit(1)
+
+    if options.outfile == None:
+        print >> sys.stderr, "result file missing"
+        parser.print_help()
+        sys.exit(1)
+
+    if (options.jedule or options.csv) and (options.outdir == None or not os.path.isdir(options.outdir)):
+        print >> sys.stderr, "outdir invalid"
+        parser.print_help()
+        sys.exit(1)
+
+    if options.algs == None:
+        algs = sorted(algorithms.keys())
+    else:
+        algs = options.algs.split(",")
+        for alg in algs:
+            if alg not in algorithms:
+                print >> sys.stderr, "unknown algorithm:", alg
+                sys.exit(1)
+
+    fnames = find_instances(options.indir)
+    nb_jobs = run_benchmark(fnames, algs, options.outfile, options.nb_procs,
+                            options.outdir, options.jedule, options.csv)
+
+    print "instances:", len(fnames), "run:", nb_jobs
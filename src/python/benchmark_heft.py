@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# times build_heft_schedule against a copy of its former placement loop,
+# which scanned all PUs for the earliest finish time (lowest pid wins
+# ties), and checks that both build the same schedule
+
+import sys
+import os
+import time
+import numpy as np
+
+import approx_common
+
+from optparse import OptionParser
+from apply_heft import build_heft_schedule, priorities
+from schedule_common import Core, GPU, MoldSchedule, TaskRect
+from instance_common import SchedulingInstance
+
+
+def make_random_instance(nb_tasks, nb_cpu, nb_gpu, seed, quantum=0.0):
+    # times are rounded up to multiples of quantum (if > 0), which
+    # makes PUs with the same finish time common
+    rs = np.random.RandomState(seed)
+    seq_times = 1.0 + 99.0 * rs.beta(3, 5, nb_tasks)
+    sfrac = rs.uniform(0.0, 0.9, nb_tasks)
+    procs = np.arange(1, nb_cpu+1, dtype=np.float64)
+    # in place, no n x m temporaries
+    cpudata = (1.0 - sfrac[:,None]) / procs[None,:]
+    cpudata += sfrac[:,None]
+    cpudata *= seq_times[:,None]
+    gpudata = cpudata[:,-1] * rs.uniform(0.1, 1.5, nb_tasks)
+    if quantum > 0.0:
+        cpudata = np.ceil(cpudata / quantum) * quantum
+        gpudata = np.ceil(gpudata / quantum) * quantum
+    return SchedulingInstance(nb_tasks, nb_cpu, nb_gpu, cpudata, gpudata)
+
+
+def build_heft_schedule_linear(in_data, seq_only, prio):
+    # placement loop of build_heft_schedule before PUQueue
+    Core.nb_pus = in_data.m
+    GPU.nb_pus = in_data.k
+
+    cores = [ Core(i) for i in xrange(0, Core.nb_pus) ]
+    gpus  = [ GPU(i) for i in xrange(0, GPU.nb_pus) ]
+
+    schedule = MoldSchedule(Core.nb_pus, GPU.nb_pus)
+
+    # same order as build_heft_schedule, which ranks by the best
+    # parallel time in both modes
+    for task_id in priorities[prio](in_data, False):
+
+        chosen_device_id = 0
+
+        selected_core_idx = 0
+        selected_nb_cores = Core.nb_pus
+        eft_best = sys.float_info.max
+
+        if seq_only:
+
+            selected_nb_cores = 1
+            seq_time = in_data.get_seq_time(task_id)
+
+            for core_idx in xrange(0, Core.nb_pus):
+                eft_core = cores[core_idx].get_lasttime() + seq_time
+                if eft_core < eft_best:
+                    eft_best = eft_core
+                    selected_core_idx = core_idx
+
+        else:
+            eft_best = cores[0].get_lasttime() + in_data.get_time_by_procs(task_id, Core.nb_pus)
+
+        gpu_time = in_data.get_gpu_time(task_id)
+        for gpu_id in xrange(0, GPU.nb_pus):
+            device_id = gpu_id + 1
+            eft_current = gpus[gpu_id].get_lasttime() + gpu_time
+            if eft_current < eft_best:
+                chosen_device_id = device_id
+                eft_best = eft_current
+
+        if chosen_device_id == 0:
+
+            if seq_only:
+
+                task_start_time = cores[selected_core_idx].get_lasttime()
+                task_end_time   = eft_best
+
+                cores[selected_core_idx].set_lasttime(eft_best)
+
+            else:
+
+                task_start_time = cores[0].get_lasttime()
+                task_end_time   = eft_best
+
+                for core in cores:
+                    core.set_lasttime(eft_best)
+
+            task_rect = TaskRect(task_id, Core.arch_id, 0)
+            task_rect.set_procs([(selected_core_idx, selected_nb_cores)])
+            task_rect.set_times(task_start_time, task_end_time)
+
+            schedule.add_task_rect(task_rect)
+
+        else:
+
+            task_start_time = gpus[chosen_device_id-1].get_lasttime()
+            task_end_time   = eft_best
+
+            gpus[chosen_device_id-1].set_lasttime(eft_best)
+
+            task_rect = TaskRect(task_id, GPU.arch_id, 0)
+            task_rect.set_procs([(chosen_device_id-1, 1)])
+            task_rect.set_times(task_start_time, task_end_time)
+
+            schedule.add_task_rect(task_rect)
+
+    return schedule
+
+def build_heft_schedule_quiet(in_data, seq_only, prio):
+    # build_heft_schedule prints its results
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        return build_heft_schedule(in_data, seq_only, prio, None)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def time_call(func, instance, seq_only, prio, nb_rep):
+    best = None
+    result = None
+    for i in xrange(0, nb_rep):
+        start_time = time.time()
+        result = func(instance, seq_only, prio)
+        elapsed = time.time() - start_time
+        if best == None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser( usage = "usage: %prog [options]" )
+
+    parser.add_option( "-n", "--ntasks",
+                       action  = "store",
+                       dest    = "ntasks",
+                       type    = "int",
+                       default = 5000,
+                       help    = "number of tasks" )
+
+    parser.add_option( "-m", "--mcores",
+                       action  = "store",
+                       dest    = "mcores",
+                       type    = "string",
+                       default = "16,64,256,512",
+                       help    = "comma separated list of core counts" )
+
+    parser.add_option( "-k", "--kgpus",
+                       action  = "store",
+                       dest    = "kgpus",
+                       type    = "int",
+                       default = 32,
+                       help    = "number of GPUs" )
+
+    parser.add_option( "-r", "--repetitions",
+                       action  = "store",
+                       dest    = "nrep",
+                       type    = "int",
+                       default = 3,
+                       help    = "repetitions (minimum time is reported)" )
+
+    parser.add_option( "-s", "--seed",
+                       action  = "store",
+                       dest    = "seed",
+                       type    = "int",
+                       default = 0,
+                       help    = "random seed" )
+
+    parser.add_option( "-p", "--priorization",
+                       action  = "store",
+                       dest    = "prio",
+                       type    = "string",
+                       default = "lpt",
+                       help    = "priorization option (lpt, spt, ratio CPU/GPU)" )
+
+    parser.add_option( "-q", "--quantum",
+                       action  = "store",
+                       dest    = "quantum",
+                       type    = "float",
+                       default = 1.0,
+                       help    = "round times up to multiples of quantum (0 = no rounding)" )
+
+    ( options, args ) = parser.parse_args()
+
+    if not priorities.has_key(options.prio):
+        print >> sys.stderr, "unknown prio option:", options.prio
+        sys.exit(1)
+
+    # the old loop did not validate either
+    approx_common.validate = 0
+
+    print "%6s %5s %4s %3s %12s %12s %8s" % ( "n", "m", "k", "seq", "linear[s]", "heap[s]", "speedup" )
+
+    for nb_cpu in [ int(m) for m in options.mcores.split(",") ]:
+        instance = make_random_instance(options.ntasks, nb_cpu, options.kgpus, options.seed, options.quantum)
+
+        for seq_only in [ True, False ]:
+            t_linear, s_linear = time_call(build_heft_schedule_linear, instance, seq_only, options.prio, options.nrep)
+            t_heap, s_heap     = time_call(build_heft_schedule_quiet, instance, seq_only, options.prio, options.nrep)
+
+            # same PUs (ties to the lowest pid) and times for every task
+            if list(s_linear.iter_resource_blocks()) != list(s_heap.iter_resource_blocks()):
+                print >> sys.stderr, "schedules differ for m=%d seq_only=%d" % ( nb_cpu, int(seq_only) )
+                sys.exit(1)
+
+            print "%6d %5d %4d %3d %12.4f %12.4f %8.1f" % ( options.ntasks, nb_cpu, options.kgpus, int(seq_only),
+                                                            t_linear, t_heap, t_linear / t_heap )
+
+    sys.stdout.flush()
@@ -0,0 +1,375 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# benchmarks build_heft_schedule (3 prios x seq_only) and build_schedule
+# on synthetic instances over an n x m x k grid
+#
+# every case runs in its own process, so peak memory is per case
+# (ru_maxrss, kB). Results can be saved as JSON baseline (-o) and
+# compared against an earlier baseline (-c); slower runs, higher peak
+# memory or different makespans are flagged and the exit code is 1.
+#
+# build_schedule gets a greedy set assignment (make_set_assignment)
+# instead of a MIP solution; lambda is increased until the schedule can
+# be built. Searching lambda is not part of the measured time.
+
+import sys
+import os
+import time
+import json
+import platform
+import resource
+import multiprocessing
+import numpy as np
+
+import apply_heft
+import build_approx_schedule
+
+from optparse import OptionParser
+from benchmark_heft import make_random_instance
+from instance_common import GammaTable, get_allowed_sets, get_set_work
+
+HEFT_PRIOS = [ "lpt", "spt", "ratio" ]
+
+# lambda is multiplied by this factor until build_schedule succeeds
+LAMBDA_STEP = 1.05
+MAX_LAMBDA_STEPS = 200
+
+# differences below this are not flagged as time regressions (seconds)
+TIME_NOISE = 0.01
+
+
+def get_algorithms(names):
+    algs = []
+    for name in names:
+        if name == "heft":
+            for prio in HEFT_PRIOS:
+                for seq_only in [ 0, 1 ]:
+                    algs.append("heft_%s_%d" % ( prio, seq_only ))
+        elif name == "approx32":
+            algs.append(name)
+        else:
+            raise ValueError("unknown algorithm %s" % ( name ))
+    return algs
+
+def get_case_key(case):
+    return "%s_n%d_m%d_k%d_s%d" % ( case["alg"], case["n"], case["m"], case["k"], case["seed"] )
+
+def get_lower_bound(instance):
+    # every task runs at least min(time on m cores, GPU time) and the
+    # minimal work has to be spread over m+k PUs
+    min_times = np.minimum(instance.get_min_cpu_times(), instance.gpudata)
+    min_work = np.minimum(instance.get_seq_times(), instance.gpudata)
+    return max(float(min_times.max()), float(min_work.sum()) / (instance.m + instance.k))
+
+
+def make_set_assignment(instance, lambval):
+    """
+    Greedy assignment of tasks to sets 1-7 that meets the constraints of
+    the MIP (solve_mip.jl) for lambval. Tasks with the largest CPU work
+    per GPU time go to the GPUs first, the others take their cheapest
+    CPU set. Returns the solution dict for build_schedule or None.
+    """
+    m = instance.m
+    k = instance.k
+    gamma = GammaTable(instance, lambval)
+    allowed = get_allowed_sets(instance, gamma)
+    work = np.where(allowed, get_set_work(instance, gamma), np.inf)
+    no_procs = np.zeros(instance.n, dtype=np.int64)
+    procs = [ no_procs, no_procs, gamma.gamma_32lamb, gamma.gamma_lamb, gamma.gamma_12lamb ]
+
+    cpu_work = work[:,:5].min(axis=1)
+    on_gpu_first = ~np.isfinite(cpu_work)
+    ratio = np.where(on_gpu_first, np.inf, cpu_work / instance.gpudata)
+    order = np.argsort(-ratio, kind="mergesort")
+
+    gpu_work = 0.0
+    total_cpu_work = 0.0
+    nb_set6 = 0
+    nb_set2 = 0
+    procs_3 = 0
+    procs_4 = 0
+    procs_5 = 0
+    task_hash = {}
+
+    for idx in order.tolist():
+        gpu_time = float(instance.gpudata[idx])
+        set_id = None
+
+        if gpu_work + gpu_time <= k * lambval:
+            if allowed[idx,6]:
+                set_id = 7
+            elif allowed[idx,5] and nb_set6 < k:
+                set_id = 6
+                nb_set6 += 1
+        if set_id != None:
+            gpu_work += gpu_time
+            task_hash[str(idx+1)] = str(set_id)
+            continue
+
+        # set 2 tasks are split in two halves, see low1/up1 in the MIP
+        for s in np.argsort(work[idx,:5], kind="mergesort").tolist():
+            if not np.isfinite(work[idx,s]):
+                break
+            p = int(procs[s][idx])
+            if s == 0:
+                set_id = 1
+            elif s == 1 and procs_3 + procs_4 + (nb_set2 + 2) // 2 <= m and procs_3 + procs_5 + (nb_set2 + 1) // 2 <= m:
+                set_id = 2
+                nb_set2 += 1
+            elif s == 2 and procs_3 + procs_4 + p + (nb_set2 + 1) // 2 <= m and procs_3 + procs_5 + p + nb_set2 // 2 <= m:
+                set_id = 3
+                procs_3 += p
+            elif s == 3 and procs_3 + procs_4 + p + (nb_set2 + 1) // 2 <= m:
+                set_id = 4
+                procs_4 += p
+            elif s == 4 and procs_3 + procs_5 + p + nb_set2 // 2 <= m:
+                set_id = 5
+                procs_5 += p
+            if set_id != None:
+                break
+
+        if set_id == None:
+            return None
+        total_cpu_work += float(work[idx,set_id-1])
+        task_hash[str(idx+1)] = str(set_id)
+
+    if total_cpu_work > lambval * m:
+        return None
+
+    return { "work" : total_cpu_work, "task_hash" : task_hash }
+
+
+def run_quiet(func, *args):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        return func(*args)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def find_approx_input(instance):
+    # smallest lambval (in steps of LAMBDA_STEP) that build_schedule accepts
+    lambval = get_lower_bound(instance)
+    for i in xrange(0, MAX_LAMBDA_STEPS):
+        solution = make_set_assignment(instance, lambval)
+        if solution != None:
+            try:
+                run_quiet(build_approx_schedule.build_schedule, instance, solution, lambval, None)
+                return lambval, solution
+            except RuntimeError:
+                pass
+        lambval *= LAMBDA_STEP
+    raise RuntimeError("no set assignment found")
+
+def run_case(case, approx_input=None):
+    # approx_input: (lambval, solution) from find_approx_input
+    instance = make_random_instance(case["n"], case["m"], case["k"], case["seed"])
+
+    alg = case["alg"]
+    if alg == "approx32":
+        lambval, solution = approx_input
+        func = build_approx_schedule.build_schedule
+        args = ( instance, solution, lambval, None )
+    else:
+        prio, seq_only = alg.split("_")[1:]
+        lambval = None
+        func = apply_heft.build_heft_schedule
+        args = ( instance, int(seq_only), prio, None )
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    wall_times = []
+    for i in xrange(0, case["nrep"]):
+        start_time = time.time()
+        schedule = run_quiet(func, *args)
+        wall_times.append(time.time() - start_time)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    result = dict(case)
+    result.update({
+        "wall_time"    : min(wall_times),
+        "wall_times"   : wall_times,
+        "peak_rss_kb"  : peak_rss,
+        "mem_delta_kb" : max(0, peak_rss - rss_before),
+        "makespan"     : schedule.get_makespan(),
+        "lambda"       : lambval
+    })
+    return result
+
+def run_case_in_child(case, approx_input=None):
+    pool = multiprocessing.Pool(processes=1, maxtasksperchild=1)
+    try:
+        return pool.apply(run_case, (case, approx_input))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def compare_results(results, baseline, tolerance):
+    # returns list of (case key, message)
+    base = dict([ ( get_case_key(r), r ) for r in baseline["results"] ])
+    flagged = []
+    for r in results:
+        key = get_case_key(r)
+        if key not in base:
+            continue
+        b = base[key]
+        if r["wall_time"] > b["wall_time"] * (1 + tolerance) and r["wall_time"] - b["wall_time"] > TIME_NOISE:
+            flagged.append( (key, "wall time %.4f s -> %.4f s" % ( b["wall_time"], r["wall_time"] )) )
+        if r["mem_delta_kb"] > b["mem_delta_kb"] * (1 + tolerance) and r["mem_delta_kb"] - b["mem_delta_kb"] > 1024:
+            flagged.append( (key, "memory %d kB -> %d kB" % ( b["mem_delta_kb"], r["mem_delta_kb"] )) )
+        if abs(r["makespan"] - b["makespan"]) > 1e-9 * max(1.0, abs(b["makespan"])):
+            flagged.append( (key, "makespan %r -> %r" % ( b["makespan"], r["makespan"] )) )
+    return flagged
+
+
+def parse_int_list(value):
+    return [ int(v) for v in value.split(",") ]
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser( usage = "usage: %prog [options]" )
+
+    parser.add_option( "-n", "--ntasks",
+                       action  = "store",
+                       dest    = "ntasks",
+                       type    = "string",
+                       default = "1000,10000",
+                       help    = "comma separated list of task counts" )
+
+    parser.add_option( "-m", "--mcores",
+                       action  = "store",
+                       dest    = "mcores",
+                       type    = "string",
+                       default = "16,64,512",
+                       help    = "comma separated list of core counts" )
+
+    parser.add_option( "-k", "--kgpus",
+                       action  = "store",
+                       dest    = "kgpus",
+                       type    = "string",
+                       default = "1,4,32",
+                       help    = "comma separated list of GPU counts (k <= m)" )
+
+    parser.add_option( "-a", "--algorithms",
+                       action  = "store",
+                       dest    = "algs",
+                       type    = "string",
+                       default = "heft,approx32",
+                       help    = "heft (all prios, seq_only 0/1) and/or approx32" )
+
+    parser.add_option( "-r", "--repetitions",
+                       action  = "store",
+                       dest    = "nrep",
+                       type    = "int",
+                       default = 3,
+                       help    = "repetitions (minimum time is reported)" )
+
+    parser.add_option( "-s", "--seed",
+                       action  = "store",
+                       dest    = "seed",
+                       type    = "int",
+                       default = 0,
+                       help    = "random seed" )
+
+    parser.add_option( "-o", "--output",
+                       action  = "store",
+                       dest    = "outfile",
+                       type    = "string",
+                       help    = "save results as JSON baseline" )
+
+    parser.add_option( "-c", "--compare",
+                       action  = "store",
+                       dest    = "basefile",
+                       type    = "string",
+                       help    = "JSON baseline to compare against" )
+
+    parser.add_option( "-t", "--tolerance",
+                       action  = "store",
+                       dest    = "tolerance",
+                       type    = "float",
+                       default = 0.2,
+                       help    = "relative slowdown/memory growth that is flagged" )
+
+    ( options, args ) = parser.parse_args()
+
+    baseline = None
+    if options.basefile != None:
+        if not os.path.exists(options.basefile):
+            print >> sys.stderr, "baseline file invalid"
+            sys.exit(1)
+        fh = open(options.basefile)
+        baseline = json.load(fh)
+        fh.close()
+
+    try:
+        algs = get_algorithms(options.algs.split(","))
+    except ValueError, e:
+        print >> sys.stderr, e
+        sys.exit(1)
+
+    cases = []
+    for n in parse_int_list(options.ntasks):
+        for m in parse_int_list(options.mcores):
+            for k in parse_int_list(options.kgpus):
+                if k > m:
+                    continue
+                for alg in algs:
+                    cases.append({ "alg" : alg, "n" : n, "m" : m, "k" : k, "seed" : options.seed, "nrep" : options.nrep })
+
+    print "%-14s %7s %4s %3s %10s %10s %10s %14s" % ( "alg", "n", "m", "k", "time[s]", "peak[kB]", "delta[kB]", "makespan" )
+
+    # the lambda search for approx32 runs here, not in the measured child
+    approx_inputs = {}
+
+    results = []
+    for case in cases:
+        approx_input = None
+        if case["alg"] == "approx32":
+            key = ( case["n"], case["m"], case["k"], case["seed"] )
+            if key not in approx_inputs:
+                instance = make_random_instance(case["n"], case["m"], case["k"], case["seed"])
+                approx_inputs[key] = find_approx_input(instance)
+            approx_input = approx_inputs[key]
+        r = run_case_in_child(case, approx_input)
+        results.append(r)
+        print "%-14s %7d %4d %3d %10.4f %10d %10d %14.6f" % ( r["alg"], r["n"], r["m"], r["k"], r["wall_time"], r["peak_rss_kb"], r["mem_delta_kb"], r["makespan"] )
+        sys.stdout.flush()
+
+    if options.outfile != None:
+        fh = open(options.outfile, "w")
+        json.dump({
+            "meta" : {
+                "python"  : platform.python_version(),
+                "numpy"   : np.__version__,
+                "host"    : platform.node(),
+                "date"    : time.strftime("%Y-%m-%d %H:%M:%S")
+            },
+            "results" : results
+        }, fh, indent=1, sort_keys=True)
+        fh.close()
+
+    if baseline != None:
+        flagged = compare_results(results, baseline, options.tolerance)
+        for key, msg in flagged:
+            print "REGRESSION", key, ":", msg
+        if flagged:
+            sys.exit(1)
+        print "no regressions"
@@ -0,0 +1,279 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# initial bracket [lower, upper] of the lambda search (dual_approx.py)
+#
+# the base bounds are those of approx_common.jl. The other lower bounds
+# are lambdas at which the feasibility MIP (mip_model.py) is certainly
+# infeasible, so the search may start from them:
+#   longest task : below max_j min(t_j(m), gpu_j) the MIP pre-check fails
+#   area         : the smallest area of every task over its allowed sets
+#                  (moldable work grows as lambda shrinks) exceeds
+#                  (m+k) * lambda
+#   split        : no fractional CPU/GPU split of the tasks (relaxation
+#                  of the MIP without shelves and integrality) keeps the
+#                  CPU work <= m * lambda and GPU work <= k * lambda
+# The upper bound is improved by the makespan of build_heft_schedule
+# (the MIP is feasible for any lambda >= OPT).
+#
+# run as script, it reports how many bisection probes (worst case) the
+# bounds save on the instance grid of problem_generator.py.
+
+import sys
+import os
+import math
+import numpy as np
+
+import approx_common
+import apply_heft
+
+from optparse import OptionParser
+from instance_common import GammaTable, get_allowed_sets, get_set_work
+
+# relative precision of the bisections of the area and split bounds
+BOUND_PRECISION = 1e-4
+
+HEFT_VARIANTS = [ ("lpt", 0), ("lpt", 1) ]
+
+
+def get_min_times(instance):
+    return np.minimum(instance.get_min_cpu_times(), instance.gpudata)
+
+def sum_in_order(values):
+    # left-to-right sum as in the loops of approx_common.jl (numpy sums pairwise)
+    if len(values) == 0:
+        return 0.0
+    return float(np.cumsum(values)[-1])
+
+def get_base_lower_bound(instance):
+    # compute_lowerbound of approx_common.jl
+    lb = sum_in_order(get_min_times(instance)) / (instance.m + instance.k)
+    return 2 * lb / 3.0
+
+def get_base_upper_bound(instance):
+    # compute_upperbound of approx_common.jl
+    return sum_in_order(np.maximum(instance.get_max_cpu_times(), instance.gpudata))
+
+def get_longest_task_bound(instance):
+    # largest lambda below the bound (at the bound the pre-check passes)
+    return float(np.nextafter(get_min_times(instance).max(), 0))
+
+
+def get_task_areas(instance, lambval):
+    """
+    Smallest CPU work over the allowed sets 1-5 and GPU time (if sets 6
+    or 7 are allowed) of every task at lambval, inf if there is none.
+    """
+    gamma = GammaTable(instance, lambval)
+    allowed = get_allowed_sets(instance, gamma)
+    work = np.where(allowed, get_set_work(instance, gamma), np.inf)
+    cpu_areas = work[:,:5].min(axis=1)
+    gpu_areas = np.where(allowed[:,5] | allowed[:,6], instance.gpudata, np.inf)
+    return cpu_areas, gpu_areas
+
+def is_area_infeasible(instance, lambval):
+    cpu_areas, gpu_areas = get_task_areas(instance, lambval)
+    areas = np.minimum(cpu_areas, gpu_areas)
+    return not np.isfinite(areas).all() or areas.sum() > (instance.m + instance.k) * lambval
+
+def is_split_infeasible(instance, lambval):
+    m = instance.m
+    k = instance.k
+    cpu_areas, gpu_areas = get_task_areas(instance, lambval)
+    on_cpu = np.isfinite(cpu_areas)
+    on_gpu = np.isfinite(gpu_areas)
+    if not (on_cpu | on_gpu).all():
+        return True
+
+    cpu_work = cpu_areas[on_cpu & ~on_gpu].sum()
+    gpu_work = gpu_areas[on_gpu & ~on_cpu].sum()
+    # at most k tasks can be in set 6 (GPU time > lambda/2)
+    if ((gpu_areas > lambval / 2) & on_gpu & ~on_cpu).sum() > k or cpu_work > m * lambval:
+        return True
+
+    # hybrid tasks go to the CPUs by decreasing GPU time per CPU work,
+    # the last one fractionally, as long as CPU work <= m * lambda
+    both = on_cpu & on_gpu
+    hyb_cpu = cpu_areas[both]
+    hyb_gpu = gpu_areas[both]
+    order = np.argsort(-hyb_gpu / hyb_cpu, kind="mergesort")
+    hyb_cpu = hyb_cpu[order]
+    hyb_gpu = hyb_gpu[order]
+
+    capacity = m * lambval - cpu_work
+    cum_cpu = np.cumsum(hyb_cpu)
+    nb_full = int(np.searchsorted(cum_cpu, capacity, side="right"))
+    gpu_work += hyb_gpu[nb_full:].sum()
+    if nb_full < len(hyb_cpu):
+        rest = capacity - (cum_cpu[nb_full-1] if nb_full > 0 else 0.0)
+        gpu_work -= hyb_gpu[nb_full] * rest / hyb_cpu[nb_full]
+
+    return gpu_work > k * lambval
+
+def bisect_infeasible(instance, lower, upper, is_infeasible):
+    """
+    Largest lambda in [lower, upper] found by bisection (up to
+    BOUND_PRECISION) for which is_infeasible holds, lower if it does
+    not hold at lower.
+    """
+    if not is_infeasible(instance, lower):
+        return lower
+    while upper/lower > 1.0 + BOUND_PRECISION:
+        mid = lower + (upper-lower)/2.0
+        if is_infeasible(instance, mid):
+            lower = mid
+        else:
+            upper = mid
+    return lower
+
+def get_area_bound(instance, lower, upper):
+    return bisect_infeasible(instance, lower, upper, is_area_infeasible)
+
+def get_split_bound(instance, lower, upper):
+    return bisect_infeasible(instance, lower, upper, is_split_infeasible)
+
+
+def get_heft_upper_bound(instance):
+    # best makespan of the HEFT_VARIANTS (their output is suppressed)
+    makespans = []
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        for prio, seq_only in HEFT_VARIANTS:
+            schedule = apply_heft.build_heft_schedule(instance, seq_only, prio, None)
+            makespans.append(schedule.get_makespan())
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return float(min(makespans))
+
+
+def get_all_bounds(instance):
+    """
+    dict with all lower and upper bounds, the area and split bounds are
+    searched above the longest-task bound.
+    """
+    ret = {}
+    ret["base_lower"] = get_base_lower_bound(instance)
+    ret["base_upper"] = get_base_upper_bound(instance)
+    ret["longest_task"] = get_longest_task_bound(instance)
+    ret["heft"] = get_heft_upper_bound(instance)
+
+    upper = min(ret["base_upper"], ret["heft"])
+    lower = max(ret["base_lower"], ret["longest_task"])
+    ret["area"] = get_area_bound(instance, lower, upper)
+    ret["split"] = get_split_bound(instance, max(lower, ret["area"]), upper)
+    return ret
+
+def get_lambda_bounds(instance):
+    # (lower, upper) for the lambda search
+    bounds = get_all_bounds(instance)
+    lower = max(bounds["base_lower"], bounds["longest_task"], bounds["area"], bounds["split"])
+    upper = min(bounds["base_upper"], bounds["heft"])
+    return lower, upper
+
+def get_nb_bisect_probes(lower, upper):
+    """
+    Worst-case number of bisection probes until upper/lower <=
+    cutoff_ratio (every probe feasible, so only upper moves).
+    """
+    cutoff = approx_common.cutoff_ratio
+    if upper <= cutoff * lower:
+        return 0
+    return int(math.ceil(math.log((upper-lower) / ((cutoff-1.0) * lower), 2)))
+
+
+# bracket of every variant of the report
+VARIANTS = [
+    ("base",         lambda b: (b["base_lower"], b["base_upper"])),
+    ("longest_task", lambda b: (max(b["base_lower"], b["longest_task"]), b["base_upper"])),
+    ("area",         lambda b: (max(b["base_lower"], b["longest_task"], b["area"]), b["base_upper"])),
+    ("split",        lambda b: (max(b["base_lower"], b["longest_task"], b["area"], b["split"]), b["base_upper"])),
+    ("heft",         lambda b: (b["base_lower"], min(b["base_upper"], b["heft"]))),
+    ("all",          lambda b: (max(b["base_lower"], b["longest_task"], b["area"], b["split"]),
+                                min(b["base_upper"], b["heft"])))
+]
+
+def get_probe_counts(instance):
+    bounds = get_all_bounds(instance)
+    return [ get_nb_bisect_probes(*get_bracket(bounds)) for name, get_bracket in VARIANTS ]
+
+def print_report(rows):
+    # rows: (n, probe counts of VARIANTS)
+    names = [ name for name, get_bracket in VARIANTS ]
+    print "%-8s %6s" % ( "n", "inst" ) + "".join([ " %12s" % ( name ) for name in names ])
+    for n in sorted(set([ row[0] for row in rows ])) + [ None ]:
+        counts = np.array([ row[1] for row in rows if n == None or row[0] == n ], dtype=np.float64)
+        means = counts.mean(axis=0)
+        print "%-8s %6d" % ( "all" if n == None else n, len(counts) ) + \
+            "".join([ " %12.2f" % ( v ) for v in means ])
+        print "%-8s %6s" % ( "", "saved" ) + \
+            "".join([ " %12.2f" % ( means[0] - v ) for v in means ])
+
+
+if __name__ == "__main__":
+
+    import problem_generator
+
+    parser = OptionParser( usage = "usage: %prog [options]" )
+
+    parser.add_option( "-n", "--ntasks",
+                       action  = "store",
+                       dest    = "ntasks",
+                       type    = "string",
+                       default = "10,100,1000",
+                       help    = "comma separated list of task counts (default: 10,100,1000)" )
+
+    parser.add_option( "-i", "--instances",
+                       action  = "store",
+                       dest    = "nb_instances",
+                       type    = "int",
+                       default = 3,
+                       help    = "instances per (n, m, k)" )
+
+    parser.add_option( "-d", "--dir",
+                       action  = "store",
+                       dest    = "indir",
+                       type    = "string",
+                       help    = "use the instances of this directory instead of the grid" )
+
+    ( options, args ) = parser.parse_args()
+
+    approx_common.init_system()
+
+    rows = []
+    if options.indir != None:
+        if not os.path.isdir(options.indir):
+            print >> sys.stderr, "input directory invalid"
+            sys.exit(1)
+        for fname in sorted(os.listdir(options.indir)):
+            if ".in" not in fname:
+                continue
+            instance = approx_common.load_instance(os.path.join(options.indir, fname))
+            rows.append( (instance.n, get_probe_counts(instance)) )
+    else:
+        try:
+            nlist = [ int(n) for n in options.ntasks.split(",") ]
+        except ValueError:
+            print >> sys.stderr, "task counts invalid"
+            sys.exit(1)
+        for job in problem_generator.get_sweep_jobs(nlist, options.nb_instances, "normal", "none"):
+            instance = problem_generator.generate_instance(job["n"], job["m"], job["k"], job["seed"])
+            rows.append( (job["n"], get_probe_counts(instance)) )
+
+    print_report(rows)
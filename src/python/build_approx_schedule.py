@@ -18,17 +18,20 @@
 
 import sys
 import os
-import yaml
 import approx_common
 
+from collections import deque
+
 from optparse import OptionParser
-from schedule_common import Core, GPU, MoldSchedule, ImtsTaskRect
+from schedule_common import Core, GPU, PUQueue, MoldSchedule, ImtsTaskRect
+from instance_common import as_scheduling_instance
+from schedule_validation import check_schedule
+from instrumentation import get_profiler, finish_profiler
 
-def try_whether_seq_task_fits( core, cpudata, task_id, bound ):
+def try_whether_seq_task_fits( core, instance, task_id, bound ):
     fits = 0
 
-    task_str = approx_common.get_task_str(task_id)
-    seq_time = cpudata[task_str][0]
+    seq_time = instance.get_seq_time(task_id)
 
     if core.get_lasttime() + seq_time <= bound:
         fits = 1
@@ -37,11 +40,9 @@ def try_whether_seq_task_fits( core, cpudata, task_id, bound ):
 
     return fits
 
-def schedule_seq_task( schedule, core, cpudata, task_id, set_id):
-
-    task_str = approx_common.get_task_str(task_id)
+def schedule_seq_task( schedule, core, instance, task_id, set_id):
 
-    seq_time = cpudata[task_str][0]
+    seq_time = instance.get_seq_time(task_id)
 
     task_start_time = core.get_lasttime()
     task_end_time   = core.get_lasttime() + seq_time
@@ -55,9 +56,8 @@ def schedule_seq_task( schedule, core, cpudata, task_id, set_id):
 
     schedule.add_task_rect(task_rect)
 
-def schedule_par_task(schedule, core_id, task_np, cores, cpudata, task_id, set_id):
-    task_str = approx_common.get_task_str(task_id)
-    task_time = approx_common.get_time_by_procs(cpudata, task_str, task_np)
+def schedule_par_task(schedule, core_id, task_np, cores, instance, task_id, set_id):
+    task_time = instance.get_time_by_procs(task_id, task_np)
 
     min_start_time = 0.0
     for core in cores[core_id:core_id+task_np]:
@@ -77,11 +77,9 @@ def schedule_par_task(schedule, core_id, task_np, cores, cpudata, task_id, set_i
     schedule.add_task_rect(task_rect)
 
 
-def schedule_gpu_task( schedule, gpu, gpudata, task_id, set_id):
-
-    task_str = approx_common.get_task_str(task_id)
+def schedule_gpu_task( schedule, gpu, instance, task_id, set_id):
 
-    gputime = gpudata[task_str]
+    gputime = instance.get_gpu_time(task_id)
 
     task_start_time = gpu.get_lasttime()
     task_end_time   = gpu.get_lasttime() + gputime
@@ -95,12 +93,16 @@ def schedule_gpu_task( schedule, gpu, gpudata, task_id, set_id):
 
     schedule.add_task_rect(task_rect)
 
-def get_taskids_of_set(solution_data, set_id):
-    set_tasks = []
-    for task_id in solution_data["task_hash"].keys():
-        if solution_data["task_hash"][task_id] == set_id:
-            set_tasks.append(task_id)
-    return set_tasks
+def get_taskids_by_set(solution_data):
+    # one pass over the solution: set number (1-7) -> list of task ids
+    # task ids and set labels may be given as int or string
+    tasks_by_set = dict( (set_id, []) for set_id in xrange(1, 8) )
+    for task_id, set_id in solution_data["task_hash"].iteritems():
+        set_tasks = tasks_by_set.get(int(set_id))
+        if set_tasks == None:
+            raise ValueError("task %s assigned to invalid set %s" % (task_id, set_id))
+        set_tasks.append(int(task_id))
+    return tasks_by_set
 
 def get_next_free_core_idx(cores):
     idx = -1
@@ -110,11 +112,10 @@ def get_next_free_core_idx(cores):
             break
     return idx
 
-def lpt_sort_seq_cpu_tasks(task_set, cpudata):
+def lpt_sort_seq_cpu_tasks(task_set, instance):
     tl = []
     for task_id in task_set:
-        task_str = approx_common.get_task_str(task_id)
-        seq_time = cpudata[task_str][0]
+        seq_time = instance.get_seq_time(task_id)
         tl.append( (task_id, seq_time) )
     tl = sorted(tl, key=lambda item: item[1], reverse=True)
 
@@ -124,21 +125,20 @@ def lpt_sort_seq_cpu_tasks(task_set, cpudata):
 
     return lpt_set2
 
-def lpt_sort_cpu_tasks_set2(task_set, cpudata):
+def lpt_sort_cpu_tasks_set2(task_set, instance):
     tl = []
     for task_id in task_set:
-        task_str = approx_common.get_task_str(task_id)
-        seq_time = cpudata[task_str][0]
+        seq_time = instance.get_seq_time(task_id)
         tl.append( (task_id, seq_time) )
 
-    tl = sorted(tl, key=lambda item: item[1])
+    tl = deque(sorted(tl, key=lambda item: item[1]))
 
     tllpt = []
     while tl:
         tllpt.append(tl.pop())
         if (len(tl) == 0):
             break;
-        tllpt.append(tl.pop(0))
+        tllpt.append(tl.popleft())
 
     lpt_set2 = []
     for item in tllpt:
@@ -147,11 +147,10 @@ def lpt_sort_cpu_tasks_set2(task_set, cpudata):
     return lpt_set2
 
 
-def lpt_sort_gpu_tasks(task_set, gpudata):
+def lpt_sort_gpu_tasks(task_set, instance):
     tl = []
     for task_id in task_set:
-        task_str = approx_common.get_task_str(task_id)
-        seq_time = gpudata[task_str]
+        seq_time = instance.get_gpu_time(task_id)
         tl.append( (task_id, seq_time) )
     tl = sorted(tl, key=lambda item: item[1], reverse=True)
 
@@ -173,6 +172,14 @@ def build_schedule(input_data, solution_data, lambval, jedfile, csvfile=None):
     # 6: > 1/2 lambda and <= lambda -> GPU
     # 7: <= 1/2 lambda -> GPU
 
+    approx_common.init_system()
+
+    prof = get_profiler("build_schedule")
+    if prof != None:
+        prof.start_phase("setup")
+
+    instance = as_scheduling_instance(input_data)
+
     # first check whether solution is correct
     sol_work = float(solution_data["work"])
     if approx_common.debug == 1:
@@ -180,8 +187,8 @@ def build_schedule(input_data, solution_data, lambval, jedfile, csvfile=None):
 
     # work should be <= lambda * m
     if approx_common.debug == 1:
-        print "lambda * m :", float(lambval) * float(input_data["meta"]["m"])
-    if sol_work > float(lambval) * float(input_data["meta"]["m"]):
+        print "lambda * m :", float(lambval) * float(instance.m)
+    if sol_work > float(lambval) * float(instance.m):
         print >> sys.stderr, "solution invalid (> lambda * m)"
         sys.exit(1)
 
@@ -189,9 +196,9 @@ def build_schedule(input_data, solution_data, lambval, jedfile, csvfile=None):
         for task_id in solution_data["task_hash"].keys():
             print task_id, " -> set", solution_data["task_hash"][task_id]
 
-    nb_tasks = int(input_data["meta"]["n"])
-    Core.nb_pus = int(input_data["meta"]["m"])
-    GPU.nb_pus = int(input_data["meta"]["k"])
+    nb_tasks = instance.n
+    Core.nb_pus = instance.m
+    GPU.nb_pus = instance.k
 
     approx_bound = 3.0/2.0 * float(lambval)
 
@@ -203,6 +210,12 @@ def build_schedule(input_data, solution_data, lambval, jedfile, csvfile=None):
 
     schedule.set_metainfo("lambda", lambval)
 
+    # canonical number of cores for lambda, lambda/2 and 3/2 lambda
+    gamma = approx_common.get_gamma_table(instance, float(lambval))
+
+    # task ids of all sets, grouped in one pass over the solution
+    tasks_by_set = get_taskids_by_set(solution_data)
+
     ##################
     ###### CPU #######
     ##################
@@ -210,8 +223,11 @@ def build_schedule(input_data, solution_data, lambval, jedfile, csvfile=None):
     # schedule tasks from set 2 (set 1 in paper)
     # can schedule two tasks right after each other
 
-    set_2_tasks_unsorted = get_taskids_of_set(solution_data, "2")
-    set_2_tasks = lpt_sort_cpu_tasks_set2(set_2_tasks_unsorted, input_data["cpudata"])
+    if prof != None:
+        prof.start_phase("set2")
+
+    set_2_tasks_unsorted = tasks_by_set[2]
+    set_2_tasks = lpt_sort_cpu_tasks_set2(set_2_tasks_unsorted, instance)
 
     #print "set2, unsorted: ", set_2_tasks_unsorted
     #print "set2, sorted  : ", set_2_tasks
@@ -222,89 +238,77 @@ def build_schedule(input_data, solution_data, lambval, jedfile, csvfile=None):
     task_pos = 0
     core_id  = 0
     while task_pos + 1 < len(set_2_tasks):
-        schedule_seq_task( schedule, cores[core_id], input_data["cpudata"], set_2_tasks[task_pos], "2")
-        schedule_seq_task( schedule, cores[core_id], input_data["cpudata"], set_2_tasks[task_pos+1], "2")
+        schedule_seq_task( schedule, cores[core_id], instance, set_2_tasks[task_pos], "2")
+        schedule_seq_task( schedule, cores[core_id], instance, set_2_tasks[task_pos+1], "2")
         core_id += 1
         task_pos += 2
 
     #print task_pos, len(set_2_tasks)
     if task_pos < len(set_2_tasks):
-        schedule_seq_task( schedule, cores[core_id], input_data["cpudata"], set_2_tasks[task_pos], "2")
+        schedule_seq_task( schedule, cores[core_id], instance, set_2_tasks[task_pos], "2")
 
     nb_core_with_two_tasks_set2 = len(set_2_tasks) / 2
     nb_core_with_one_task_set2  = len(set_2_tasks) % 2
 
     # now schedule large moldable tasks from set 3 (paper set 2)
-    set_3_tasks = get_taskids_of_set(solution_data, "3")
+    if prof != None:
+        prof.start_phase("set3")
+    set_3_tasks = tasks_by_set[3]
     if approx_common.debug == 1:
         print "set 3 tasks:", set_3_tasks
-    set_3_tasks_to_schedule = set_3_tasks[:]
     core_id = get_next_free_core_idx(cores)
-    while len(set_3_tasks_to_schedule) > 0:
-        mtask_id = set_3_tasks_to_schedule.pop(0)
-        mtask_str = approx_common.get_task_str(mtask_id)
-        mtask_procs = approx_common.get_procs_by_lambda(input_data["cpudata"], mtask_str, 3 * float(lambval) / 2)
-        schedule_par_task(schedule, core_id, mtask_procs, cores, input_data["cpudata"], mtask_id, "3")
+    for mtask_id in set_3_tasks:
+        mtask_procs = int(gamma.gamma_32lamb[instance.get_task_idx(mtask_id)])
+        schedule_par_task(schedule, core_id, mtask_procs, cores, instance, mtask_id, "3")
         core_id = core_id + mtask_procs
 
     # now schedule moldable tasks from set 4 (paper set 3)
-    set_4_tasks = get_taskids_of_set(solution_data, "4")
+    if prof != None:
+        prof.start_phase("set4")
+    set_4_tasks = tasks_by_set[4]
     if approx_common.debug == 1:
         print "set 4 tasks:", set_4_tasks
-    set_4_tasks_to_schedule = set_4_tasks[:]
     core_set_4_start_idx = get_next_free_core_idx(cores)
     core_set_4_idx = core_set_4_start_idx
-    while len(set_4_tasks_to_schedule) > 0:
-        mtask_id = set_4_tasks_to_schedule.pop(0)
-        mtask_str = approx_common.get_task_str(mtask_id)
-        mtask_procs = approx_common.get_procs_by_lambda(input_data["cpudata"], mtask_str, float(lambval) )
-        schedule_par_task(schedule, core_set_4_idx, mtask_procs, cores, input_data["cpudata"], mtask_id, "4")
+    for mtask_id in set_4_tasks:
+        mtask_procs = int(gamma.gamma_lamb[instance.get_task_idx(mtask_id)])
+        schedule_par_task(schedule, core_set_4_idx, mtask_procs, cores, instance, mtask_id, "4")
         core_set_4_idx += mtask_procs
 
     # now schedule (back-filling) moldable tasks from set 5 (paper set 4)
     # fill behind tasks from set 4
-    set_5_tasks = get_taskids_of_set(solution_data, "5")
+    if prof != None:
+        prof.start_phase("set5")
+    set_5_tasks = tasks_by_set[5]
     if approx_common.debug == 1:
         print "set 5 tasks:", set_5_tasks
-    set_5_tasks_to_schedule = set_5_tasks[:]
     core_set_5_idx = core_set_4_start_idx
-    while len(set_5_tasks_to_schedule) > 0:
-        mtask_id = set_5_tasks_to_schedule.pop(0)
-        mtask_str = approx_common.get_task_str(mtask_id)
-        mtask_procs = approx_common.get_procs_by_lambda(input_data["cpudata"], mtask_str, float(lambval) / 2 )
-        schedule_par_task(schedule, core_set_5_idx, mtask_procs, cores, input_data["cpudata"], mtask_id, "5")
+    for mtask_id in set_5_tasks:
+        mtask_procs = int(gamma.gamma_12lamb[instance.get_task_idx(mtask_id)])
+        schedule_par_task(schedule, core_set_5_idx, mtask_procs, cores, instance, mtask_id, "5")
         core_set_5_idx += mtask_procs
 
     # backfill all set 1 tasks from 0 -> m-1 (paper => set 0)
-    set_1_tasks = get_taskids_of_set(solution_data, "1")
+    if prof != None:
+        prof.start_phase("set1")
+    set_1_tasks = tasks_by_set[1]
     if approx_common.debug == 1:
         print "set 1 tasks:", set_1_tasks
 
+    set_1_tasks_to_schedule = lpt_sort_seq_cpu_tasks(set_1_tasks, instance)
 
-    set_1_tasks_to_schedule = set_1_tasks[:]
-    set_1_tasks_to_schedule = lpt_sort_seq_cpu_tasks(set_1_tasks_to_schedule, input_data["cpudata"])
+    # cores by earliest finish time
+    core_queue = PUQueue(cores)
 
-    while len(set_1_tasks_to_schedule) > 0:
+    for task_id in set_1_tasks_to_schedule:
 
-        task_id = set_1_tasks_to_schedule[0]
-        task_str = approx_common.get_task_str(task_id)
+        seq_time = instance.get_seq_time(task_id)
 
-        found_core_id = -1
-        eft_best = -1
-        for cid in xrange(0, Core.nb_pus):
+        core = core_queue.pop_within_bound(seq_time, approx_bound)
 
-            eft_core = cores[cid].get_lasttime() + input_data["cpudata"][task_str][0]
-            if eft_core <= approx_bound:
-                if eft_best == -1:
-                    eft_best = eft_core
-                    found_core_id = cid
-                elif eft_best > eft_core:
-                    eft_best = eft_core
-                    found_core_id = cid
-
-        if found_core_id != -1:
-            schedule_seq_task(schedule, cores[found_core_id], input_data["cpudata"], set_1_tasks_to_schedule[0], "1")
-            set_1_tasks_to_schedule.pop(0)
+        if core != None:
+            schedule_seq_task(schedule, core, instance, task_id, "1")
+            core_queue.push(core)
         else:
             print >> sys.stderr, "cannot schedule task", task_id, "(does nowhere fit)"
             raise RuntimeError
@@ -314,63 +318,53 @@ def build_schedule(input_data, solution_data, lambval, jedfile, csvfile=None):
     ##################
 
     # only GPU tasks available
-    set_6_tasks = get_taskids_of_set(solution_data, "6")
+    if prof != None:
+        prof.start_phase("set6")
+    set_6_tasks = tasks_by_set[6]
     if approx_common.debug == 1:
         print "set 6 tasks:", set_6_tasks
 
     gpu_id = 0
     # schedule each of these tasks on one GPU
-    set_6_to_schedule = set_6_tasks[:]
-    while len(set_6_to_schedule) > 0:
-        schedule_gpu_task(schedule, gpus[gpu_id], input_data["gpudata"], set_6_to_schedule[0], "6")
-        set_6_to_schedule.pop(0)
+    for task_id in set_6_tasks:
+        schedule_gpu_task(schedule, gpus[gpu_id], instance, task_id, "6")
         gpu_id += 1
 
     # now fill remaining GPU tasks behind tasks from set 6
-    set_7_tasks = get_taskids_of_set(solution_data, "7")
+    if prof != None:
+        prof.start_phase("set7")
+    set_7_tasks = tasks_by_set[7]
     if approx_common.debug == 1:
         print "set 7 tasks:", set_7_tasks
-    set_7_to_schedule = set_7_tasks[:]
-
 
-    #print "set7, unsorted: ", set_7_to_schedule
-    set_7_to_schedule = lpt_sort_gpu_tasks(set_7_to_schedule, input_data["gpudata"])
+    #print "set7, unsorted: ", set_7_tasks
+    set_7_to_schedule = lpt_sort_gpu_tasks(set_7_tasks, instance)
     #print "set7, sorted  : ", set_7_to_schedule
 
     # we do the same best eft approach as for the core tasks
-    while len(set_7_to_schedule) > 0:
-
-        task_id = set_7_to_schedule[0]
-        task_str = approx_common.get_task_str(task_id)
+    gpu_queue = PUQueue(gpus)
 
-        found_gpu_id = -1
-        eft_best = -1
+    for task_id in set_7_to_schedule:
 
-        for gid in xrange(0, GPU.nb_pus):
+        gpu_time = instance.get_gpu_time(task_id)
 
-            eft_gpu = gpus[gid].get_lasttime() + input_data["gpudata"][task_str]
-            if eft_gpu <= approx_bound:
-                if eft_best == -1:
-                    eft_best = eft_gpu
-                    found_gpu_id = gid
-                elif eft_best > eft_gpu:
-                    eft_best = eft_gpu
-                    found_gpu_id = gid
+        gpu = gpu_queue.pop_within_bound(gpu_time, approx_bound)
 
-        if found_gpu_id != -1:
-            schedule_gpu_task(schedule, gpus[found_gpu_id], input_data["gpudata"], set_7_to_schedule[0], "7")
-            set_7_to_schedule.pop(0)
+        if gpu != None:
+            schedule_gpu_task(schedule, gpu, instance, task_id, "7")
+            gpu_queue.push(gpu)
         else:
             print >> sys.stderr, "cannot schedule GPU task", task_id, "(does nowhere fit)"
             raise RuntimeError
 
-    makespan = 0.0
-    for task_rect in schedule.get_task_rects():
-        if makespan < task_rect.get_end_time():
-            makespan = task_rect.get_end_time()
-        if approx_common.debug == 1:
+    makespan = schedule.get_makespan()
+    if approx_common.debug == 1:
+        for task_rect in schedule.get_task_rects():
             task_rect.print_rect()
 
+    if prof != None:
+        prof.start_phase("output")
+
     if jedfile != None and jedfile != "":
         approx_common.write_jedfile(jedfile, schedule)
 
@@ -378,23 +372,38 @@ def build_schedule(input_data, solution_data, lambval, jedfile, csvfile=None):
         approx_common.write_csv_output(csvfile, schedule)
 
     # sanity check
+    if prof != None:
+        prof.start_phase("checks")
+
     bound = 3 * float(lambval) / 2
     if makespan > bound:
         print "ATTENTION ! INVALID SOLUTION"
         print "makespan  : ", makespan
         print "3/2 lambda: ", bound
 
-    if len(schedule.get_task_rects()) != nb_tasks:
+    if schedule.get_nb_task_rects() != nb_tasks:
         print "ATTENTION ! PROBLEM DETECTED"
-        print "nb scheduled tasks: ", len(schedule.get_task_rects())
+        print "nb scheduled tasks: ", schedule.get_nb_task_rects()
         print "nb tasks in prob. : ", nb_tasks
 
+    if approx_common.validate == 1:
+        check_schedule(instance, schedule)
+
+    if prof != None:
+        # one EFT query to the PU queues per task of set 1 and set 7, one
+        # sort per set 2, 1 and 7 of more than one task
+        prof.add_count("eft_evaluations", len(set_1_tasks) + len(set_7_tasks))
+        prof.add_count("sorts", sum([ int(len(tasks) > 1) for tasks in ( set_2_tasks, set_1_tasks, set_7_tasks ) ]))
+        prof.add_count("rect_allocations", schedule.get_nb_task_rects())
+        finish_profiler(prof, schedule)
 
     print "bound:", bound
     print "makespan:", makespan
 
     sys.stdout.flush()
 
+    return schedule
+
 if __name__ == "__main__":
 
     parser = OptionParser( usage = "usage: %prog [options]" )
@@ -443,18 +452,8 @@ if __name__ == "__main__":
 
     approx_common.init_system()
 
-    fh = open(options.ininst)
-    input_content = fh.readlines()
-    fh.close()
-    input_content = "".join(input_content)
-
-    inputdata = yaml.load(input_content)
-
-    fh = open(options.solfile)
-    solution_content = fh.readlines()
-    fh.close()
-    solution_content = "".join(solution_content)
+    inputdata = approx_common.load_instance(options.ininst)
 
-    solutiondata = yaml.load(solution_content)
+    solutiondata = approx_common.load_json_file(options.solfile)
 
     build_schedule(inputdata, solutiondata, options.lambval, options.jedfile)
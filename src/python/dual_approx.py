@@ -0,0 +1,328 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# 3/2 dual approximation without Julia (like approx3_2.jl)
+#
+# lambda is found by bisection between the bounds of bounds.py (or
+# compute_lowerbound and compute_upperbound of approx_common.jl with
+# -b); every probe is a MIP feasibility test solved by glpsol or
+# symphony (see mip_solver.py). The solution of the last feasible probe
+# goes to build_schedule.
+#
+# with -k > 1, [lower, upper] is split into k+1 intervals per round and
+# the k probes are solved concurrently. As feasibility is monotone in
+# lambda, every result moves lower or upper, and the probes outside of
+# the new interval are cancelled.
+#
+# with a feasibility cache (-C file or DUALAPPROX_FEASIBILITY_CACHE),
+# repeated runs on the same instance answer their probes from the cache.
+
+import sys
+import os
+import time
+import Queue
+
+import approx_common
+import build_approx_schedule
+import bounds
+
+from optparse import OptionParser
+from instance_common import as_scheduling_instance
+from mip_solver import SolverPool, get_solver, find_solver, solvers
+from feasibility_cache import FeasibilityCache
+
+stats = {}
+
+
+def find_lambda_by_bisect_search(instance, lower, upper, pool):
+    """
+    Smallest feasible lambda (up to approx_common.cutoff_ratio) and its
+    solution, (-1, None) if no probe was feasible.
+    """
+    r_lambda = -1
+    r_solution = None
+
+    stats["nb_of_iterations"] = 0
+    stats["nb_cache_hits"] = 0
+    stats["total_solve_time"] = 0.0
+    stats["nb_free_var"] = []
+    stats["avg_nb_var"] = []
+    stats["nb_changed_tasks"] = []
+
+    while upper/lower > approx_common.cutoff_ratio:
+
+        bisect = lower + (upper-lower)/2.0
+
+        if approx_common.debug == 1:
+            print "bisect=", bisect
+
+        sol_hash = pool.solve(instance, bisect)
+
+        sol_stats = sol_hash["stats"]
+        if sol_stats.has_key("nb_free_var"):
+            stats["nb_free_var"].append(sol_stats["nb_free_var"])
+            stats["avg_nb_var"].append(sum(sol_stats["nb_free_var"]) / float(instance.n))
+        if sol_stats.has_key("nb_changed_tasks"):
+            stats["nb_changed_tasks"].append(sol_stats["nb_changed_tasks"])
+
+        stats["nb_of_iterations"] += 1
+        stats["total_solve_time"] += sol_hash["solve_time"]
+        if sol_hash["cached"]:
+            stats["nb_cache_hits"] += 1
+
+        if sol_hash["has_solution"]:
+            upper = bisect
+            r_lambda = bisect
+            r_solution = sol_hash["solution"]
+        else:
+            lower = bisect
+
+    stats["lower_bound"] = lower
+    if stats["nb_of_iterations"] > 0:
+        stats["mean_solve_time"] = stats["total_solve_time"] / float(stats["nb_of_iterations"])
+
+    return r_lambda, r_solution
+
+def find_lambda_by_ksection_search(instance, lower, upper, pool, nb_probes):
+    """
+    Like find_lambda_by_bisect_search, with nb_probes concurrent probes
+    per round (pool should have as many workers).
+
+    Results are taken in the order in which the probes end. A result that
+    contradicts the current interval (feasible at or below lower,
+    infeasible at or above upper) is not used, so lower < upper holds
+    even if feasibility is not monotone in lambda.
+    """
+    r_lambda = -1
+    r_solution = None
+
+    stats["nb_of_iterations"] = 0
+    stats["nb_cache_hits"] = 0
+    stats["nb_of_rounds"] = 0
+    stats["nb_cancelled"] = 0
+    stats["nb_non_monotone"] = 0
+    stats["total_solve_time"] = 0.0
+    stats["nb_free_var"] = []
+    stats["avg_nb_var"] = []
+    stats["nb_changed_tasks"] = []
+
+    start_time = time.time()
+    results = Queue.Queue()
+
+    while upper/lower > approx_common.cutoff_ratio:
+
+        step = (upper-lower) / (nb_probes+1)
+        probes = [ pool.submit(instance, lower + i*step, results.put) for i in xrange(1, nb_probes+1) ]
+        stats["nb_of_rounds"] += 1
+
+        if approx_common.debug == 1:
+            print "probes=", [ probe.lambval for probe in probes ]
+
+        for i in xrange(0, len(probes)):
+            sol_hash = results.get()
+            if sol_hash.has_key("error"):
+                for probe in probes:
+                    probe.cancel()
+                raise sol_hash["error"]
+            if sol_hash["cancelled"]:
+                stats["nb_cancelled"] += 1
+                continue
+
+            sol_stats = sol_hash["stats"]
+            if sol_stats.has_key("nb_free_var"):
+                stats["nb_free_var"].append(sol_stats["nb_free_var"])
+                stats["avg_nb_var"].append(sum(sol_stats["nb_free_var"]) / float(instance.n))
+            if sol_stats.has_key("nb_changed_tasks"):
+                stats["nb_changed_tasks"].append(sol_stats["nb_changed_tasks"])
+
+            stats["nb_of_iterations"] += 1
+            stats["total_solve_time"] += sol_hash["solve_time"]
+            if sol_hash["cached"]:
+                stats["nb_cache_hits"] += 1
+
+            probe_lambda = sol_hash["lambda"]
+            if sol_hash["has_solution"]:
+                if probe_lambda <= lower:
+                    stats["nb_non_monotone"] += 1
+                elif probe_lambda < upper:
+                    upper = probe_lambda
+                    r_lambda = probe_lambda
+                    r_solution = sol_hash["solution"]
+            elif probe_lambda >= upper:
+                stats["nb_non_monotone"] += 1
+            elif probe_lambda > lower:
+                lower = probe_lambda
+
+            # the results of the probes outside (lower, upper) are known
+            for probe in probes:
+                if probe.lambval >= upper or probe.lambval <= lower:
+                    probe.cancel()
+
+    stats["lower_bound"] = lower
+    stats["search_time"] = time.time() - start_time
+    if stats["nb_of_iterations"] > 0:
+        stats["mean_solve_time"] = stats["total_solve_time"] / float(stats["nb_of_iterations"])
+
+    return r_lambda, r_solution
+
+def solve_problem(input_data, jedfile=None, csvfile=None, solver=None, nb_probes=1, base_bounds=False,
+                  cache_file=None):
+    """
+    Runs the dual approximation and returns the schedule of
+    build_schedule (None if no lambda was found). nb_probes > 1 selects
+    the concurrent k-section search, base_bounds the bounds of
+    approx_common.jl. cache_file defaults to
+    approx_common.feasibility_cache_file.
+    """
+    instance = as_scheduling_instance(input_data)
+
+    if solver == None:
+        solver = find_solver()
+    if solver == None:
+        raise ValueError("no MIP solver found (%s)" % ( ", ".join(sorted(solvers.keys())) ))
+
+    if base_bounds:
+        lb = bounds.get_base_lower_bound(instance)
+        ub = bounds.get_base_upper_bound(instance)
+    else:
+        lb, ub = bounds.get_lambda_bounds(instance)
+
+    if approx_common.debug == 1:
+        print "lb:", lb
+        print "ub:", ub
+
+    stats.clear()
+
+    if cache_file == None:
+        cache_file = approx_common.feasibility_cache_file
+    cache = FeasibilityCache(cache_file) if cache_file != None else None
+
+    pool = SolverPool(solver, nb_probes, cache)
+    try:
+        if nb_probes > 1:
+            lambval, solution = find_lambda_by_ksection_search(instance, lb, ub, pool, nb_probes)
+        else:
+            lambval, solution = find_lambda_by_bisect_search(instance, lb, ub, pool)
+
+        if lambval == -1 and not base_bounds:
+            # the upper bound itself is never probed by the search
+            sol_hash = pool.solve(instance, ub)
+            if sol_hash["has_solution"]:
+                lambval, solution = ub, sol_hash["solution"]
+
+        if lambval != -1 and solution == None:
+            # feasibility of lambda was known from the cache, not its solution
+            solution = pool.solve(instance, lambval, need_solution=True)["solution"]
+    finally:
+        pool.close()
+        if cache != None:
+            cache.close()
+
+    if lambval == -1:
+        print "could not find solution"
+        return None
+
+    print "best lambda: %f" % ( lambval )
+    for key in sorted(stats.keys()):
+        print "%s: %s" % ( key, stats[key] )
+
+    # the solution may be shared with the feasibility cache
+    solution = dict(solution)
+    solution["lambda"] = lambval
+    return build_approx_schedule.build_schedule(instance, solution, lambval, jedfile, csvfile)
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser( usage = "usage: %prog [options]" )
+
+    parser.add_option( "-i", "--input",
+                       action  = "store",
+                       dest    = "ininst",
+                       type    = "string",
+                       help    = "file with input data" )
+
+    parser.add_option( "-j", "--jedule",
+                       action  = "store",
+                       dest    = "jedfile",
+                       type    = "string",
+                       help    = "file name for jedule output" )
+
+    parser.add_option( "-c", "--csv",
+                       action  = "store",
+                       dest    = "csvfile",
+                       type    = "string",
+                       help    = "file name for csv output" )
+
+    parser.add_option( "-S", "--solver",
+                       action  = "store",
+                       dest    = "solver",
+                       type    = "string",
+                       help    = "MIP solver (%s)" % ( ", ".join(sorted(solvers.keys())) ) )
+
+    parser.add_option( "-k", "--probes",
+                       action  = "store",
+                       dest    = "nb_probes",
+                       type    = "int",
+                       default = 1,
+                       help    = "concurrent probes per round (k-section search, default: 1 = bisection)" )
+
+    parser.add_option( "-b", "--base-bounds",
+                       action  = "store_true",
+                       dest    = "base_bounds",
+                       help    = "start from the bounds of approx_common.jl",
+                       default = False )
+
+    parser.add_option( "-C", "--cache",
+                       action  = "store",
+                       dest    = "cache_file",
+                       type    = "string",
+                       help    = "feasibility cache (SQLite file, created if missing)" )
+
+    ( options, args ) = parser.parse_args()
+
+    if options.ininst == None or not os.path.exists(options.ininst):
+        print >> sys.stderr, "input file invalid"
+        parser.print_help()
+        sys.exit(1)
+
+    if options.nb_probes < 1:
+        print >> sys.stderr, "number of probes invalid"
+        parser.print_help()
+        sys.exit(1)
+
+    if options.solver != None and options.solver not in solvers:
+        print >> sys.stderr, "unknown solver:", options.solver
+        sys.exit(1)
+
+    approx_common.init_system()
+
+    if options.solver != None:
+        solver = get_solver(options.solver)
+    else:
+        solver = find_solver()
+    if solver == None:
+        print >> sys.stderr, "MIP solver not found"
+        sys.exit(1)
+
+    inputdata = approx_common.load_instance(options.ininst)
+
+    schedule = solve_problem(inputdata, options.jedfile, options.csvfile, solver, options.nb_probes, options.base_bounds,
+                             options.cache_file)
+    if schedule == None:
+        sys.exit(1)
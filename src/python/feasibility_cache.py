@@ -0,0 +1,207 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# persistent results of MIP feasibility probes (SQLite)
+#
+# key: sha1 of the instance content and lambda rounded to LAMBDA_DIGITS
+# significant digits, value: feasible, work and the set of every task
+# (one byte per task, zlib compressed). Exact lookups go through an
+# in-memory LRU front. Without an exact entry, feasibility is monotone
+# in lambda: above the smallest feasible lambda of an instance a probe
+# is feasible, below the largest infeasible one it is not (those
+# answers have no solution).
+#
+# run as script, it prints the number of entries per instance.
+
+import sys
+import os
+import zlib
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from optparse import OptionParser
+from instance_common import AmdahlInstance
+
+LAMBDA_DIGITS = 10
+
+# exact entries kept in memory
+LRU_SIZE = 256
+
+# seconds to wait for the database lock of other processes
+DB_TIMEOUT = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    instance   TEXT NOT NULL,
+    lambda     REAL NOT NULL,
+    feasible   INTEGER NOT NULL,
+    work       REAL,
+    assignment BLOB,
+    PRIMARY KEY (instance, lambda)
+)
+"""
+
+
+def get_instance_hash(instance):
+    # hex sha1 of n, m, k and the timing data (parameters of an AmdahlInstance)
+    sha1 = hashlib.sha1()
+    sha1.update("%d %d %d" % ( instance.n, instance.m, instance.k ))
+    if isinstance(instance, AmdahlInstance):
+        sha1.update("amdahl")
+        sha1.update(instance.seq_times.astype("<f8").tostring())
+        sha1.update(instance.sfrac.astype("<f8").tostring())
+    else:
+        sha1.update(instance.cpudata.astype("<f8").tostring())
+    sha1.update(instance.gpudata.astype("<f8").tostring())
+    return sha1.hexdigest()
+
+def round_lambda(lambval):
+    return float("%.*g" % ( LAMBDA_DIGITS, lambval ))
+
+def encode_assignment(nb_tasks, task_hash):
+    sets = np.zeros(nb_tasks, dtype=np.uint8)
+    for task_id, set_id in task_hash.iteritems():
+        sets[int(task_id)-1] = int(set_id)
+    return zlib.compress(sets.tostring())
+
+def decode_assignment(blob):
+    sets = np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+    return dict([ (str(i+1), str(s)) for i, s in enumerate(sets.tolist()) ])
+
+
+class FeasibilityCache:
+    """
+    Probe results of all instances in one SQLite file. lookup() and
+    store() may be called from several threads.
+    """
+
+    def __init__(self, fname, lru_size=LRU_SIZE):
+        self.fname = fname
+        self.lru_size = lru_size
+        self.lru = OrderedDict()    # (instance hash, lambda) -> result
+        self.limits = {}            # instance hash -> [min feasible, max infeasible]
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(fname, timeout=DB_TIMEOUT, check_same_thread=False)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def make_result(self, feasible, work, assignment):
+        ret = { "has_solution" : bool(feasible), "solution" : None }
+        if feasible and assignment != None:
+            ret["solution"] = { "work" : work, "task_hash" : decode_assignment(str(assignment)) }
+        return ret
+
+    def remember(self, key, result):
+        self.lru[key] = result
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def get_limits(self, ihash):
+        if ihash not in self.limits:
+            row = self.conn.execute("SELECT MIN(CASE WHEN feasible = 1 THEN lambda END), "
+                                    "MAX(CASE WHEN feasible = 0 THEN lambda END) "
+                                    "FROM probes WHERE instance = ?", (ihash,)).fetchone()
+            self.limits[ihash] = [ row[0], row[1] ]
+        return self.limits[ihash]
+
+    def lookup(self, ihash, lambval, need_solution=False):
+        """
+        dict with has_solution and solution (None if the answer comes
+        from monotonicity), None if the cache cannot tell. With
+        need_solution, feasible answers without solution are not used.
+        """
+        key = (ihash, round_lambda(lambval))
+        self.lock.acquire()
+        try:
+            if key in self.lru:
+                result = self.lru.pop(key)
+                self.lru[key] = result
+                return result
+
+            row = self.conn.execute("SELECT feasible, work, assignment FROM probes "
+                                    "WHERE instance = ? AND lambda = ?", key).fetchone()
+            if row != None:
+                result = self.make_result(*row)
+                self.remember(key, result)
+                return result
+
+            min_feasible, max_infeasible = self.get_limits(ihash)
+            is_feasible = min_feasible != None and key[1] >= min_feasible
+            is_infeasible = max_infeasible != None and key[1] <= max_infeasible
+            # both (lambda not monotone for this instance): ask the solver
+            if is_infeasible and not is_feasible:
+                return { "has_solution" : False, "solution" : None }
+            if is_feasible and not is_infeasible and not need_solution:
+                return { "has_solution" : True, "solution" : None }
+            return None
+        finally:
+            self.lock.release()
+
+    def store(self, ihash, lambval, nb_tasks, has_solution, solution):
+        key = (ihash, round_lambda(lambval))
+        work = None
+        assignment = None
+        if has_solution:
+            work = float(solution["work"])
+            assignment = sqlite3.Binary(encode_assignment(nb_tasks, solution["task_hash"]))
+
+        self.lock.acquire()
+        try:
+            self.conn.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)",
+                              key + ( int(has_solution), work, assignment ))
+            self.conn.commit()
+
+            limits = self.get_limits(ihash)
+            if has_solution and (limits[0] == None or key[1] < limits[0]):
+                limits[0] = key[1]
+            if not has_solution and (limits[1] == None or key[1] > limits[1]):
+                limits[1] = key[1]
+            self.remember(key, self.make_result(has_solution, work, assignment))
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+
+    parser = OptionParser( usage = "usage: %prog [options]" )
+
+    parser.add_option( "-f", "--file",
+                       action  = "store",
+                       dest    = "cache_file",
+                       type    = "string",
+                       help    = "feasibility cache (SQLite file)" )
+
+    ( options, args ) = parser.parse_args()
+
+    if options.cache_file == None or not os.path.exists(options.cache_file):
+        print >> sys.stderr, "cache file invalid"
+        parser.print_help()
+        sys.exit(1)
+
+    cache = FeasibilityCache(options.cache_file)
+    for row in cache.conn.execute("SELECT instance, COUNT(*), SUM(feasible), "
+                                  "MIN(CASE WHEN feasible = 1 THEN lambda END) "
+                                  "FROM probes GROUP BY instance ORDER BY instance"):
+        print "%s probes: %d feasible: %d min feasible lambda: %s" % row
+    cache.close()
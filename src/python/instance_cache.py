@@ -0,0 +1,189 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# binary side files for instances (e.g., problem.in.bz2 -> problem.in.bz2.cache)
+#
+# layout (little endian):
+#   header (HEADER_SIZE bytes): magic, version, kind, n, m, k,
+#                               mtime, size and sha1 of the source file
+#   kind KIND_TABLE:
+#     n*m float64: cpudata (row major)
+#     n   float64: gpudata
+#   kind KIND_AMDAHL (AmdahlInstance, no n x m table):
+#     n   float64: seq_times
+#     n   float64: sfrac
+#     n   float64: gpudata
+
+import sys
+import os
+import struct
+import hashlib
+import numpy as np
+
+from optparse import OptionParser
+from instance_common import SchedulingInstance, AmdahlInstance
+
+CACHE_SUFFIX = ".cache"
+
+CACHE_MAGIC = "MOLDINST"
+CACHE_VERSION = 2
+
+KIND_TABLE = 0
+KIND_AMDAHL = 1
+
+HEADER_FORMAT = "<8sIIqqqdq20s"
+HEADER_SIZE = 128
+
+
+def get_cache_fname(instance_fname):
+    return instance_fname + CACHE_SUFFIX
+
+def get_file_sha1(fname):
+    sha1 = hashlib.sha1()
+    fh = open(fname, "rb")
+    while True:
+        chunk = fh.read(1 << 20)
+        if not chunk:
+            break
+        sha1.update(chunk)
+    fh.close()
+    return sha1.digest()
+
+def read_cache_header(cache_fname):
+    fh = open(cache_fname, "rb")
+    raw = fh.read(HEADER_SIZE)
+    fh.close()
+    if len(raw) != HEADER_SIZE:
+        return None
+
+    fields = struct.unpack(HEADER_FORMAT, raw[:struct.calcsize(HEADER_FORMAT)])
+    magic, version, kind, n, m, k, mtime, size, sha1 = fields
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+    if kind != KIND_TABLE and kind != KIND_AMDAHL:
+        return None
+
+    return {
+        "kind"  : kind,
+        "n"     : n,
+        "m"     : m,
+        "k"     : k,
+        "mtime" : mtime,
+        "size"  : size,
+        "sha1"  : sha1
+    }
+
+def is_cache_valid(instance_fname, header, verify_hash=False):
+    # cheap check on mtime and size, the hash needs to read the source
+    st = os.stat(instance_fname)
+    if header["mtime"] != st.st_mtime or header["size"] != st.st_size:
+        return False
+    if verify_hash and header["sha1"] != get_file_sha1(instance_fname):
+        return False
+    return True
+
+def write_instance_cache(instance_fname, instance):
+    """
+    Write instance (loaded from instance_fname) as binary side file.
+    An AmdahlInstance keeps its parameters, its table is not built.
+    """
+    cache_fname = get_cache_fname(instance_fname)
+    st = os.stat(instance_fname)
+
+    if isinstance(instance, AmdahlInstance):
+        kind = KIND_AMDAHL
+        arrays = [ instance.seq_times, instance.sfrac, instance.gpudata ]
+    else:
+        kind = KIND_TABLE
+        arrays = [ instance.cpudata, instance.gpudata ]
+
+    header = struct.pack(HEADER_FORMAT, CACHE_MAGIC, CACHE_VERSION, kind,
+                         instance.n, instance.m, instance.k,
+                         st.st_mtime, st.st_size, get_file_sha1(instance_fname))
+
+    # write to a temporary file first, readers never see partial caches
+    tmp_fname = "%s.%d.tmp" % ( cache_fname, os.getpid() )
+    fh = open(tmp_fname, "wb")
+    fh.write(header.ljust(HEADER_SIZE, "\0"))
+    for arr in arrays:
+        fh.write(arr.astype("<f8").tostring())
+    fh.close()
+    os.rename(tmp_fname, cache_fname)
+
+    return cache_fname
+
+def load_cached_instance(instance_fname, verify_hash=False):
+    """
+    Memory-map the side file of instance_fname. Returns None if there
+    is no cache or if it is stale.
+    """
+    cache_fname = get_cache_fname(instance_fname)
+    if not os.path.exists(cache_fname):
+        return None
+
+    header = read_cache_header(cache_fname)
+    if header == None or not is_cache_valid(instance_fname, header, verify_hash):
+        return None
+
+    n = header["n"]
+    m = header["m"]
+
+    if header["kind"] == KIND_AMDAHL:
+        data = np.memmap(cache_fname, dtype="<f8", mode="r", offset=HEADER_SIZE, shape=(3*n,))
+        return AmdahlInstance(n, m, header["k"], data[:n], data[n:2*n], data[2*n:])
+
+    data = np.memmap(cache_fname, dtype="<f8", mode="r", offset=HEADER_SIZE, shape=(n*m + n,))
+    cpudata = data[:n*m].reshape(n, m)
+    gpudata = data[n*m:]
+
+    return SchedulingInstance(n, m, header["k"], cpudata, gpudata)
+
+
+if __name__ == "__main__":
+
+    import approx_common
+
+    parser = OptionParser( usage = "usage: %prog [options] instance_file|instance_dir ..." )
+
+    parser.add_option( "-f", "--force",
+                       action  = "store_true",
+                       dest    = "force",
+                       help    = "rewrite valid caches",
+                       default = False )
+
+    ( options, args ) = parser.parse_args()
+
+    if len(args) == 0:
+        parser.print_help()
+        sys.exit(1)
+
+    fnames = []
+    for path in args:
+        if os.path.isdir(path):
+            for fname in sorted(os.listdir(path)):
+                if fname.endswith(".in") or fname.endswith(".in.bz2") or fname.endswith(".in.gz"):
+                    fnames.append(os.path.join(path, fname))
+        else:
+            fnames.append(path)
+
+    for fname in fnames:
+        if not options.force and load_cached_instance(fname) != None:
+            print "up to date:", fname
+            continue
+        instance = approx_common.load_instance(fname, use_cache=False)
+        print "written:", write_instance_cache(fname, instance)
@@ -0,0 +1,389 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+# returned by get_procs_by_lambda if no number of cores meets the bound
+NO_PROCS = 100000
+
+
+class SchedulingInstance:
+    """
+    Array-backed scheduling instance.
+
+    cpudata is a contiguous n x m matrix, row j-1 holds the execution
+    times of task j on 1..m cores. gpudata holds the GPU time of each
+    task. Task ids are 1-based, as in the instance files ("t1" .. "tn").
+    """
+
+    def __init__(self, nb_tasks, nb_cpu, nb_gpu, cpudata, gpudata):
+        self.n = int(nb_tasks)
+        self.m = int(nb_cpu)
+        self.k = int(nb_gpu)
+        self.cpudata = np.ascontiguousarray(cpudata, dtype=np.float64)
+        self.gpudata = np.ascontiguousarray(gpudata, dtype=np.float64)
+        self.task_ids = np.arange(1, self.n+1, dtype=np.int64)
+        self.meta = { "n" : self.n, "m" : self.m, "k" : self.k }
+        self.cpu_envelope = None
+        self.neg_cpu_envelope = None
+
+        if self.cpudata.shape != (self.n, self.m):
+            raise ValueError("cpudata has shape %s, expected (%d, %d)" % (self.cpudata.shape, self.n, self.m))
+        if self.gpudata.shape != (self.n,):
+            raise ValueError("gpudata has shape %s, expected (%d,)" % (self.gpudata.shape, self.n))
+
+    def get_nb_tasks(self):
+        return self.n
+
+    def get_nb_cpu(self):
+        return self.m
+
+    def get_nb_gpu(self):
+        return self.k
+
+    def get_task_idx(self, task_id):
+        # accepts 3, "3" and "t3"
+        if isinstance(task_id, basestring):
+            task_id = task_id.lstrip("t")
+        return int(task_id) - 1
+
+    def get_seq_time(self, task_id):
+        return float(self.cpudata[self.get_task_idx(task_id), 0])
+
+    def get_time_by_procs(self, task_id, procs):
+        return float(self.cpudata[self.get_task_idx(task_id), procs-1])
+
+    def get_gpu_time(self, task_id):
+        return float(self.gpudata[self.get_task_idx(task_id)])
+
+    def get_seq_times(self):
+        # time of every task on one core
+        return self.cpudata[:,0]
+
+    def get_min_cpu_times(self):
+        # best time of every task on 1..m cores
+        return self.cpudata.min(axis=1)
+
+    def get_max_cpu_times(self):
+        # worst time of every task on 1..m cores
+        return self.cpudata.max(axis=1)
+
+    def get_times_by_procs(self, task_idx, procs):
+        # times of tasks task_idx (0-based array) on procs[i] <= m cores
+        return self.cpudata[task_idx, procs-1]
+
+    def get_cpu_envelope(self):
+        """
+        Running minimum of each CPU row (non-increasing in the number of
+        cores). The first core count whose time is <= h is the same for a
+        row and its envelope, but the envelope can be bisected.
+        """
+        if self.cpu_envelope is None:
+            self.cpu_envelope = np.minimum.accumulate(self.cpudata, axis=1)
+            self.neg_cpu_envelope = -self.cpu_envelope
+        return self.cpu_envelope
+
+    def get_procs_by_lambda(self, task_id, h_bound):
+        self.get_cpu_envelope()
+        # number of envelope entries > h_bound (negated to be ascending)
+        idx = int(np.searchsorted(self.neg_cpu_envelope[self.get_task_idx(task_id)], -h_bound, side="left"))
+        if idx == self.m:
+            return NO_PROCS
+        return idx + 1
+
+    def get_procs_by_lambda_all(self, h_bound):
+        """
+        gamma(j, h_bound) for all tasks (h_bound: scalar or one bound per
+        task), NO_PROCS where no core count meets the bound.
+        """
+        idx = first_fit_idx(self.get_cpu_envelope(), h_bound)
+        return np.where(idx < self.m, idx + 1, NO_PROCS)
+
+    def get_time_by_procs_all(self, procs):
+        """
+        Execution time of every task on procs[j] cores, inf for NO_PROCS.
+        """
+        procs = np.asarray(procs)
+        col = np.minimum(procs, self.m) - 1
+        times = self.cpudata[np.arange(self.n), col]
+        return np.where(procs <= self.m, times, np.inf)
+
+
+class AmdahlInstance(SchedulingInstance):
+    """
+    Parametric instance: the time of task j on p cores is
+    seq_times[j-1] * (sfrac[j-1] + (1 - sfrac[j-1]) / p).
+
+    Lookups and gamma(j, h) are closed-form, the n x m table is only
+    built if cpudata is accessed (e.g., to write the file or the cache).
+    Times are computed as in generate_instance, so both forms of the
+    same instance give bit-identical times.
+    """
+
+    def __init__(self, nb_tasks, nb_cpu, nb_gpu, seq_times, sfrac, gpudata):
+        self.n = int(nb_tasks)
+        self.m = int(nb_cpu)
+        self.k = int(nb_gpu)
+        self.seq_times = np.ascontiguousarray(seq_times, dtype=np.float64)
+        self.sfrac = np.ascontiguousarray(sfrac, dtype=np.float64)
+        self.gpudata = np.ascontiguousarray(gpudata, dtype=np.float64)
+        self.task_ids = np.arange(1, self.n+1, dtype=np.int64)
+        self.meta = { "n" : self.n, "m" : self.m, "k" : self.k }
+
+        for name, arr in [ ("seq_times", self.seq_times), ("sfrac", self.sfrac), ("gpudata", self.gpudata) ]:
+            if arr.shape != (self.n,):
+                raise ValueError("%s has shape %s, expected (%d,)" % (name, arr.shape, self.n))
+        if np.any(self.sfrac < 0.0) or np.any(self.sfrac > 1.0):
+            raise ValueError("sfrac must be in [0, 1]")
+
+        # time = serial + parallel / p
+        self.serial_times = self.seq_times * self.sfrac
+        self.parallel_times = (1.0 - self.sfrac) * self.seq_times
+
+    def __getattr__(self, name):
+        # the table is materialized on first use
+        if name == "cpudata":
+            procs = np.arange(1, self.m+1, dtype=np.float64)
+            cpudata = np.empty((self.n, self.m), dtype=np.float64)
+            np.divide(self.parallel_times[:,None], procs[None,:], out=cpudata)
+            cpudata += self.serial_times[:,None]
+            self.cpudata = cpudata
+            return cpudata
+        raise AttributeError(name)
+
+    def get_seq_time(self, task_id):
+        idx = self.get_task_idx(task_id)
+        return float(self.parallel_times[idx] / 1.0 + self.serial_times[idx])
+
+    def get_time_by_procs(self, task_id, procs):
+        if procs < 1 or procs > self.m:
+            raise IndexError("procs %d out of range 1..%d" % ( procs, self.m ))
+        idx = self.get_task_idx(task_id)
+        return float(self.parallel_times[idx] / float(procs) + self.serial_times[idx])
+
+    def get_seq_times(self):
+        return self.parallel_times + self.serial_times
+
+    def get_min_cpu_times(self):
+        return self.parallel_times / float(self.m) + self.serial_times
+
+    def get_max_cpu_times(self):
+        return self.get_seq_times()
+
+    def get_times_by_procs(self, task_idx, procs):
+        return self.parallel_times[task_idx] / procs.astype(np.float64) + self.serial_times[task_idx]
+
+    def get_cpu_envelope(self):
+        # the envelope is the n x m table itself (times are non-increasing
+        # in p), gamma(j, h) is closed-form here, see get_procs_by_lambda_idx
+        raise NotImplementedError("AmdahlInstance has no CPU envelope, it would be the n x m table")
+
+    def get_procs_by_lambda(self, task_id, h_bound):
+        idx = self.get_task_idx(task_id)
+        return int(self.get_procs_by_lambda_idx(np.array([idx]), h_bound)[0])
+
+    def get_procs_by_lambda_all(self, h_bound):
+        return self.get_procs_by_lambda_idx(np.arange(self.n), h_bound)
+
+    def get_procs_by_lambda_idx(self, task_idx, h_bound):
+        """
+        gamma(j, h_bound) of tasks task_idx: smallest p with
+        serial + parallel / p <= h_bound, from p >= parallel / (h - serial)
+        and corrected by +-1 steps where rounding is off.
+        """
+        serial = self.serial_times[task_idx]
+        parallel = self.parallel_times[task_idx]
+        # h_bound: scalar or one bound per task (as in first_fit_idx)
+        bounds = np.asarray(h_bound, dtype=np.float64)
+        if bounds.ndim > 0:
+            bounds = bounds[task_idx]
+        m = self.m
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slack = bounds - serial
+            procs = np.where(slack > 0.0, np.ceil(parallel / slack), m + 1)
+        procs = np.clip(np.nan_to_num(procs), 1, m + 1).astype(np.int64)
+
+        def time_on(p):
+            return parallel / np.maximum(p, 1).astype(np.float64) + serial
+
+        while True:
+            down = (procs > 1) & (time_on(procs - 1) <= bounds)
+            up = (procs <= m) & (time_on(procs) > bounds)
+            if not down.any() and not up.any():
+                break
+            procs = procs - down + up
+
+        return np.where(procs <= m, procs, NO_PROCS)
+
+    def get_time_by_procs_all(self, procs):
+        procs = np.asarray(procs)
+        times = self.parallel_times / np.minimum(procs, self.m).astype(np.float64) + self.serial_times
+        return np.where(procs <= self.m, times, np.inf)
+
+
+class GammaTable:
+    """
+    Canonical allotments of all tasks for one lambda: gamma(j, lambda),
+    gamma(j, lambda/2) and gamma(j, 3/2 lambda) together with the
+    execution times on that many cores (NO_PROCS / inf if none fits).
+    Arrays are indexed by task_id-1.
+    """
+
+    def __init__(self, instance, lambval):
+        self.lambval = float(lambval)
+
+        self.gamma_lamb   = instance.get_procs_by_lambda_all(self.lambval)
+        self.gamma_12lamb = instance.get_procs_by_lambda_all(self.lambval / 2)
+        self.gamma_32lamb = instance.get_procs_by_lambda_all(3 * self.lambval / 2)
+
+        self.time_lamb   = instance.get_time_by_procs_all(self.gamma_lamb)
+        self.time_12lamb = instance.get_time_by_procs_all(self.gamma_12lamb)
+        self.time_32lamb = instance.get_time_by_procs_all(self.gamma_32lamb)
+
+
+# sets 1-7 of the dual approximation (see build_approx_schedule.build_schedule)
+NB_SETS = 7
+
+def get_allowed_sets(instance, gamma):
+    """
+    n x 7 boolean matrix, entry [j-1, s-1] tells whether task j may be
+    put in set s at gamma.lambval (the variables not fixed to zero in
+    the MIP of solve_mip.jl).
+    """
+    lambval = gamma.lambval
+    seq_times = instance.get_seq_times()
+    gpu_times = instance.gpudata
+    m = instance.m
+
+    allowed = np.empty((instance.n, NB_SETS), dtype=bool)
+    allowed[:,0] = seq_times <= lambval / 2
+    allowed[:,1] = (seq_times > lambval / 2) & (seq_times <= 3 * lambval / 4)
+    allowed[:,2] = (gamma.gamma_32lamb <= m) & (gamma.time_32lamb > lambval)
+    allowed[:,3] = (gamma.gamma_lamb <= m) & (gamma.time_lamb > lambval / 2) & \
+        ~((gamma.gamma_lamb == 1) & (gamma.time_lamb <= 3 * lambval / 4))
+    allowed[:,4] = (gamma.gamma_12lamb <= m) & (gamma.gamma_12lamb != 1)
+    allowed[:,5] = (gpu_times > lambval / 2) & (gpu_times <= lambval)
+    allowed[:,6] = gpu_times <= lambval / 2
+    return allowed
+
+def get_set_work(instance, gamma):
+    """
+    n x 7 matrix of the work of each task in each set: core time x
+    number of cores for sets 1-5, GPU time for sets 6 and 7 (inf if the
+    set has no allotment).
+    """
+    seq_times = instance.get_seq_times()
+    work = np.empty((instance.n, NB_SETS), dtype=np.float64)
+    work[:,0] = seq_times
+    work[:,1] = seq_times
+    work[:,2] = gamma.gamma_32lamb * gamma.time_32lamb
+    work[:,3] = gamma.gamma_lamb * gamma.time_lamb
+    work[:,4] = gamma.gamma_12lamb * gamma.time_12lamb
+    work[:,5] = instance.gpudata
+    work[:,6] = instance.gpudata
+    return work
+
+
+def first_fit_idx(envelope, h_bound):
+    """
+    Per row of a non-increasing n x m matrix, the index of the first
+    entry <= h_bound (m if there is none). All rows are bisected
+    together, so this takes O(log m) vector operations.
+    """
+    nb_rows, nb_cols = envelope.shape
+    bounds = np.broadcast_to(np.asarray(h_bound, dtype=np.float64), (nb_rows,))
+    rows = np.arange(nb_rows)
+
+    lo = np.zeros(nb_rows, dtype=np.intp)
+    hi = np.full(nb_rows, nb_cols, dtype=np.intp)
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        above = envelope[rows, np.minimum(mid, nb_cols-1)] > bounds
+        lo = np.where(active & above, mid + 1, lo)
+        hi = np.where(active & ~above, mid, hi)
+        active = lo < hi
+
+    return lo
+
+
+def instance_from_dict(data):
+    """
+    Build a SchedulingInstance from the JSON/YAML instance layout
+    ({"meta": {...}, "cpudata": {"t1": [...], ...}, "gpudata": {"t1": ...}}).
+    Parametric files have "amdahl": {"t1": [seq_time, sfrac], ...}
+    instead of "cpudata" and give an AmdahlInstance.
+    """
+    nb_tasks = int(data["meta"]["n"])
+    nb_cpu   = int(data["meta"]["m"])
+    nb_gpu   = int(data["meta"]["k"])
+
+    if "cpudata" not in data and "amdahl" in data:
+        params = np.empty((nb_tasks, 2), dtype=np.float64)
+        gpudata = np.empty(nb_tasks, dtype=np.float64)
+        for i in xrange(0, nb_tasks):
+            task_str = "t%d" % ( i+1 )
+            params[i] = data["amdahl"][task_str]
+            gpudata[i] = data["gpudata"][task_str]
+        return AmdahlInstance(nb_tasks, nb_cpu, nb_gpu, params[:,0], params[:,1], gpudata)
+
+    cpudata = np.empty((nb_tasks, nb_cpu), dtype=np.float64)
+    gpudata = np.empty(nb_tasks, dtype=np.float64)
+    for i in xrange(0, nb_tasks):
+        task_str = "t%d" % ( i+1 )
+        cpudata[i] = data["cpudata"][task_str]
+        gpudata[i] = data["gpudata"][task_str]
+
+    return SchedulingInstance(nb_tasks, nb_cpu, nb_gpu, cpudata, gpudata)
+
+
+def instance_to_dict(instance, parametric=False):
+    """
+    Inverse of instance_from_dict, with the nb_p column that
+    make_instance2.R writes into cpudata. An AmdahlInstance is written
+    in the parametric layout if parametric is set (only the Python code
+    reads that layout).
+    """
+    gpudata = {}
+    for i, gpu_time in enumerate(instance.gpudata.tolist()):
+        gpudata["t%d" % ( i+1 )] = gpu_time
+    data = {
+        "meta"    : { "n" : instance.n, "m" : instance.m, "k" : instance.k },
+        "gpudata" : gpudata
+    }
+
+    if parametric and isinstance(instance, AmdahlInstance):
+        params = {}
+        for i, row in enumerate(zip(instance.seq_times.tolist(), instance.sfrac.tolist())):
+            params["t%d" % ( i+1 )] = list(row)
+        data["amdahl"] = params
+    else:
+        cpudata = { "nb_p" : range(1, instance.m+1) }
+        for i, row in enumerate(instance.cpudata.tolist()):
+            cpudata["t%d" % ( i+1 )] = row
+        data["cpudata"] = cpudata
+
+    return data
+
+
+def as_scheduling_instance(data):
+    """
+    Return data as SchedulingInstance, converting the dict form if needed.
+    """
+    if isinstance(data, SchedulingInstance):
+        return data
+    return instance_from_dict(data)
@@ -0,0 +1,125 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# opt-in phase timers and counters for the schedulers
+#
+# enabled with approx_common.profile = 1 (or DUALAPPROX_PROFILE=1), a
+# trace file is written if approx_common.trace_file is set (or
+# DUALAPPROX_TRACE=fname). When disabled, get_profiler() returns None
+# and the schedulers skip all profiling code; counters are derived
+# from the task sets and allotments after the run, never counted inside
+# the scheduling loops.
+#
+# trace files use the JSON array format of chrome://tracing (and
+# Perfetto); events of later runs are appended, which is valid since
+# the closing bracket is optional in that format.
+
+import os
+import json
+import timeit
+
+import approx_common
+
+timer = timeit.default_timer
+
+
+class PhaseProfiler:
+    """
+    Wall-clock times of consecutive phases plus named counters of one
+    scheduler run.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.phases = []     # (phase, start, end)
+        self.counters = {}
+        self.cur_phase = None
+        self.cur_start = None
+
+    def start_phase(self, phase):
+        # ends the current phase (if any)
+        now = timer()
+        if self.cur_phase != None:
+            self.phases.append( (self.cur_phase, self.cur_start, now) )
+        self.cur_phase = phase
+        self.cur_start = now
+
+    def stop(self):
+        if self.cur_phase != None:
+            self.phases.append( (self.cur_phase, self.cur_start, timer()) )
+            self.cur_phase = None
+
+    def add_count(self, counter, value):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def get_phase_times(self):
+        # phase -> seconds (phases may occur more than once)
+        times = {}
+        for phase, start, end in self.phases:
+            times[phase] = times.get(phase, 0.0) + (end - start)
+        return times
+
+    def store_metainfo(self, schedule):
+        for phase, seconds in self.get_phase_times().iteritems():
+            schedule.set_metainfo("time_%s" % ( phase ), "%.6f" % ( seconds ))
+        for counter, value in self.counters.iteritems():
+            schedule.set_metainfo("count_%s" % ( counter ), value)
+
+    def get_trace_events(self):
+        pid = os.getpid()
+        events = []
+        for phase, start, end in self.phases:
+            events.append({
+                "name" : phase,
+                "cat"  : self.name,
+                "ph"   : "X",
+                "ts"   : start * 1e6,
+                "dur"  : (end - start) * 1e6,
+                "pid"  : pid,
+                "tid"  : 0
+            })
+        if self.phases:
+            events.append({
+                "name" : self.name,
+                "ph"   : "C",
+                "ts"   : self.phases[-1][2] * 1e6,
+                "pid"  : pid,
+                "tid"  : 0,
+                "args" : self.counters
+            })
+        return events
+
+    def write_trace(self, fname):
+        new_file = not os.path.exists(fname) or os.path.getsize(fname) == 0
+        fh = open(fname, "a")
+        if new_file:
+            fh.write("[\n")
+        for event in self.get_trace_events():
+            fh.write(json.dumps(event, sort_keys=True) + ",\n")
+        fh.close()
+
+
+def get_profiler(name):
+    # None unless profiling is enabled
+    if approx_common.profile == 1 or approx_common.trace_file:
+        return PhaseProfiler(name)
+    return None
+
+def finish_profiler(profiler, schedule):
+    profiler.stop()
+    profiler.store_metainfo(schedule)
+    if approx_common.trace_file:
+        profiler.write_trace(approx_common.trace_file)
@@ -0,0 +1,111 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# writes the same bytes as the jinja.jed template, but without jinja
+
+import bz2
+import gzip
+
+# number of tasks formatted before the buffer is written
+TASKS_PER_CHUNK = 1024
+
+HEADER = "<?xml version=\"1.0\"?>\n<grid_schedule>\n\t<meta_info>\n"
+
+META_FMT = "\t\t<meta name=\"%s\" value=\"%s\"/>\n"
+
+GRID_INFO_FMT = "\t</meta_info>\n\t<grid_info>\n\t\t<info name=\"nb_clusters\" value=\"%s\"/>\n\t\t<clusters>\n"
+
+CLUSTER_FMT = "\t\t\t<cluster id=\"%s\" hosts=\"%s\" first_host=\"0\"/>\n"
+
+NODE_INFOS = "\t\t</clusters>\n\t</grid_info>\n\t<node_infos>\n"
+
+TASK_FMT = "\t\t<node_statistics>\n" \
+    "\t\t\t<node_property name=\"id\" value=\"%s\"/>\n" \
+    "\t\t\t<node_property name=\"type\" value=\"%s\"/>\n" \
+    "\t\t\t<node_property name=\"start_time\" value=\"%s\"/>\n" \
+    "\t\t\t<node_property name=\"end_time\" value=\"%s\"/>\n" \
+    "\t\t\t<configuration>\n" \
+    "\t\t\t\t<conf_property name=\"cluster_id\" value=\"%s\"/>\n" \
+    "\t\t\t\t<conf_property name=\"host_nb\" value=\"%s\"/>\n" \
+    "\t\t\t\t<host_lists>\n" \
+    "%s" \
+    "\t\t\t\t</host_lists>\n" \
+    "\t\t\t</configuration>\n" \
+    "\t\t</node_statistics>\n"
+
+HOSTS_FMT = "\t\t\t\t\t<hosts start=\"%s\" nb=\"%s\"/>\n"
+
+FOOTER = "\t</node_infos>\n</grid_schedule>"
+
+
+def open_output_file(fname, compression=None):
+    # compression: None, "bz2" or "gz" (default: taken from the file suffix)
+    if compression == None:
+        if fname.endswith(".bz2"):
+            compression = "bz2"
+        elif fname.endswith(".gz"):
+            compression = "gz"
+
+    if compression == "bz2":
+        return bz2.BZ2File(fname, "wb")
+    elif compression == "gz":
+        return gzip.GzipFile(fname, "wb")
+    elif compression == None:
+        return open(fname, "wb")
+    raise ValueError("unknown compression %s" % ( compression ))
+
+
+def format_task_rect(task_rect):
+    hosts = "".join([ HOSTS_FMT % ( blk_start, blk_size ) for blk_start, blk_size in task_rect.resources ])
+    return TASK_FMT % (
+        task_rect.get_task_id(),
+        task_rect.get_set_str(),
+        task_rect.get_start_time(),
+        task_rect.get_end_time(),
+        task_rect.get_device_id(),
+        task_rect.get_nbp(),
+        hosts )
+
+
+def write_jedule_stream(fh, schedule):
+    chunks = [ HEADER ]
+    for key, value in schedule.metainfo.iteritems():
+        chunks.append(META_FMT % ( key, value ))
+    chunks.append(GRID_INFO_FMT % ( len(schedule.archs) ))
+    for arch in schedule.archs:
+        chunks.append(CLUSTER_FMT % ( arch.arch_id, arch.nb_pus ))
+    chunks.append(NODE_INFOS)
+
+    for task_rect in schedule.get_task_rects():
+        chunks.append(format_task_rect(task_rect))
+        if len(chunks) >= TASKS_PER_CHUNK:
+            fh.write("".join(chunks))
+            chunks = []
+
+    chunks.append(FOOTER)
+    fh.write("".join(chunks))
+
+
+def write_jedule_output(fname, schedule, compression=None):
+    """
+    Write schedule as Jedule XML to fname (or an open file object).
+    """
+    if hasattr(fname, "write"):
+        write_jedule_stream(fname, schedule)
+    else:
+        fh = open_output_file(fname, compression)
+        write_jedule_stream(fh, schedule)
+        fh.close()
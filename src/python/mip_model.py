@@ -0,0 +1,215 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# the seven-set feasibility MIP of the dual approximation for one lambda
+# (same model as solve_problem_instance in solve_mip.jl)
+#
+# variables x<j>_<s> exist only for the sets a task may go to (the ones
+# solve_mip.jl fixes to zero are left out), plus wc (total CPU work,
+# minimized and bounded by lambda * m) and the integers low1 and up1 that
+# split set 2 between the two shelves. The model is written as free MPS,
+# which glpsol (--freemps) and symphony (-F) both read.
+
+import numpy as np
+
+from instance_common import GammaTable, get_allowed_sets, get_set_work
+
+# rows besides the assignment rows a<j>
+#   w  : CPU work of sets 1-5 - wc <= 0
+#   c2 : cores of sets 3, 4 + low1 <= m (first shelf)
+#   c3 : cores of sets 3, 5 + up1 <= m (second shelf)
+#   g  : GPU work of sets 6, 7 <= k * lambda
+#   g6 : nb of set 6 tasks <= k
+#   s2 : nb of set 2 tasks - low1 - up1 = 0
+#   d0 : low1 - up1 >= 0
+#   d1 : low1 - up1 <= 1
+ROWS = [ ("w", "L"), ("c2", "L"), ("c3", "L"), ("g", "L"), ("g6", "L"), ("s2", "E"), ("d0", "G"), ("d1", "L") ]
+
+
+def format_number(value):
+    return repr(float(value))
+
+def get_col_name(task_idx, set_id):
+    return "x%d_%d" % ( task_idx+1, set_id )
+
+
+class FeasibilityModel:
+    """
+    Feasibility MIP of one instance for one lambda. infeasible is set if
+    the instance cannot be scheduled at lambda without asking a solver
+    (a task is too long for m cores and for a GPU, or has no set).
+    """
+
+    def __init__(self, instance, lambval):
+        self.instance = instance
+        self.lambval = float(lambval)
+
+        n = instance.n
+        m = instance.m
+        gamma = GammaTable(instance, self.lambval)
+        allowed = get_allowed_sets(instance, gamma)
+        self.set_work = get_set_work(instance, gamma)
+        self.gamma = gamma
+
+        # task idx and set id (1-7) of every column x<j>_<s>
+        self.col_tasks, sets = np.nonzero(allowed)
+        self.col_sets = sets + 1
+        self.allowed = allowed
+        self.nb_free_var = allowed.sum(axis=0).tolist()
+
+        time_on_m = instance.get_times_by_procs(np.arange(n), np.full(n, m, dtype=np.int64))
+        self.infeasible = bool(((time_on_m > self.lambval) & (instance.gpudata > self.lambval)).any()) \
+            or not allowed.any(axis=1).all()
+
+    def get_signature(self):
+        """
+        n x 10 matrix of everything the column and bound lines of a task
+        depend on at this lambda: its allowed sets and the allotments of
+        sets 3-5 (0 if the set is not allowed).
+        """
+        sig = np.zeros((self.instance.n, 10), dtype=np.int64)
+        sig[:,:7] = self.allowed
+        sig[:,7] = np.where(self.allowed[:,2], self.gamma.gamma_32lamb, 0)
+        sig[:,8] = np.where(self.allowed[:,3], self.gamma.gamma_lamb, 0)
+        sig[:,9] = np.where(self.allowed[:,4], self.gamma.gamma_12lamb, 0)
+        return sig
+
+    def get_col_name_at(self, col):
+        # name of column col (0-based, in the order of the MPS file)
+        if col == 0:
+            return "wc"
+        col -= 1
+        if col < len(self.col_tasks):
+            return get_col_name(self.col_tasks[col], self.col_sets[col])
+        return [ "low1", "up1" ][col - len(self.col_tasks)]
+
+    def get_col_entries(self, j, s):
+        # (row, coefficient) of column x<j>_<s>
+        entries = [ ("a%d" % ( j+1 ), 1.0) ]
+        if s <= 5:
+            entries.append( ("w", self.set_work[j,s-1]) )
+        if s == 3:
+            entries.append( ("c2", self.gamma.gamma_32lamb[j]) )
+            entries.append( ("c3", self.gamma.gamma_32lamb[j]) )
+        elif s == 4:
+            entries.append( ("c2", self.gamma.gamma_lamb[j]) )
+        elif s == 5:
+            entries.append( ("c3", self.gamma.gamma_12lamb[j]) )
+        elif s == 2:
+            entries.append( ("s2", 1.0) )
+        elif s >= 6:
+            entries.append( ("g", self.instance.gpudata[j]) )
+            if s == 6:
+                entries.append( ("g6", 1.0) )
+        return entries
+
+    def write_mps(self, fname):
+        ModelWriter(self.instance).write(self, fname)
+
+    def get_solution(self, work, col_values):
+        """
+        Solution dict for build_schedule from the objective value and
+        the values of the x columns (name -> value, missing means 0).
+        """
+        task_hash = {}
+        for name, value in col_values.iteritems():
+            if name.startswith("x") and value > 0.5:
+                task_id, set_id = name[1:].split("_")
+                task_hash[task_id] = set_id
+        return { "work" : work, "task_hash" : task_hash }
+
+
+
+class ModelWriter:
+    """
+    Writes the feasibility models of one instance. Everything that does
+    not depend on lambda (rows, assignment right-hand sides, low1/up1)
+    is built once. The column and bound lines of a task are cached and
+    only rebuilt if its signature (allowed sets and allotments) differs
+    from the previous model, the right-hand side k * lambda and the
+    bound of wc are written per model.
+    """
+
+    def __init__(self, instance):
+        self.instance = instance
+        n = instance.n
+        m = instance.m
+
+        lines = [ "NAME dualapprox", "ROWS", " N obj" ]
+        for j in xrange(0, n):
+            lines.append(" E a%d" % ( j+1 ))
+        for row, row_type in ROWS:
+            lines.append(" %s %s" % ( row_type, row ))
+        lines.append("COLUMNS")
+        lines.append(" wc obj 1 w -1")
+        lines.append(" M1 'MARKER' 'INTORG'")
+        self.head = "\n".join(lines) + "\n"
+
+        lines = [ " low1 c2 1 s2 -1",
+                  " low1 d0 1 d1 1",
+                  " up1 c3 1 s2 -1",
+                  " up1 d0 -1 d1 -1",
+                  " M2 'MARKER' 'INTEND'",
+                  "RHS" ]
+        for j in xrange(0, n):
+            lines.append(" RHS a%d 1" % ( j+1 ))
+        for row, value in [ ("c2", m), ("c3", m), ("g6", instance.k), ("d1", 1) ]:
+            lines.append(" RHS %s %s" % ( row, format_number(value) ))
+        self.rhs = "\n".join(lines) + "\n"
+
+        self.tail = " UP BND low1 %d\n UP BND up1 %d\nENDATA\n" % ( m, m )
+
+        self.col_lines = [ "" ] * n
+        self.bnd_lines = [ "" ] * n
+        self.signature = None
+
+    def update(self, model):
+        # rebuilds the lines of all tasks whose signature changed, returns their number
+        sig = model.get_signature()
+        if self.signature is None:
+            changed = np.arange(self.instance.n)
+        else:
+            changed = np.nonzero((sig != self.signature).any(axis=1))[0]
+        self.signature = sig
+
+        for j in changed.tolist():
+            col_lines = []
+            bnd_lines = []
+            for s in (np.nonzero(model.allowed[j])[0] + 1).tolist():
+                name = get_col_name(j, s)
+                for row, value in model.get_col_entries(j, s):
+                    col_lines.append(" %s %s %s\n" % ( name, row, format_number(value) ))
+                bnd_lines.append(" BV BND %s\n" % ( name ))
+            self.col_lines[j] = "".join(col_lines)
+            self.bnd_lines[j] = "".join(bnd_lines)
+
+        return len(changed)
+
+    def write(self, model, fname):
+        nb_changed = self.update(model)
+
+        fh = open(fname, "w")
+        fh.write(self.head)
+        fh.write("".join(self.col_lines))
+        fh.write(self.rhs)
+        fh.write(" RHS g %s\n" % ( format_number(self.instance.k * model.lambval) ))
+        fh.write("BOUNDS\n")
+        fh.write(" UP BND wc %s\n" % ( format_number(model.lambval * self.instance.m) ))
+        fh.write("".join(self.bnd_lines))
+        fh.write(self.tail)
+        fh.close()
+
+        return nb_changed
@@ -0,0 +1,346 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# feasibility test of the dual approximation with external MIP solvers
+#
+# a solver knows how to call one executable on an MPS file (see
+# mip_model.py) and how to read back the objective and the column
+# values. New solvers are added with register_solver().
+#
+# SolverPool runs the probes: every worker slot has its own scratch
+# directory (model and solution files are overwritten by the next probe
+# of the slot) and its own ModelWriter, which only rewrites the tasks
+# that changed since the previous probe of the slot. Slots are handed
+# out through a queue, so probes can be solved from the caller (solve)
+# or from a thread pool (submit). A submitted probe can be cancelled,
+# which kills its solver process if it is already running. With a
+# FeasibilityCache, known results are answered without a solver.
+
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+import threading
+import Queue
+
+from multiprocessing.pool import ThreadPool
+
+import approx_common
+
+from mip_model import FeasibilityModel, ModelWriter
+from feasibility_cache import get_instance_hash
+
+# outcome of a solver run
+OPTIMAL = 0
+INFEASIBLE = 1   # proven by the solver
+UNKNOWN = 2      # limit reached, no solution file, unexpected status
+
+
+class MipSolver:
+    """
+    Base class of the external solvers. run() returns (outcome, objective
+    value, column name -> value), outcome is OPTIMAL, INFEASIBLE or
+    UNKNOWN.
+    """
+
+    name = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_command(self, model_fname, sol_fname):
+        raise NotImplementedError
+
+    def read_solution(self, model, output, sol_fname):
+        raise NotImplementedError
+
+    def run(self, model, workdir, probe=None):
+        # model has been written to workdir/model.mps, None if the probe
+        # was cancelled
+        model_fname = os.path.join(workdir, "model.mps")
+        sol_fname = os.path.join(workdir, "model.sol")
+        if os.path.exists(sol_fname):
+            os.remove(sol_fname)
+
+        proc = subprocess.Popen(self.get_command(model_fname, sol_fname), cwd=workdir,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, close_fds=True)
+        if probe != None and not probe.set_process(proc):
+            proc.kill()
+        output = proc.communicate()[0]
+        if probe != None and probe.cancelled:
+            return None
+        if proc.returncode != 0:
+            raise RuntimeError("%s failed (exit code %d):\n%s" % ( self.name, proc.returncode, output ))
+        return self.read_solution(model, output, sol_fname)
+
+
+class GlpsolSolver(MipSolver):
+
+    name = "glpsol"
+
+    def get_command(self, model_fname, sol_fname):
+        return [ self.path, "--freemps", model_fname, "-w", sol_fname ]
+
+    def read_solution(self, model, output, sol_fname):
+        if not os.path.exists(sol_fname):
+            return UNKNOWN, None, {}
+
+        fh = open(sol_fname, "r")
+        lines = [ line.split() for line in fh if line.strip() ]
+        fh.close()
+
+        # only the names of the columns set to 1 are needed
+        values = {}
+
+        if lines[0][0] in [ "c", "s" ]:
+            # glpk >= 4.57: "s mip ROWS COLS STATUS OBJ", "j COL VAL"
+            status = None
+            objval = None
+            for fields in lines:
+                if fields[0] == "s":
+                    status = fields[4]
+                    objval = float(fields[5])
+                elif fields[0] == "j" and float(fields[2]) > 0.5:
+                    values[model.get_col_name_at(int(fields[1]) - 1)] = float(fields[2])
+            # o: optimal, n: no integer feasible solution
+            return { "o" : OPTIMAL, "n" : INFEASIBLE }.get(status, UNKNOWN), objval, values
+
+        # older glpk: "ROWS COLS", "STATUS OBJ", row values, column values
+        nb_rows = int(lines[0][0])
+        status = int(lines[1][0])
+        objval = float(lines[1][1])
+        for col, fields in enumerate(lines[2+nb_rows:]):
+            if float(fields[0]) > 0.5:
+                values[model.get_col_name_at(col)] = float(fields[0])
+        # GLP_OPT, GLP_NOFEAS
+        return { 5 : OPTIMAL, 4 : INFEASIBLE }.get(status, UNKNOWN), objval, values
+
+
+class SymphonySolver(MipSolver):
+
+    name = "symphony"
+
+    def get_command(self, model_fname, sol_fname):
+        return [ self.path, "-F", model_fname ]
+
+    def read_solution(self, model, output, sol_fname):
+        if "Problem Infeasible" in output:
+            return INFEASIBLE, None, {}
+        if "Optimal Solution Found" not in output:
+            return UNKNOWN, None, {}
+
+        objval = None
+        values = {}
+        in_values = False
+        for line in output.splitlines():
+            if line.startswith("Solution Cost:"):
+                objval = float(line.split(":")[1])
+            elif line.startswith("Column names and values"):
+                in_values = True
+            elif in_values:
+                fields = line.split()
+                if len(fields) == 2:
+                    values[fields[0]] = float(fields[1])
+                elif len(fields) > 0 and not line.startswith("+"):
+                    break
+        return OPTIMAL if objval != None else UNKNOWN, objval, values
+
+
+# name -> (class, default path)
+solvers = {}
+
+def register_solver(cls, path):
+    solvers[cls.name] = (cls, path)
+
+register_solver(GlpsolSolver, approx_common.GLPSOL_PATH)
+register_solver(SymphonySolver, approx_common.SYMPHONY_PATH)
+
+def find_executable(path):
+    if os.path.dirname(path):
+        return path if os.access(path, os.X_OK) else None
+    for dirname in os.environ.get("PATH", "").split(os.pathsep):
+        fname = os.path.join(dirname, path)
+        if os.access(fname, os.X_OK):
+            return fname
+    return None
+
+def get_solver(name=None):
+    """
+    Solver by name, or the preferred one of approx_common (use_symphony)
+    if no name is given. The configured path is tried first, then the
+    executable is searched in PATH. None if it is not installed.
+    """
+    if name == None:
+        name = "symphony" if approx_common.use_symphony == 1 else "glpsol"
+    if name not in solvers:
+        raise ValueError("unknown solver %s" % ( name ))
+
+    cls, path = solvers[name]
+    fname = find_executable(path)
+    if fname == None:
+        fname = find_executable(os.path.basename(path))
+    if fname == None:
+        return None
+    return cls(fname)
+
+def find_solver():
+    # preferred solver, any installed one otherwise
+    solver = get_solver()
+    if solver == None:
+        for name in sorted(solvers.keys()):
+            solver = get_solver(name)
+            if solver != None:
+                break
+    return solver
+
+
+class Probe:
+    """
+    Handle of a submitted feasibility probe.
+    """
+
+    def __init__(self, lambval):
+        self.lambval = lambval
+        self.cancelled = False
+        self.proc = None
+        self.lock = threading.Lock()
+
+    def set_process(self, proc):
+        # False if the probe has been cancelled in the meantime
+        self.lock.acquire()
+        try:
+            self.proc = proc
+            return not self.cancelled
+        finally:
+            self.lock.release()
+
+    def cancel(self):
+        self.lock.acquire()
+        try:
+            self.cancelled = True
+            if self.proc != None and self.proc.poll() == None:
+                self.proc.kill()
+        finally:
+            self.lock.release()
+
+
+class SolverPool:
+    """
+    Reusable set of nb_workers solver slots for feasibility probes.
+    """
+
+    def __init__(self, solver, nb_workers=1, cache=None):
+        self.solver = solver
+        self.nb_workers = nb_workers
+        self.cache = cache
+        self.hashed = (None, None)  # last (instance, hash) for the cache
+        self.tmpdir = tempfile.mkdtemp(prefix="dualapprox_")
+        self.slots = Queue.Queue()
+        for i in xrange(0, nb_workers):
+            slot_dir = os.path.join(self.tmpdir, "slot%d" % ( i ))
+            os.mkdir(slot_dir)
+            # [ scratch directory, writer of the last instance ]
+            self.slots.put([ slot_dir, None ])
+        self.threads = None
+
+    def get_instance_hash(self, instance):
+        if self.hashed[0] is not instance:
+            self.hashed = (instance, get_instance_hash(instance))
+        return self.hashed[1]
+
+    def solve(self, instance, lambval, probe=None, need_solution=False):
+        """
+        Feasibility test for lambda, like has_solution_for_lambda in
+        solve_mip.jl. Returns a dict with has_solution, the solution
+        for build_schedule (if any) and stats; cancelled is set if the
+        probe was cancelled before the solver finished, cached if the
+        result comes from the cache (the solution may then be None,
+        unless need_solution is set). Only proven results are stored in
+        the cache: optimal or infeasible, not UNKNOWN solver outcomes.
+        """
+        start_time = time.time()
+        ret = { "lambda" : lambval, "has_solution" : False, "solution" : None,
+                "cancelled" : False, "cached" : False, "stats" : {} }
+
+        if self.cache != None:
+            ihash = self.get_instance_hash(instance)
+            result = self.cache.lookup(ihash, lambval, need_solution)
+            if result != None:
+                ret.update(result)
+                ret["cached"] = True
+                ret["solve_time"] = time.time() - start_time
+                return ret
+
+        model = FeasibilityModel(instance, lambval)
+        # a failed pre-check is as good as a proof
+        outcome = INFEASIBLE
+
+        if not model.infeasible:
+            slot = self.slots.get()
+            try:
+                if probe != None and probe.cancelled:
+                    sol = None
+                else:
+                    if slot[1] == None or slot[1].instance is not instance:
+                        slot[1] = ModelWriter(instance)
+                    ret["stats"]["nb_changed_tasks"] = slot[1].write(model, os.path.join(slot[0], "model.mps"))
+                    sol = self.solver.run(model, slot[0], probe)
+            finally:
+                self.slots.put(slot)
+
+            if sol == None:
+                ret["cancelled"] = True
+                ret["solve_time"] = time.time() - start_time
+                return ret
+            outcome, work, values = sol
+
+            # need to check whether condition is met (work <= lambda * m)
+            if outcome == OPTIMAL and work <= model.lambval * instance.m:
+                ret["has_solution"] = True
+                ret["solution"] = model.get_solution(work, values)
+                ret["stats"]["nb_free_var"] = model.nb_free_var
+
+        if self.cache != None and outcome != UNKNOWN:
+            self.cache.store(ihash, lambval, instance.n, ret["has_solution"], ret["solution"])
+
+        ret["solve_time"] = time.time() - start_time
+        return ret
+
+    def solve_probe(self, instance, probe, callback):
+        try:
+            ret = self.solve(instance, probe.lambval, probe)
+        except Exception, e:
+            ret = { "lambda" : probe.lambval, "error" : e }
+        callback(ret)
+
+    def submit(self, instance, lambval, callback):
+        """
+        Asynchronous solve() in one of nb_workers threads, the result (or
+        a dict with error) is passed to callback. Returns the Probe.
+        """
+        if self.threads == None:
+            self.threads = ThreadPool(self.nb_workers)
+        probe = Probe(lambval)
+        self.threads.apply_async(self.solve_probe, (instance, probe, callback))
+        return probe
+
+    def close(self):
+        if self.threads != None:
+            self.threads.close()
+            self.threads.join()
+            self.threads = None
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
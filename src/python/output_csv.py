@@ -0,0 +1,237 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# CSV output of schedules, one row per resource block of a task rect
+#
+# fname.csv.gz and fname.csv.bz2 are compressed while writing. In append
+# mode, each call adds a new compressed stream, gzip/bzip2 read such
+# files as one.
+
+import os
+import bz2
+import gzip
+import operator
+import schedule_validation
+
+# number of rows formatted before the buffer is written
+ROWS_PER_CHUNK = 4096
+
+# column -> (position in a row, format, precision applies)
+CSV_COLUMNS = {
+    "name"  : (0, "%s", False),
+    "type"  : (1, "%d", False),
+    "setid" : (2, "%d", False),
+    "sres"  : (3, "%d", False),
+    "nres"  : (4, "%d", False),
+    "stime" : (5, "%%.%df", True),
+    "etime" : (6, "%%.%df", True)
+}
+
+DEFAULT_COLUMNS = [ "name", "type", "setid", "sres", "nres", "stime", "etime" ]
+
+DEFAULT_PRECISION = 6
+
+
+def get_compression(fname):
+    if fname.endswith(".bz2"):
+        return "bz2"
+    elif fname.endswith(".gz"):
+        return "gz"
+    return None
+
+
+class Bz2AppendFile:
+    # py2's BZ2File cannot append, so we compress into a raw file
+    # (a new bz2 stream per file object)
+
+    def __init__(self, fname):
+        self.fh = open(fname, "ab")
+        self.compressor = bz2.BZ2Compressor()
+
+    def write(self, data):
+        self.fh.write(self.compressor.compress(data))
+
+    def close(self):
+        self.fh.write(self.compressor.flush())
+        self.fh.close()
+
+
+def open_csv_file(fname, append=False):
+    mode = "ab" if append else "wb"
+    compression = get_compression(fname)
+    if compression == "bz2":
+        if append:
+            return Bz2AppendFile(fname)
+        return bz2.BZ2File(fname, mode)
+    elif compression == "gz":
+        return gzip.GzipFile(fname, mode)
+    return open(fname, mode)
+
+
+class ScheduleCsvWriter:
+    """
+    Writes the rows of one or more schedules to a single CSV file.
+
+    columns selects (and orders) the columns of CSV_COLUMNS, float
+    columns are written with precision decimals. extra_columns are
+    prepended to every row, their values are given per schedule in
+    write_schedule (e.g., extra_columns=["alg", "instance"]).
+
+    With append=True, rows are added to an existing file and the header
+    is only written if the file is empty.
+    """
+
+    def __init__(self, fname, columns=None, precision=DEFAULT_PRECISION, extra_columns=None, append=False):
+        if columns == None:
+            columns = DEFAULT_COLUMNS
+        if extra_columns == None:
+            extra_columns = []
+
+        for column in columns:
+            if column not in CSV_COLUMNS:
+                raise ValueError("unknown csv column %s" % ( column ))
+
+        self.columns = list(columns)
+        self.extra_columns = list(extra_columns)
+
+        formats = []
+        for column in self.columns:
+            pos, col_format, has_precision = CSV_COLUMNS[column]
+            if has_precision:
+                col_format = col_format % ( precision )
+            formats.append(col_format)
+        self.row_format = ";".join(formats) + "\n"
+
+        # picks the selected columns from a full row tuple
+        if self.columns == DEFAULT_COLUMNS:
+            self.select = None
+        else:
+            positions = [ CSV_COLUMNS[column][0] for column in self.columns ]
+            if len(positions) == 1:
+                self.select = lambda row: ( row[positions[0]], )
+            else:
+                self.select = operator.itemgetter(*positions)
+
+        write_header = not append or not os.path.exists(fname) or os.path.getsize(fname) == 0
+        self.fh = open_csv_file(fname, append)
+        if write_header:
+            self.fh.write(";".join(self.extra_columns + self.columns) + "\n")
+
+    def write_schedule(self, schedule, extra_values=None, instance=None):
+        # if instance is given, invalid schedules are not written
+        if extra_values == None:
+            extra_values = []
+        if len(extra_values) != len(self.extra_columns):
+            raise ValueError("expected values for %s" % ( self.extra_columns ))
+        if instance != None:
+            problems = schedule_validation.validate_schedule(instance, schedule)
+            if problems:
+                raise ValueError("invalid schedule: %s" % ( "; ".join(problems) ))
+
+        row_format = self.row_format
+        if extra_values:
+            # extra values are constant per schedule
+            prefix = ";".join([ str(v).replace("%", "%%") for v in extra_values ]) + ";"
+            row_format = prefix + row_format
+
+        select = self.select
+        chunk = []
+        for row in schedule.iter_resource_blocks():
+            if select != None:
+                row = select(row)
+            chunk.append(row_format % row)
+            if len(chunk) >= ROWS_PER_CHUNK:
+                self.fh.write("".join(chunk))
+                chunk = []
+        self.fh.write("".join(chunk))
+
+    def close(self):
+        self.fh.close()
+
+
+def write_csv_output(fname, schedule, columns=None, precision=DEFAULT_PRECISION, extra=None, append=False, instance=None):
+    """
+    Write one schedule. extra is a list of (column, value) pairs
+    prepended to each row, e.g. [("alg", "heft_lpt_0"), ("instance", name)].
+    If instance is given, the schedule is validated first (ValueError).
+    """
+    if extra == None:
+        extra = []
+    writer = ScheduleCsvWriter(fname, columns, precision, [ col for col, val in extra ], append)
+    try:
+        writer.write_schedule(schedule, [ val for col, val in extra ], instance)
+    finally:
+        writer.close()
+
+
+def read_csv_file(fname):
+    # all bz2 streams are read (py2's BZ2File stops after the first one)
+    if get_compression(fname) == "bz2":
+        fh = open(fname, "rb")
+        data = fh.read()
+        fh.close()
+        chunks = []
+        while data:
+            decompressor = bz2.BZ2Decompressor()
+            chunks.append(decompressor.decompress(data))
+            data = decompressor.unused_data
+        return "".join(chunks)
+    elif get_compression(fname) == "gz":
+        fh = gzip.GzipFile(fname, "rb")
+    else:
+        fh = open(fname, "rb")
+    data = fh.read()
+    fh.close()
+    return data
+
+
+def read_csv_schedule(fname, nb_cpu, nb_gpu):
+    """
+    Read a schedule written with the default columns (extra columns in
+    front are ignored). Rows of the same task rect are merged into one
+    rect with several resource blocks.
+    """
+    from schedule_common import MoldSchedule, TaskRect
+
+    schedule = MoldSchedule(nb_cpu, nb_gpu)
+    lines = read_csv_file(fname).splitlines()
+    if len(lines) == 0:
+        return schedule
+
+    header = lines[0].split(";")
+    nb_extra = len(header) - len(DEFAULT_COLUMNS)
+    if nb_extra < 0 or header[nb_extra:] != DEFAULT_COLUMNS:
+        raise ValueError("%s: expected columns %s" % ( fname, DEFAULT_COLUMNS ))
+
+    task_rect = None
+    for line in lines[1:]:
+        if line == "":
+            continue
+        name, dev, setid, sres, nres, stime, etime = line.split(";")[nb_extra:]
+        key = ( name, dev, setid, stime, etime )
+        if task_rect != None and key == rect_key:
+            task_rect.set_procs(task_rect.resources + [(int(sres), int(nres))])
+            continue
+        if task_rect != None:
+            schedule.add_task_rect(task_rect)
+        task_rect = TaskRect(int(name), int(dev), int(setid))
+        task_rect.set_procs([(int(sres), int(nres))])
+        task_rect.set_times(float(stime), float(etime))
+        rect_key = key
+    if task_rect != None:
+        schedule.add_task_rect(task_rect)
+
+    return schedule
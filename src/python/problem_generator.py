@@ -19,9 +19,242 @@
 
 import sys
 import os
+import bz2
+import gzip
+import json
+import hashlib
+import StringIO
+import subprocess
+import multiprocessing
+import numpy as np
 import approx_common
 
 from optparse import OptionParser
+from instance_common import SchedulingInstance, AmdahlInstance, instance_to_dict
+
+# defaults of make_instance2.R (problem_generator never overrode them)
+SFRAC_MIN = 0.0
+SFRAC_MAX = 0.5
+MIN_SEQ_TIME = 10.0
+MAX_SEQ_TIME = 100.0
+GPU_MIN_FACTOR = 0.1
+GPU_MAX_FACTOR = 1.5
+GPU_MEAN_FACTOR = 0.5
+GPU_SD_FACTOR = 0.5
+
+# "normal": truncated normal, what make_instance2.R uses (gputime1 with
+# its default arguments, i.e., gpuspeedup_old)
+# "beta": beta(3,5) scaled to [min, max] (gpuspeedup in make_instance2.R)
+GPU_MODELS = [ "normal", "beta" ]
+
+
+def truncated_normal(rs, mean, sd, low, high, size):
+    # rejection sampling as in gpuspeedup_old, redrawing only the rejects
+    vals = rs.normal(mean, sd, size)
+    bad = np.flatnonzero((vals < low) | (vals > high))
+    while len(bad) > 0:
+        vals[bad] = rs.normal(mean, sd, len(bad))
+        bad = bad[(vals[bad] < low) | (vals[bad] > high)]
+    return vals
+
+def generate_instance(nb_tasks, nb_cpu, nb_gpu, seed=None,
+                      sfrac_min=SFRAC_MIN, sfrac_max=SFRAC_MAX,
+                      min_seq_time=MIN_SEQ_TIME, max_seq_time=MAX_SEQ_TIME,
+                      gpu_min_factor=GPU_MIN_FACTOR, gpu_max_factor=GPU_MAX_FACTOR,
+                      gpu_mean_factor=GPU_MEAN_FACTOR, gpu_sd_factor=GPU_SD_FACTOR,
+                      gpu_model="normal", parametric=False):
+    """
+    Instance of the model of make_instance2.R (the same distributions, not
+    the same random numbers as R):
+      sequential time  min + beta(3,5) * (max - min)
+      time on p cores  seq * sfrac + (1 - sfrac) * seq / p, sfrac ~ U(sfrac_min, sfrac_max)
+      GPU time         factor * time on m cores, factor from gpu_model
+    With parametric set, an AmdahlInstance (no n x m table) is returned,
+    its times are bit-identical to those of the table.
+    """
+    if gpu_model not in GPU_MODELS:
+        raise ValueError("unknown gpu model %s" % ( gpu_model ))
+
+    rs = np.random.RandomState(seed)
+    seq_times = min_seq_time + rs.beta(3, 5, nb_tasks) * (max_seq_time - min_seq_time)
+    sfrac = rs.uniform(sfrac_min, sfrac_max, nb_tasks)
+
+    instance = AmdahlInstance(nb_tasks, nb_cpu, nb_gpu, seq_times, sfrac, np.zeros(nb_tasks))
+
+    if gpu_model == "normal":
+        factors = truncated_normal(rs, gpu_mean_factor, gpu_sd_factor, gpu_min_factor, gpu_max_factor, nb_tasks)
+    else:
+        factors = gpu_min_factor + rs.beta(3, 5, nb_tasks) * (gpu_max_factor - gpu_min_factor)
+    instance.gpudata = factors * instance.get_min_cpu_times()
+
+    if parametric:
+        return instance
+    return SchedulingInstance(nb_tasks, nb_cpu, nb_gpu, instance.cpudata, instance.gpudata)
+
+def write_instance(fname, instance, parametric=False):
+    fh = open(fname, "w")
+    fh.write(json.dumps(instance_to_dict(instance, parametric)))
+    fh.close()
+
+
+# sweep over the instance grid (see __main__)
+
+MANIFEST_FNAME = "manifest.csv"
+MANIFEST_COLUMNS = [ "fname", "n", "m", "k", "i", "seed", "gpu_model", "layout", "sha1" ]
+
+COMPRESSIONS = {
+    "bz2"  : ".bz2",
+    "gz"   : ".gz",
+    "none" : ""
+}
+
+# factor 16 between max_m and max_k (max_k = max_m / 16)
+MLIST = [ 4, 16, 64, 256, 512 ]
+KLIST = [ 1, 2, 4, 8, 16, 32 ]
+NHASH = {
+    10 : {
+        "min_m" : 4,
+        "max_m" : 16,
+        "max_k" : 1
+    },
+    100 : {
+        "min_m" : 4,
+        "max_m" : 64,
+        "max_k" : 4
+    },
+    1000 : {
+        "min_m" : 16,
+        "max_m" : 512,
+        "max_k" : 32
+    }
+}
+
+
+def get_sweep_jobs(nlist, nb_instances, gpu_model, compression, layout="table"):
+    """
+    Parameters of all instances of the grid. n not in NHASH (larger
+    variants) use the m/k range of the largest n of the paper.
+    """
+    jobs = []
+    for n in nlist:
+        limits = NHASH.get(n, NHASH[max(NHASH.keys())])
+        for m in MLIST:
+            for k in KLIST:
+                if m > limits["max_m"] or m < limits["min_m"] or k > limits["max_k"]:
+                    continue
+                for i in xrange(0, nb_instances):
+                    fname = "problem_n%d_m%d_k%d_i%d.in%s" % ( n, m, k, i, COMPRESSIONS[compression] )
+                    jobs.append({
+                        "fname"     : fname,
+                        "n"         : n,
+                        "m"         : m,
+                        "k"         : k,
+                        "i"         : i,
+                        "seed"      : i,
+                        "gpu_model" : gpu_model if gpu_model != None else "rscript",
+                        "layout"    : layout
+                    })
+    return jobs
+
+def compress_data(data, compression):
+    if compression == "bz2":
+        return bz2.compress(data)
+    elif compression == "gz":
+        buf = StringIO.StringIO()
+        fh = gzip.GzipFile(fileobj=buf, mode="wb", mtime=0)
+        fh.write(data)
+        fh.close()
+        return buf.getvalue()
+    return data
+
+def make_instance_data(job, rgen_script=None):
+    # instance file content (uncompressed)
+    if job["gpu_model"] == "rscript":
+        call = [ "Rscript", rgen_script, "-n", str(job["n"]), "-m", str(job["m"]), "-k", str(job["k"]), "-s", str(job["seed"]) ]
+        # without -o, make_instance2.R would print() the JSON as R string
+        proc = subprocess.Popen(call + [ "-o", "/dev/stdout" ], stdout=subprocess.PIPE)
+        data = proc.communicate()[0]
+        if proc.returncode != 0:
+            raise RuntimeError("%s failed" % ( " ".join(call) ))
+        return data
+    parametric = job["layout"] == "amdahl"
+    instance = generate_instance(job["n"], job["m"], job["k"], seed=job["seed"], gpu_model=job["gpu_model"], parametric=parametric)
+    return json.dumps(instance_to_dict(instance, parametric))
+
+def run_sweep_job(args):
+    # worker: generate, compress and write one instance, returns the sha1
+    outdir, job, compression, rgen_script = args
+    data = compress_data(make_instance_data(job, rgen_script), compression)
+    fh = open(os.path.join(outdir, job["fname"]), "wb")
+    fh.write(data)
+    fh.close()
+    return hashlib.sha1(data).hexdigest()
+
+def get_file_sha1(fname):
+    fh = open(fname, "rb")
+    sha1 = hashlib.sha1(fh.read()).hexdigest()
+    fh.close()
+    return sha1
+
+def read_manifest(outdir):
+    # fname -> entry (last entry wins)
+    manifest = {}
+    fname = os.path.join(outdir, MANIFEST_FNAME)
+    if not os.path.exists(fname):
+        return manifest
+    fh = open(fname)
+    lines = fh.read().splitlines()
+    fh.close()
+    for line in lines[1:]:
+        fields = line.split(";")
+        if len(fields) == len(MANIFEST_COLUMNS):
+            manifest[fields[0]] = dict(zip(MANIFEST_COLUMNS, fields))
+    return manifest
+
+def is_up_to_date(outdir, job, manifest):
+    entry = manifest.get(job["fname"])
+    if entry == None:
+        return False
+    for column in MANIFEST_COLUMNS[1:-1]:
+        if entry[column] != str(job[column]):
+            return False
+    path = os.path.join(outdir, job["fname"])
+    return os.path.exists(path) and get_file_sha1(path) == entry["sha1"]
+
+def run_sweep(outdir, jobs, compression, nb_procs, rgen_script=None, verbose=True):
+    """
+    Generate all instances of jobs that are missing or do not match the
+    manifest. Returns the number of generated instances.
+    """
+    manifest = read_manifest(outdir)
+    todo = [ job for job in jobs if not is_up_to_date(outdir, job, manifest) ]
+
+    manifest_fname = os.path.join(outdir, MANIFEST_FNAME)
+    write_header = not os.path.exists(manifest_fname) or os.path.getsize(manifest_fname) == 0
+    fh = open(manifest_fname, "a")
+    if write_header:
+        fh.write(";".join(MANIFEST_COLUMNS) + "\n")
+
+    pool = multiprocessing.Pool(processes=nb_procs)
+    try:
+        args = [ ( outdir, job, compression, rgen_script ) for job in todo ]
+        # a job is only in the manifest once its file is complete
+        for job, sha1 in zip(todo, pool.imap(run_sweep_job, args)):
+            entry = [ str(job[column]) for column in MANIFEST_COLUMNS[:-1] ] + [ sha1 ]
+            fh.write(";".join(entry) + "\n")
+            fh.flush()
+            if verbose:
+                print os.path.join(outdir, job["fname"])
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        fh.close()
+
+    return len(todo)
+
 
 if __name__ == "__main__":
 
@@ -37,6 +270,55 @@ if __name__ == "__main__":
                        type    = "string",
                        help    = "directory for problem files" )
 
+    parser.add_option( "-r", "--rscript",
+                       action  = "store_true",
+                       dest    = "use_r",
+                       help    = "generate instances with Rscript make_instance2.R",
+                       default = False )
+
+    parser.add_option( "-g", "--gpu-model",
+                       action  = "store",
+                       dest    = "gpu_model",
+                       type    = "choice",
+                       choices = GPU_MODELS,
+                       default = "normal",
+                       help    = "distribution of the GPU factor (%s)" % ( ", ".join(GPU_MODELS) ) )
+
+    parser.add_option( "-a", "--amdahl",
+                       action  = "store_true",
+                       dest    = "amdahl",
+                       help    = "write (seq time, sfrac) per task instead of the n x m table (Python only)",
+                       default = False )
+
+    parser.add_option( "-n", "--ntasks",
+                       action  = "store",
+                       dest    = "ntasks",
+                       type    = "string",
+                       default = ",".join([ str(n) for n in sorted(NHASH.keys()) ]),
+                       help    = "comma separated list of task counts" )
+
+    parser.add_option( "-i", "--instances",
+                       action  = "store",
+                       dest    = "nb_instances",
+                       type    = "int",
+                       default = 5,
+                       help    = "instances per (n, m, k)" )
+
+    parser.add_option( "-z", "--compression",
+                       action  = "store",
+                       dest    = "compression",
+                       type    = "choice",
+                       choices = sorted(COMPRESSIONS.keys()),
+                       default = "bz2",
+                       help    = "compression of the problem files (%s)" % ( ", ".join(sorted(COMPRESSIONS.keys())) ) )
+
+    parser.add_option( "-p", "--processes",
+                       action  = "store",
+                       dest    = "nb_procs",
+                       type    = "int",
+                       default = multiprocessing.cpu_count(),
+                       help    = "number of worker processes" )
+
     ( options, args ) = parser.parse_args()
 
     rgen_script = os.path.join( approx_common.get_approx_code_basename(), "src", "R", "make_instance2.R" )
@@ -46,55 +328,14 @@ if __name__ == "__main__":
         parser.print_help()
         sys.exit(1)
 
-    #nlist = [ 10, 100, 1000 ]
-    #nlist = [ 10, 50, 100 ]
-
-    mlist = [ 4, 16, 64, 256, 512 ]
-    klist = [ 1, 2, 4, 8, 16, 32 ]
-
-    # factor 16 between max_m and max_k
-    # max_k = max_m / 16
-    nhash = {
-        10 : {
-        "min_m" : 4,
-        "max_m" : 16,
-        "max_k" : 1
-        },
-        100 : {
-        "min_m" : 4,
-        "max_m" : 64,
-        "max_k" : 4
-        },
-        1000 : {
-        "min_m" : 16,
-        "max_m" : 512,
-        "max_k" : 32
-        }
-    }
-
-
-    sfrac_min = 0
-    sfrac_max = .9
-    gpu_min_factor = 0.1
-    gpu_max_factor = 1.5
-    gpu_mean_factor = 0.2
-    gpu_sd_factor = 0.5
-    min_seq_time = 1
-    max_seq_time = 100
-
-    nb_instances = 5
+    nlist = [ int(n) for n in options.ntasks.split(",") ]
+    gpu_model = None if options.use_r else options.gpu_model
+    layout = "amdahl" if options.amdahl else "table"
+    if options.use_r and options.amdahl:
+        print >> sys.stderr, "-a cannot be used with -r"
+        sys.exit(1)
 
-    for n in nhash.keys():
-        for m in mlist:
-            for k in klist:
-                if m > nhash[n]["max_m"] or m < nhash[n]["min_m"] or k > nhash[n]["max_k"]:
-                    continue
+    jobs = get_sweep_jobs(nlist, options.nb_instances, gpu_model, options.compression, layout)
+    nb_generated = run_sweep(options.outdir, jobs, options.compression, options.nb_procs, rgen_script)
 
-                for i in xrange(0, nb_instances):
-                    fname = "problem_n%d_m%d_k%d_i%d.in" % ( n, m, k, i )
-                    outpath = os.path.join( options.outdir, fname )
-                    call = "Rscript %s -n %d -m %d -k %d -o %s -s %d" % ( rgen_script, n, m, k, outpath, i )
-                    print call
-                    os.system(call)
-                    call = "bzip2 %s" % ( outpath )
-                    os.system(call)
+    print "instances:", len(jobs), "generated:", nb_generated
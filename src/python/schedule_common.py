@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 
 # SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
 # Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
@@ -17,7 +18,28 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from jinja2 import Environment, FileSystemLoader
+import array
+import heapq
+import itertools
 import os
+import random
+import numpy as np
+import output_csv
+
+# compiled jinja.jed, see get_jedule_template()
+jedule_template = None
+
+def get_jedule_template():
+    global jedule_template
+    if jedule_template == None:
+        template_dir = os.path.dirname(os.path.abspath(__file__))
+        j2_env = Environment(
+            loader=FileSystemLoader(template_dir),
+            trim_blocks=True,
+            lstrip_blocks=True
+        )
+        jedule_template = j2_env.get_template('jinja.jed')
+    return jedule_template
 
 
 class PU:
@@ -46,32 +68,420 @@ class GPU(PU):
     arch_id = 1
 
 
-class MoldSchedule:
+class PUQueue:
+    """
+    Availability index of the PUs of one architecture.
+
+    pop() takes out the PU with the earliest finish time for a task of
+    a given duration. Ties are broken on the lowest pid, as a linear
+    scan over the PUs would do. A PU whose lasttime changed must be
+    pop()-ed before and push()-ed after the change.
+
+    PUs are bucketed by lasttime: a min-heap holds the distinct lasttimes,
+    each bucket is a min-heap of pids. So PUs that are idle at the same
+    time (e.g., all PUs at 0.0) cost O(log m) per pop.
+    """
+
+    def __init__(self, pus):
+        self.times = []
+        self.buckets = {}
+        self.nb_pus = 0
+        for pu in pus:
+            self.push(pu)
+
+    def __len__(self):
+        return self.nb_pus
+
+    def push(self, pu):
+        lasttime = pu.get_lasttime()
+        bucket = self.buckets.get(lasttime)
+        if bucket == None:
+            bucket = []
+            self.buckets[lasttime] = bucket
+            heapq.heappush(self.times, lasttime)
+        heapq.heappush(bucket, (pu.get_pid(), pu))
+        self.nb_pus += 1
+
+    def pop(self, duration):
+        # returns (eft, pu)
+        times = self.times
+        best_time = times[0]
+        eft = best_time + duration
+
+        # different lasttimes may round to the same eft, the lowest pid wins
+        if len(times) > 1 and min(times[1:3]) + duration == eft:
+            for lasttime in heapq.nsmallest(len(times), times)[1:]:
+                if lasttime + duration != eft:
+                    break
+                if self.buckets[lasttime][0][0] < self.buckets[best_time][0][0]:
+                    best_time = lasttime
+
+        bucket = self.buckets[best_time]
+        pid, pu = heapq.heappop(bucket)
+        if len(bucket) == 0:
+            del self.buckets[best_time]
+            if best_time == times[0]:
+                heapq.heappop(times)
+            else:
+                times.remove(best_time)
+                heapq.heapify(times)
+        self.nb_pus -= 1
+
+        return eft, pu
+
+    def pop_within_bound(self, duration, bound):
+        # PU with the earliest finish time if that is <= bound, None otherwise
+        if self.nb_pus == 0:
+            return None
+        eft, pu = self.pop(duration)
+        if eft > bound:
+            self.push(pu)
+            return None
+        return pu
+
+
+def get_pid_blocks(pids):
+    # (first pid, nb of PUs) of every run of consecutive pids
+    blocks = []
+    for pid in sorted(pids):
+        if len(blocks) > 0 and blocks[-1][0] + blocks[-1][1] == pid:
+            blocks[-1][1] += 1
+        else:
+            blocks.append([ pid, 1 ])
+    return [ tuple(block) for block in blocks ]
+
+
+class FreeInterval(object):
+    # gap [start, end) of PU pid, node of the treap of FreeIntervals
+
+    __slots__ = ( "start", "end", "pid", "prio", "left", "right", "longest" )
+
+    def __init__(self, start, end, pid, prio):
+        self.start = start
+        self.end = end
+        self.pid = pid
+        self.prio = prio
+        self.left = None
+        self.right = None
+        self.longest = end - start
+
+    def get_key(self):
+        return ( self.start, self.pid )
+
+    def update(self):
+        # longest gap of the subtree
+        longest = self.end - self.start
+        if self.left != None and self.left.longest > longest:
+            longest = self.left.longest
+        if self.right != None and self.right.longest > longest:
+            longest = self.right.longest
+        self.longest = longest
+
+
+class FreeIntervals:
+    """
+    Idle intervals (gaps) of the PUs of one architecture, ordered by start
+    and pid in a treap. Every node also holds the longest gap of its
+    subtree, so the earliest gap of a given length (lowest pid on ties)
+    is found in O(log g). Adding and filling a gap cost O(log g) as well
+    (expected, the priorities are random).
+
+    A task only takes the beginning of a gap, the rest of the gap moves
+    to its new place in the order. Gaps shorter than min_length (e.g.,
+    the shortest task) are not kept.
+    """
+
+    def __init__(self, min_length=0.0, seed=0):
+        self.min_length = min_length
+        self.root = None
+        self.nb_gaps = 0
+        self.rand = random.Random(seed)
+
+    def __len__(self):
+        return self.nb_gaps
+
+    def split(self, node, key):
+        # (nodes with keys < key, nodes with keys >= key)
+        if node == None:
+            return None, None
+        if node.get_key() < key:
+            node.right, right = self.split(node.right, key)
+            node.update()
+            return node, right
+        left, node.left = self.split(node.left, key)
+        node.update()
+        return left, node
+
+    def merge(self, left, right):
+        # all keys of left < all keys of right
+        if left == None:
+            return right
+        if right == None:
+            return left
+        if left.prio > right.prio:
+            left.right = self.merge(left.right, right)
+            left.update()
+            return left
+        right.left = self.merge(left, right.left)
+        right.update()
+        return right
+
+    def replace_child(self, parent, key, node):
+        if parent == None:
+            self.root = node
+        elif key < parent.get_key():
+            parent.left = node
+        else:
+            parent.right = node
+
+    def add(self, start, end, pid):
+        # gap [start, end) of PU pid, end > start
+        if end - start < self.min_length:
+            return
+        gap = FreeInterval(start, end, pid, self.rand.random())
+        key = gap.get_key()
+        # down to where gap goes by its priority, only the subtree there is split
+        length = gap.longest
+        prio = gap.prio
+        parent = None
+        node = self.root
+        while node != None and node.prio > prio:
+            if length > node.longest:
+                node.longest = length
+            parent = node
+            if start < node.start or (start == node.start and pid < node.pid):
+                node = node.left
+            else:
+                node = node.right
+        gap.left, gap.right = self.split(node, key)
+        gap.update()
+        self.replace_child(parent, key, gap)
+        self.nb_gaps += 1
+
+    def find(self, duration):
+        # earliest gap of at least duration, None if there is none
+        node = self.root
+        if node == None or node.longest < duration:
+            return None
+        while True:
+            if node.left != None and node.left.longest >= duration:
+                node = node.left
+            elif node.end - node.start >= duration:
+                return node
+            else:
+                node = node.right
+
+    def fill(self, gap, duration):
+        # puts a task at the beginning of gap, returns its start time
+        start = gap.start
+        key = gap.get_key()
+        path = []
+        node = self.root
+        while node is not gap:
+            path.append(node)
+            if key < node.get_key():
+                node = node.left
+            else:
+                node = node.right
+        self.replace_child(path[-1] if path else None, key, self.merge(gap.left, gap.right))
+        for node in reversed(path):
+            node.update()
+        self.nb_gaps -= 1
+        if gap.end - (start + duration) > 0.0:
+            self.add(start + duration, gap.end, gap.pid)
+        return start
+
+
+class PUIntervals:
+    """
+    Availability of the PUs of one architecture for insertion-based
+    scheduling: the lasttime of every PU and the gaps before them
+    (FreeIntervals).
+
+    A segment tree over the pids holds the smallest lasttime of every
+    subtree, the PU with the earliest finish time behind its lasttime
+    (lowest pid on ties) is found in O(log m). Gaps shorter than
+    min_gap are dropped, no task fits into them.
+    """
+
+    def __init__(self, nb_pus, min_gap=0.0):
+        self.lasttimes = np.zeros(nb_pus)
+        self.size = 1
+        while self.size < nb_pus:
+            self.size *= 2
+        # tree[1] is the root, pid i is leaf size+i
+        self.tree = [ float("inf") ] * (2 * self.size)
+        for node in xrange(self.size, self.size+nb_pus):
+            self.tree[node] = 0.0
+        for node in xrange(self.size-1, 0, -1):
+            self.tree[node] = min(self.tree[2*node], self.tree[2*node+1])
+        self.gaps = FreeIntervals(min_gap)
+        self.order = None
+
+    def __len__(self):
+        return len(self.lasttimes)
+
+    def set_lasttimes(self, pids, lasttime):
+        self.lasttimes[pids] = lasttime
+        tree = self.tree
+        # the tree is updated level by level, shared parents only once
+        nodes = set()
+        for pid in pids:
+            tree[self.size+pid] = lasttime
+            nodes.add((self.size+pid) // 2)
+        while nodes:
+            parents = set()
+            for node in nodes:
+                tree[node] = min(tree[2*node], tree[2*node+1])
+                parents.add(node // 2)
+            parents.discard(0)
+            nodes = parents
+
+    def earliest_append(self, duration):
+        # (eft, pid) of a task behind the lasttime of a PU
+        tree = self.tree
+        eft = tree[1] + duration
+        # different lasttimes may round to the same eft, the lowest pid wins
+        node = 1
+        while node < self.size:
+            node *= 2
+            if not tree[node] + duration <= eft:
+                node += 1
+        return eft, node - self.size
+
+    def earliest_finish(self, duration):
+        """
+        (eft, pid, gap) of a task on one PU: in the earliest gap that
+        fits (gaps win ties) or behind the lasttime of a PU (gap None).
+        """
+        eft, pid = self.earliest_append(duration)
+        gap = self.gaps.find(duration)
+        if gap != None and gap.start + duration <= eft:
+            return gap.start + duration, gap.pid, gap
+        return eft, pid, None
+
+    def fill_gap(self, gap, duration):
+        # puts a task into gap, returns its start time
+        return self.gaps.fill(gap, duration)
+
+    def get_order(self):
+        """
+        Pids by lasttime (lowest pid first on ties). The order is built
+        on the first call and kept up to date by append(), in O(m).
+        """
+        if self.order is None:
+            self.order = np.argsort(self.lasttimes, kind="mergesort")
+        return self.order
+
+    def append(self, pids, start, end):
+        # task from start to end on PUs pids (start >= their lasttimes)
+        for pid, lasttime in zip(pids, self.lasttimes[pids].tolist()):
+            if lasttime < start:
+                self.gaps.add(lasttime, start, pid)
+        self.set_lasttimes(pids, end)
+
+        if self.order is not None:
+            moved = np.sort(np.array(pids, dtype=self.order.dtype))
+            order = self.order[~np.in1d(self.order, moved, assume_unique=True)]
+            times = self.lasttimes[order]
+            lo = int(np.searchsorted(times, end, side="left"))
+            hi = int(np.searchsorted(times, end, side="right"))
+            # PUs with lasttime end are ordered by pid
+            tie = np.sort(np.concatenate((order[lo:hi], moved)))
+            self.order = np.concatenate((order[:lo], tie, order[hi:]))
+
+
+class MoldSchedule(object):
+    """
+    Schedule stored as parallel typed arrays (one entry per task rect):
+    task id, device, set, start, end, first PU and number of PUs.
+
+    add_task_rect() copies a TaskRect into the arrays, get_task_rects()
+    returns lightweight TaskRectView objects on top of them. Rects with
+    more than one block of PUs keep their blocks in extra_resources.
+    """
 
     def __init__(self, nb_cpu, nb_gpu):
-        self.task_rects = []
         self.nb_cpu = nb_cpu
         self.nb_gpu = nb_gpu
         self.metainfo = {}
         self.archs = [Core, GPU]
 
+        self.task_ids    = array.array("l")
+        self.device_ids  = array.array("i")
+        self.set_ids     = array.array("i")
+        self.start_times = array.array("d")
+        self.end_times   = array.array("d")
+        self.first_pus   = array.array("l")
+        self.nbps        = array.array("l")  # sum over all blocks
+        self.rect_kinds  = array.array("b")  # TaskRect.rect_kind
+        self.extra_resources = {}            # rect idx -> list of blocks
+
+        self.makespan = 0.0
+        self.makespan_valid = True
+
     def get_nb_cpu(self):
         return self.nb_cpu
 
     def get_nb_gpu(self):
         return self.nb_gpu
 
+    def get_nb_task_rects(self):
+        return len(self.task_ids)
+
+    def get_column(self, name):
+        # numpy copy of one array column (e.g., "end_times"); a view would
+        # dangle once add_task_rect reallocates the array
+        column = getattr(self, name)
+        if len(column) == 0:
+            return np.zeros(0, dtype=column.typecode)
+        return np.frombuffer(column, dtype=column.typecode).copy()
+
     def add_task_rect(self, task_rect):
-        self.task_rects.append(task_rect)
+        idx = len(self.task_ids)
+        resources = task_rect.resources
+
+        self.task_ids.append(int(task_rect.task_id))
+        self.device_ids.append(task_rect.device_id)
+        self.set_ids.append(task_rect.set_id)
+        self.start_times.append(task_rect.start_time)
+        self.end_times.append(task_rect.end_time)
+        if len(resources) > 0:
+            self.first_pus.append(resources[0][0])
+        else:
+            self.first_pus.append(-1)
+        self.nbps.append(task_rect.get_nbp())
+        self.rect_kinds.append(task_rect.rect_kind)
+        if len(resources) != 1:
+            self.extra_resources[idx] = list(resources)
+
+        if task_rect.end_time > self.makespan:
+            self.makespan = task_rect.end_time
+
+        return TaskRectView(self, idx)
 
     def get_task_rects(self):
-        return self.task_rects
+        return TaskRectList(self)
+
+    task_rects = property(get_task_rects)
+
+    def iter_resource_blocks(self):
+        # (task_id, device_id, set_id, blk_start, blk_size, start_time, end_time)
+        extra_resources = self.extra_resources
+        for idx, row in enumerate(itertools.izip(self.task_ids, self.device_ids, self.set_ids,
+                                                 self.first_pus, self.nbps,
+                                                 self.start_times, self.end_times)):
+            if idx in extra_resources:
+                for blk_start, blk_size in extra_resources[idx]:
+                    yield ( row[0], row[1], row[2], blk_start, blk_size, row[5], row[6] )
+            else:
+                yield row
 
     def get_makespan(self):
-        makespan = 0.0
-        for task_rect in self.task_rects:
-            makespan = max(makespan, task_rect.get_end_time())
-        return makespan
+        if not self.makespan_valid:
+            self.makespan = max(self.end_times) if len(self.end_times) > 0 else 0.0
+            self.makespan_valid = True
+        return self.makespan
 
     def set_metainfo(self, key, value):
         self.metainfo[key] = value
@@ -80,43 +490,22 @@ class MoldSchedule:
         return self.metainfo[key]
 
     def get_jedule_output(self):
-        template_dir = os.path.dirname(os.path.abspath(__file__))
-        j2_env = Environment(
-            loader=FileSystemLoader(template_dir),
-            trim_blocks=True,
-            lstrip_blocks=True
-        )
-        template = j2_env.get_template('jinja.jed')
-        return template.stream(vars(self))
+        # jinja path, jedule_output.write_jedule_output is much faster
+        return get_jedule_template().stream({
+            "metainfo"   : self.metainfo,
+            "archs"      : self.archs,
+            "task_rects" : self.get_task_rects()
+        })
 
-    def write_csv_output(self, fname):
-        fh = open(fname, "w")
-        fh.write("name;type;setid;sres;nres;stime;etime\n")
-        for tr in self.task_rects:
-            for blk_start, blk_size in tr.resources:
-                fh.write("%s;%d;%d;%d;%d;%f;%f\n" % (
-                tr.task_id, \
-                tr.device_id, \
-                tr.set_id,
-                blk_start, \
-                blk_size, \
-                tr.start_time, \
-                tr.end_time )
-                )
+    def write_csv_output(self, fname, **kwargs):
+        # see output_csv.write_csv_output for the options
+        output_csv.write_csv_output(fname, self, **kwargs)
 
-        fh.close()
 
+class TaskRectBase(object):
+    # getters shared by TaskRect and TaskRectView
 
-
-class TaskRect:
-
-    def __init__(self, task_id, device_id, set_id):
-        self.task_id = task_id
-        self.device_id = device_id
-        self.set_id = set_id
-        self.resources = [] # list of contiguous blocks: (start_id, nb_procs)
-        self.start_time = None
-        self.end_time = None
+    __slots__ = ()
 
     def get_task_id(self):
         return self.task_id
@@ -130,23 +519,12 @@ class TaskRect:
     def get_set_str(self):
         return self.set_id
 
-    def get_nbp(self):
-        # TODO: could be cached or computed when pus are added
-        return reduce(lambda x, y: x + y, [ r[1] for r in self.resources ])
-
     def get_start_time(self):
         return self.start_time
 
     def get_end_time(self):
         return self.end_time
 
-    def set_procs(self, resources):
-        self.resources = resources
-
-    def set_times(self, start_time, end_time):
-        self.start_time = start_time
-        self.end_time = end_time
-
     def print_rect(self):
         print "*********************************************"
         print "task id", self.task_id, " device:", self.device_id
@@ -155,10 +533,124 @@ class TaskRect:
         print "start:", self.start_time
         print "end  :", self.end_time
 
+
+class TaskRect(TaskRectBase):
+
+    __slots__ = ( "task_id", "device_id", "set_id", "resources", "start_time", "end_time", "nbp" )
+
+    rect_kind = 0
+
+    def __init__(self, task_id, device_id, set_id):
+        self.task_id = task_id
+        self.device_id = device_id
+        self.set_id = set_id
+        self.resources = [] # list of contiguous blocks: (start_id, nb_procs)
+        self.start_time = None
+        self.end_time = None
+        self.nbp = 0
+
+    def get_nbp(self):
+        return self.nbp
+
+    def set_procs(self, resources):
+        self.resources = resources
+        self.nbp = sum([ r[1] for r in resources ])
+
+    def set_times(self, start_time, end_time):
+        self.start_time = start_time
+        self.end_time = end_time
+
 class ImtsTaskRect(TaskRect):
 
+    __slots__ = ()
+
+    rect_kind = 1
+
     def __init__(self, task_id, device_id, set_id):
         TaskRect.__init__(self, task_id, device_id, int(set_id)-1)
 
     def get_set_str(self):
         return "set%d" % ( self.set_id )
+
+
+class TaskRectView(TaskRectBase):
+    """
+    Task rect idx of a MoldSchedule, reads and writes its arrays.
+    """
+
+    __slots__ = ( "schedule", "idx" )
+
+    def __init__(self, schedule, idx):
+        self.schedule = schedule
+        self.idx = idx
+
+    task_id    = property(lambda self: self.schedule.task_ids[self.idx])
+    device_id  = property(lambda self: self.schedule.device_ids[self.idx])
+    set_id     = property(lambda self: self.schedule.set_ids[self.idx])
+    start_time = property(lambda self: self.schedule.start_times[self.idx])
+    end_time   = property(lambda self: self.schedule.end_times[self.idx])
+
+    @property
+    def rect_kind(self):
+        return self.schedule.rect_kinds[self.idx]
+
+    @property
+    def resources(self):
+        blocks = self.schedule.extra_resources.get(self.idx)
+        if blocks != None:
+            return blocks
+        return [ (self.schedule.first_pus[self.idx], self.schedule.nbps[self.idx]) ]
+
+    def get_set_str(self):
+        if self.rect_kind == ImtsTaskRect.rect_kind:
+            return "set%d" % ( self.set_id )
+        return self.set_id
+
+    def get_nbp(self):
+        return self.schedule.nbps[self.idx]
+
+    def set_procs(self, resources):
+        schedule = self.schedule
+        schedule.nbps[self.idx] = sum([ r[1] for r in resources ])
+        if len(resources) == 1:
+            schedule.first_pus[self.idx] = resources[0][0]
+            schedule.extra_resources.pop(self.idx, None)
+        else:
+            schedule.first_pus[self.idx] = resources[0][0] if resources else -1
+            schedule.extra_resources[self.idx] = list(resources)
+
+    def set_times(self, start_time, end_time):
+        schedule = self.schedule
+        schedule.start_times[self.idx] = start_time
+        schedule.end_times[self.idx] = end_time
+        schedule.makespan_valid = False
+
+
+class TaskRectList(object):
+    """
+    Sequence of the task rects of a MoldSchedule (views are created on access).
+    """
+
+    __slots__ = ( "schedule", )
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+
+    def __len__(self):
+        return len(self.schedule.task_ids)
+
+    def __getitem__(self, idx):
+        nb_rects = len(self)
+        if isinstance(idx, slice):
+            # list of views, as the slice of the former list of TaskRects
+            return [ TaskRectView(self.schedule, i) for i in xrange(*idx.indices(nb_rects)) ]
+        if idx < 0:
+            idx += nb_rects
+        if idx < 0 or idx >= nb_rects:
+            raise IndexError("task rect index out of range")
+        return TaskRectView(self.schedule, idx)
+
+    def __iter__(self):
+        schedule = self.schedule
+        for idx in xrange(0, len(schedule.task_ids)):
+            yield TaskRectView(schedule, idx)
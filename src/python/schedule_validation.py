@@ -0,0 +1,235 @@
+#! /usr/bin/env python
+
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# checks a MoldSchedule against its instance:
+#   - every task is scheduled exactly once
+#   - rects use existing PUs (one PU per GPU task)
+#   - end - start is the time of the task on the allotted PUs
+#   - no two rects overlap on a core or GPU
+#
+# all checks work on the array columns of the schedule; the overlap check
+# sweeps over the resource blocks (first PU, nb PUs) in the order of their
+# start times and keeps the blocks running at the current start ordered by
+# first PU, O(R log R) for R blocks, independent of the block sizes
+
+import sys
+import bisect
+import heapq
+import itertools
+import numpy as np
+
+import schedule_common
+
+from optparse import OptionParser
+from instance_common import as_scheduling_instance
+
+# relative tolerance for durations and overlaps
+DEFAULT_TOLERANCE = 1e-9
+
+# number of offending rects reported per check
+MAX_REPORTS = 5
+
+
+def is_close(a, b, tol):
+    return np.abs(a - b) <= tol * np.maximum(1.0, np.abs(b))
+
+def report(problems, mask, msg, task_ids, max_reports):
+    bad = np.flatnonzero(mask)
+    if len(bad) > 0:
+        ids = ", ".join([ str(t) for t in task_ids[bad[:max_reports]].tolist() ])
+        if len(bad) > max_reports:
+            ids += ", ..."
+        problems.append("%s: %d (task %s)" % ( msg, len(bad), ids ))
+
+def check_overlaps(firsts, nbs, starts, ends, task_ids, tol):
+    # firsts, nbs, starts, ends: one entry per resource block
+    # returns the task ids of the blocks that overlap a block started before
+    # a block runs at t while start <= t < end - tol, the tolerance of
+    # is_close; blocks that never run cannot overlap
+    eff_ends = ends - tol * np.maximum(1.0, ends)
+    runs = eff_ends > starts
+    firsts, nbs, starts, eff_ends, task_ids = firsts[runs], nbs[runs], starts[runs], eff_ends[runs], task_ids[runs]
+    if len(firsts) < 2:
+        return np.zeros(0, dtype=np.int64)
+    if np.all(nbs == 1):
+        # single PU blocks (GPUs, seq_only): sorted by (PU, start), an
+        # overlap always shows up between neighbors
+        order = np.lexsort((starts, firsts))
+        overlap = (firsts[order[1:]] == firsts[order[:-1]]) & (starts[order[1:]] < eff_ends[order[:-1]])
+        return task_ids[order[1:][overlap]]
+    order = np.argsort(starts, kind="mergesort")
+    running = []     # (eff_end, first PU) of the running blocks
+    run_firsts = []  # their first PUs, sorted; the ranges are disjoint
+    run_lasts = {}   # first PU -> last PU + 1
+    overlapping = []
+    for i, first, nb, start, eff_end in itertools.izip(order.tolist(), firsts[order].tolist(),
+                                                       nbs[order].tolist(), starts[order].tolist(),
+                                                       eff_ends[order].tolist()):
+        while running and running[0][0] <= start:
+            done_first = heapq.heappop(running)[1]
+            del run_firsts[bisect.bisect_left(run_firsts, done_first)]
+            del run_lasts[done_first]
+        # only the running ranges next to first can intersect [first, first+nb)
+        pos = bisect.bisect_right(run_firsts, first)
+        if (pos > 0 and run_lasts[run_firsts[pos-1]] > first) or \
+           (pos < len(run_firsts) and run_firsts[pos] < first + nb):
+            overlapping.append(i)
+        else:
+            # overlapping blocks stay out, so the running ranges stay disjoint
+            run_firsts.insert(pos, first)
+            run_lasts[first] = first + nb
+            heapq.heappush(running, ( eff_end, first ))
+    return task_ids[np.array(overlapping, dtype=np.int64)]
+
+def expand_blocks(schedule, device_id):
+    # (rect idx, first PU, nb PUs) of all resource blocks on device_id
+    device_ids = schedule.get_column("device_ids")
+    idx = np.flatnonzero(device_ids == device_id)
+    first_pus = schedule.get_column("first_pus")[idx]
+    nb_pus = schedule.get_column("nbps")[idx]
+
+    # rects with several blocks are rare, they are expanded one by one
+    multi = [ i for i in schedule.extra_resources.iterkeys() if device_ids[i] == device_id ]
+    if multi:
+        keep = ~np.in1d(idx, multi)
+        idx = idx[keep]
+        first_pus = first_pus[keep]
+        nb_pus = nb_pus[keep]
+        extra = [ ( i, blk_start, blk_size ) for i in multi for blk_start, blk_size in schedule.extra_resources[i] ]
+        if extra:
+            extra = np.array(extra, dtype=np.int64)
+            idx = np.concatenate((idx, extra[:,0]))
+            first_pus = np.concatenate((first_pus, extra[:,1]))
+            nb_pus = np.concatenate((nb_pus, extra[:,2]))
+
+    return idx, first_pus, nb_pus
+
+def validate_schedule(instance, schedule, tol=DEFAULT_TOLERANCE, max_reports=MAX_REPORTS):
+    """
+    Check schedule against instance (SchedulingInstance or input dict).
+    Returns a list of problems, empty if the schedule is valid.
+    """
+    instance = as_scheduling_instance(instance)
+    n = instance.get_nb_tasks()
+    m = instance.get_nb_cpu()
+    k = instance.get_nb_gpu()
+    core_id = schedule_common.Core.arch_id
+    gpu_id = schedule_common.GPU.arch_id
+
+    problems = []
+
+    task_ids   = schedule.get_column("task_ids")
+    device_ids = schedule.get_column("device_ids")
+    starts     = schedule.get_column("start_times")
+    ends       = schedule.get_column("end_times")
+    nbps       = schedule.get_column("nbps")
+
+    # each task exactly once
+    valid_id = (task_ids >= 1) & (task_ids <= n)
+    report(problems, ~valid_id, "unknown task id", task_ids, max_reports)
+    counts = np.bincount(task_ids[valid_id], minlength=n+1)[1:]
+    missing = np.flatnonzero(counts == 0) + 1
+    if len(missing) > 0:
+        report(problems, np.ones(len(missing), dtype=bool), "task not scheduled", missing, max_reports)
+    repeated = np.zeros(len(task_ids), dtype=bool)
+    repeated[valid_id] = counts[task_ids[valid_id] - 1] > 1
+    report(problems, repeated, "task scheduled more than once", task_ids, max_reports)
+
+    is_core = device_ids == core_id
+    is_gpu = device_ids == gpu_id
+    report(problems, ~(is_core | is_gpu), "unknown device", task_ids, max_reports)
+    report(problems, ~(starts >= 0.0) | ~(ends >= starts), "invalid start/end time", task_ids, max_reports)
+
+    # allotted PUs exist
+    core_idx, core_first, core_nb = expand_blocks(schedule, core_id)
+    gpu_idx, gpu_first, gpu_nb = expand_blocks(schedule, gpu_id)
+    bad_core = (core_first < 0) | (core_nb < 1) | (core_first + core_nb > m)
+    bad_gpu = (gpu_first < 0) | (gpu_nb != 1) | (gpu_first >= k)
+    report(problems, bad_core, "invalid cores", task_ids[core_idx], max_reports)
+    report(problems, bad_gpu, "invalid GPU", task_ids[gpu_idx], max_reports)
+
+    # durations, only for rects with a valid task id and PU count
+    expected = np.empty(len(task_ids))
+    expected.fill(np.nan)
+    sel = valid_id & is_core & (nbps >= 1) & (nbps <= m)
+    expected[sel] = instance.get_times_by_procs(task_ids[sel] - 1, nbps[sel])
+    sel = valid_id & is_gpu
+    expected[sel] = instance.gpudata[task_ids[sel] - 1]
+    checked = ~np.isnan(expected)
+    wrong = np.zeros(len(task_ids), dtype=bool)
+    wrong[checked] = ~is_close(ends[checked] - starts[checked], expected[checked], tol)
+    report(problems, wrong, "duration does not match instance", task_ids, max_reports)
+
+    # overlaps per PU
+    for name, idx, first, nb in [ ( "core", core_idx[~bad_core], core_first[~bad_core], core_nb[~bad_core] ),
+                                  ( "GPU", gpu_idx[~bad_gpu], gpu_first[~bad_gpu], gpu_nb[~bad_gpu] ) ]:
+        overlapping = check_overlaps(first, nb, starts[idx], ends[idx], task_ids[idx], tol)
+        if len(overlapping) > 0:
+            overlapping = np.unique(overlapping)
+            report(problems, np.ones(len(overlapping), dtype=bool), "overlap on %s" % ( name ), overlapping, max_reports)
+
+    return problems
+
+def check_schedule(instance, schedule, tol=DEFAULT_TOLERANCE, out=sys.stdout):
+    # prints the problems in the style of the sanity checks of the schedulers
+    problems = validate_schedule(instance, schedule, tol)
+    if problems:
+        print >> out, "ATTENTION ! INVALID SCHEDULE"
+        for problem in problems:
+            print >> out, "  ", problem
+    return len(problems) == 0
+
+
+if __name__ == "__main__":
+
+    import approx_common
+    import output_csv
+
+    parser = OptionParser( usage = "usage: %prog -i instance_file -c schedule.csv" )
+
+    parser.add_option( "-i", "--input",
+                       action  = "store",
+                       dest    = "ininst",
+                       type    = "string",
+                       help    = "file with input data" )
+
+    parser.add_option( "-c", "--csv",
+                       action  = "store",
+                       dest    = "csvfile",
+                       type    = "string",
+                       help    = "schedule in csv format (default columns)" )
+
+    parser.add_option( "-t", "--tolerance",
+                       action  = "store",
+                       dest    = "tol",
+                       type    = "float",
+                       default = 1e-5,
+                       help    = "relative tolerance (csv times are rounded)" )
+
+    ( options, args ) = parser.parse_args()
+
+    if options.ininst == None or options.csvfile == None:
+        parser.print_help()
+        sys.exit(1)
+
+    instance = approx_common.load_instance(options.ininst)
+    schedule = output_csv.read_csv_schedule(options.csvfile, instance.get_nb_cpu(), instance.get_nb_gpu())
+
+    if not check_schedule(instance, schedule, options.tol):
+        sys.exit(1)
+    print "schedule valid"
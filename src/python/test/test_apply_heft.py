@@ -0,0 +1,100 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import StringIO
+
+import approx_common
+import apply_heft
+
+from problem_generator import generate_instance
+from instance_common import SchedulingInstance
+from schedule_validation import check_schedule
+
+
+def make_peaked_instance(nb_tasks, nb_cpu, nb_gpu, seed, quantum=0.0):
+    # tasks get slower beyond their best number of cores, so fewer cores
+    # may finish first and gaps open with the insertion policy
+    rs = np.random.RandomState(seed)
+    seq_times = rs.uniform(1.0, 100.0, nb_tasks)
+    peak = rs.randint(1, nb_cpu+1, nb_tasks)
+    procs = np.arange(1, nb_cpu+1)
+    cpudata = seq_times[:,None] / np.minimum(procs[None,:], peak[:,None])
+    cpudata *= 1.0 + 0.05 * np.maximum(procs[None,:] - peak[:,None], 0)
+    gpudata = seq_times / rs.uniform(0.5, 20.0, nb_tasks)
+    if quantum > 0.0:
+        cpudata = np.ceil(cpudata / quantum) * quantum
+        gpudata = np.ceil(gpudata / quantum) * quantum
+    return SchedulingInstance(nb_tasks, nb_cpu, nb_gpu, cpudata, gpudata)
+
+def get_rects(schedule):
+    return [ (r.get_task_id(), r.get_device_id(), list(r.resources), r.get_start_time(), r.get_end_time())
+             for r in schedule.get_task_rects() ]
+
+
+class InsertionTest(unittest.TestCase):
+
+    def setUp(self):
+        approx_common.init_system()
+        self.stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def run_heft(self, instance, seq_only, prio, **kwargs):
+        sys.stdout = StringIO.StringIO()
+        schedule = apply_heft.build_heft_schedule(instance, seq_only, prio, None, **kwargs)
+        output = sys.stdout.getvalue()
+        sys.stdout = StringIO.StringIO()
+        # nothing is printed for a valid schedule
+        self.assertTrue(check_schedule(instance, schedule, out=sys.stdout), output)
+        self.assertEqual(sys.stdout.getvalue(), "")
+        return schedule, output
+
+    def test_insertion_valid(self):
+        nb_gap_fills = 0
+        for seed in xrange(0, 12):
+            for prio in [ "lpt", "spt", "ratio" ]:
+                instance = make_peaked_instance(60, [ 2, 5, 16 ][seed % 3], seed % 4, seed, (seed % 2) * 1.0)
+                schedule, output = self.run_heft(instance, False, prio, insertion=True)
+                self.assertTrue("insertion: 1" in output)
+                nb_gap_fills += int(output.split("gap_fills: ")[1].split()[0])
+        # the gaps are used
+        self.assertTrue(nb_gap_fills > 0)
+
+    def test_seq_only_same_as_append(self):
+        # with one core per task no gap opens
+        instances = [ generate_instance(40, 8, 2, 1), make_peaked_instance(40, 6, 2, 2),
+                      make_peaked_instance(40, 6, 3, 3, 1.0) ]
+        for instance in instances:
+            for prio in [ "lpt", "spt", "ratio" ]:
+                appended, output = self.run_heft(instance, True, prio)
+                inserted, output = self.run_heft(instance, True, prio, insertion=True)
+                self.assertEqual(get_rects(inserted), get_rects(appended))
+                self.assertTrue("gap_fills: 0" in output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import StringIO
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import approx2
+
+from problem_generator import generate_instance
+from instance_common import as_scheduling_instance
+
+
+class JuliaQueue:
+    # Collections.PriorityQueue of Julia 0.4 (binary heap, 1-based)
+
+    def __init__(self, nb_pus):
+        self.xs = []
+        for pid in xrange(0, nb_pus):
+            self.push([ 0.0, pid ])
+
+    def push(self, item):
+        xs = self.xs
+        xs.append(item)
+        i = len(xs)
+        while i > 1 and item[0] < xs[i//2 - 1][0]:
+            xs[i-1] = xs[i//2 - 1]
+            i = i // 2
+        xs[i-1] = item
+
+    def pop(self):
+        xs = self.xs
+        top = xs[0]
+        item = xs.pop()
+        n = len(xs)
+        if n > 0:
+            i = 1
+            while 2*i <= n:
+                child = 2*i
+                if child + 1 <= n and not xs[child-1][0] < xs[child][0]:
+                    child += 1
+                if not xs[child-1][0] < item[0]:
+                    break
+                xs[i-1] = xs[child-1]
+                i = child
+            xs[i-1] = item
+        return top
+
+
+def julia_schedule(instance, lambval):
+    """
+    Rects (task id, device, blocks, start, end) of one probe of
+    solve_problem_2approx in approx2.jl, task by task; None if lambval
+    is infeasible.
+    """
+    n, m, k = instance.n, instance.m, instance.k
+    cpudata, gpudata = instance.cpudata, instance.gpudata
+
+    def gamma(i):
+        for p in xrange(0, m):
+            if cpudata[i,p] <= lambval:
+                return p + 1
+        return m + 1
+
+    cpu_lst, gpu_lst, hybrid_lst = [], [], []
+    for i in xrange(0, n):
+        if gpudata[i] > lambval and gamma(i) > m:
+            return None
+        elif gpudata[i] > lambval:
+            cpu_lst.append(i)
+        elif gamma(i) > m:
+            gpu_lst.append(i)
+        else:
+            hybrid_lst.append(i)
+
+    # sort in Julia is stable as well
+    gpu_lst.sort(key=lambda i: gpudata[i])
+    hybrid_lst.sort(key=lambda i: cpudata[i,gamma(i)-1] / gpudata[i])
+
+    rects = []
+    gpu_queue = JuliaQueue(k)
+    gpu_work = 0.0
+    for lst in [ gpu_lst, hybrid_lst ]:
+        while len(lst) > 0 and k > 0 and gpu_work <= lambval * k:
+            i = lst.pop()
+            gpu = gpu_queue.pop()
+            start = gpu[0]
+            gpu[0] += gpudata[i]
+            gpu_work += gpudata[i]
+            rects.append( (i+1, 1, [ (gpu[1], 1) ], start, gpu[0]) )
+            gpu_queue.push(gpu)
+        if len(gpu_lst) > 0:
+            return None
+
+    core_queue = JuliaQueue(m)
+    cpu_lst = sorted(cpu_lst + hybrid_lst, key=gamma)
+    while len(cpu_lst) > 0:
+        i = cpu_lst.pop()
+        cores = [ core_queue.pop() for p in xrange(0, gamma(i)) ]
+        start = cores[-1][0]
+        end = start + cpudata[i,gamma(i)-1]
+        if end > 2 * lambval:
+            return None
+        for core in cores:
+            core[0] = end
+            core_queue.push(core)
+        blocks = []
+        for pid in sorted([ core[1] for core in cores ]):
+            if len(blocks) > 0 and blocks[-1][0] + blocks[-1][1] == pid:
+                blocks[-1] = (blocks[-1][0], blocks[-1][1] + 1)
+            else:
+                blocks.append( (pid, 1) )
+        rects.append( (i+1, 0, blocks, start, end) )
+
+    return rects
+
+def get_rects(schedule):
+    return [ (r.get_task_id(), r.get_device_id(), list(r.resources), r.get_start_time(), r.get_end_time())
+             for r in schedule.get_task_rects() ]
+
+
+class Approx2Test(unittest.TestCase):
+
+    def check_instance(self, instance):
+        upper = instance.get_seq_times().sum()
+        for lambval in np.linspace(0.05, 1.0, 40) * upper:
+            expected = julia_schedule(instance, lambval)
+            schedule = approx2.build_2approx_schedule(instance, lambval)
+            self.assertEqual(approx2.is_feasible(instance, lambval), expected != None)
+            if expected == None:
+                self.assertEqual(schedule, None)
+            else:
+                self.assertEqual(get_rects(schedule), expected)
+
+    def test_generated_instances(self):
+        seed = 0
+        for n in [ 3, 10, 25 ]:
+            for m, k in [ (1, 1), (4, 2), (6, 0), (8, 3) ]:
+                seed += 1
+                for parametric in [ False, True ]:
+                    self.check_instance(generate_instance(n, m, k, seed, parametric=parametric))
+
+    def test_equal_times(self):
+        # all PUs tie all the time, the PU order of the Julia queue matters
+        instance = as_scheduling_instance({
+            "meta"    : { "n" : 7, "m" : 5, "k" : 3 },
+            "cpudata" : dict([ ("t%d" % i, [ 4.0, 2.0, 2.0, 1.0, 1.0 ]) for i in xrange(1, 8) ]),
+            "gpudata" : dict([ ("t%d" % i, 2.0 + (i % 2)) for i in xrange(1, 8) ])
+        })
+        self.check_instance(instance)
+
+    def test_stats_of_approx2_jl(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            schedule = approx2.solve_problem_2approx(generate_instance(10, 4, 2, 1))
+        finally:
+            sys.stdout = stdout
+        # the bound is kept, but not printed with the stats
+        self.assertEqual(sorted(approx2.stats.keys()), [ "mean_solve_time", "nb_of_iterations", "total_solve_time" ])
+        self.assertTrue(0.0 < approx2.lower_bound <= schedule.get_makespan())
+
+    def test_parametric_without_table(self):
+        instance = generate_instance(30, 8, 2, 3, parametric=True)
+        self.assertRaises(NotImplementedError, instance.get_cpu_envelope)
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            approx2.solve_problem_2approx(instance)
+        finally:
+            sys.stdout = stdout
+        # gamma(j, h) and the times are closed-form, the table is never built
+        self.assertFalse("cpudata" in instance.__dict__)
+
+
+if __name__ == "__main__":
+    unittest.main()
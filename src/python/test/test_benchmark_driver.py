@@ -0,0 +1,70 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import StringIO
+
+import benchmark_driver
+
+INSTANCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..",
+                             "examples", "test1", "instances", "problem_n10_m16_k1_i0.in.bz2")
+
+
+def fail(instance):
+    raise RuntimeError("does nowhere fit")
+
+
+class RunInstanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        benchmark_driver.register_algorithm("fail", fail)
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+        del benchmark_driver.algorithms["fail"]
+        shutil.rmtree(self.outdir)
+
+    def test_failed_run_gets_na_row(self):
+        job = ( INSTANCE_FILE, [ "fail", "heft_lpt_0" ], self.outdir, True, True )
+        rows = benchmark_driver.run_instance(job)
+        self.assertEqual(len(rows), 2)
+
+        name = "problem_n10_m16_k1_i0"
+        self.assertEqual(rows[0], [ name, "fail", 10, 16, 1, None, None, None ])
+        self.assertIn("%s fail failed: RuntimeError: does nowhere fit" % ( name ), sys.stderr.getvalue())
+
+        # the next algorithm still runs and writes its files
+        self.assertEqual(rows[1][:5], [ name, "heft_lpt_0", 10, 16, 1 ])
+        self.assertTrue(rows[1][5] > 0.0)
+        for ext in [ "jed", "csv" ]:
+            self.assertTrue(os.path.exists(os.path.join(self.outdir, "%s_heft_lpt_0.%s" % ( name, ext ))))
+        self.assertNotIn("invalid schedule", sys.stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
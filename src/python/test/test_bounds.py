@@ -0,0 +1,89 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import approx_common
+import bounds
+
+from instance_common import SchedulingInstance
+from problem_generator import generate_instance
+
+
+def make_instance(nb_cpu, nb_gpu, seq_times, gpu_times):
+    # perfectly parallel tasks
+    seq_times = np.array(seq_times, dtype=np.float64)
+    cpudata = seq_times[:,None] / np.arange(1, nb_cpu+1, dtype=np.float64)[None,:]
+    return SchedulingInstance(len(seq_times), nb_cpu, nb_gpu, cpudata, np.array(gpu_times, dtype=np.float64))
+
+
+class BoundsTest(unittest.TestCase):
+
+    def test_area(self):
+        # three tasks of area 4 on one core and one GPU: OPT is 8
+        instance = make_instance(1, 1, [ 4.0, 4.0, 4.0 ], [ 4.0, 4.0, 4.0 ])
+        self.assertTrue(bounds.is_area_infeasible(instance, 5.0))
+        self.assertFalse(bounds.is_area_infeasible(instance, 8.0))
+
+    def test_split_cpu_work(self):
+        # both tasks fit only on the core, the area bound cannot tell
+        instance = make_instance(1, 1, [ 4.0, 4.0 ], [ 100.0, 100.0 ])
+        self.assertFalse(bounds.is_area_infeasible(instance, 5.0))
+        self.assertTrue(bounds.is_split_infeasible(instance, 5.0))
+        self.assertTrue(bounds.is_split_infeasible(instance, 7.9))
+        self.assertFalse(bounds.is_split_infeasible(instance, 8.0))
+
+    def test_split_set6(self):
+        # both tasks fit only in set 6, but there is one GPU
+        instance = make_instance(1, 1, [ 100.0, 100.0 ], [ 3.0, 3.0 ])
+        self.assertFalse(bounds.is_area_infeasible(instance, 5.0))
+        self.assertTrue(bounds.is_split_infeasible(instance, 5.0))
+        self.assertFalse(bounds.is_split_infeasible(instance, 6.0))
+
+    def test_feasible_at_heft_makespan(self):
+        # the MIP is feasible for lambda >= OPT, so is any relaxation
+        for seed in xrange(0, 20):
+            instance = generate_instance(30, [ 1, 4, 16 ][seed % 3], seed % 3 + 1, seed)
+            heft = bounds.get_heft_upper_bound(instance)
+            self.assertFalse(bounds.is_area_infeasible(instance, heft))
+            self.assertFalse(bounds.is_split_infeasible(instance, heft))
+            lower, upper = bounds.get_lambda_bounds(instance)
+            self.assertTrue(bounds.get_base_lower_bound(instance) <= lower <= upper <= heft)
+
+    def test_nb_bisect_probes(self):
+        cutoff = approx_common.cutoff_ratio
+        self.assertEqual(bounds.get_nb_bisect_probes(1.0, cutoff), 0)
+        self.assertEqual(bounds.get_nb_bisect_probes(1.0, 2.0), 7)
+        rs = np.random.RandomState(1)
+        for lower, factor in zip(rs.uniform(0.1, 1000.0, 200), rs.uniform(1.0, 1000.0, 200)):
+            upper = lower * factor
+            # every probe feasible: only upper moves
+            nb_probes = 0
+            while upper / lower > cutoff:
+                upper = lower + (upper-lower)/2.0
+                nb_probes += 1
+            self.assertEqual(bounds.get_nb_bisect_probes(lower, lower * factor), nb_probes)
+
+
+if __name__ == "__main__":
+    unittest.main()
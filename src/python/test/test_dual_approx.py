@@ -0,0 +1,76 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import approx_common
+
+from mip_solver import Probe
+from instance_common import SchedulingInstance
+from dual_approx import find_lambda_by_ksection_search, stats
+
+
+class FakePool:
+    # answers every probe at once with feasible(lambval)
+
+    def __init__(self, feasible):
+        self.feasible = feasible
+        self.probed = []
+
+    def submit(self, instance, lambval, callback):
+        self.probed.append(lambval)
+        has_solution = self.feasible(lambval)
+        callback({ "lambda" : lambval, "has_solution" : has_solution,
+                   "solution" : { "lambda" : lambval } if has_solution else None,
+                   "cancelled" : False, "cached" : False, "stats" : {}, "solve_time" : 0.0 })
+        return Probe(lambval)
+
+
+def make_instance():
+    return SchedulingInstance(1, 1, 0, np.ones((1, 1)), np.ones(1))
+
+
+class KsectionSearchTest(unittest.TestCase):
+
+    def test_monotone(self):
+        pool = FakePool(lambda lambval: lambval >= 10.0)
+        lambval, solution = find_lambda_by_ksection_search(make_instance(), 1.0, 100.0, pool, 3)
+        self.assertTrue(lambval >= 10.0)
+        self.assertTrue(lambval / stats["lower_bound"] <= approx_common.cutoff_ratio)
+        self.assertEqual(solution["lambda"], lambval)
+        self.assertEqual(stats["nb_non_monotone"], 0)
+
+    def test_non_monotone(self):
+        # the first round probes 25.75, 50.5 and 75.25, the infeasible
+        # 50.5 comes after the feasible 25.75
+        pool = FakePool(lambda lambval: lambval >= 10.0 and not (40.0 <= lambval < 60.0))
+        lambval, solution = find_lambda_by_ksection_search(make_instance(), 1.0, 100.0, pool, 3)
+        self.assertEqual(pool.probed[:3], [ 25.75, 50.5, 75.25 ])
+        self.assertTrue(stats["nb_non_monotone"] >= 1)
+        self.assertTrue(10.0 <= lambval <= 25.75)
+        self.assertTrue(stats["lower_bound"] < lambval)
+        self.assertTrue(lambval / stats["lower_bound"] <= approx_common.cutoff_ratio)
+
+
+if __name__ == "__main__":
+    unittest.main()
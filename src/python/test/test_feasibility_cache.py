@@ -0,0 +1,101 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from feasibility_cache import FeasibilityCache, get_instance_hash
+from problem_generator import generate_instance
+
+SOLUTION = { "work" : 12.5, "task_hash" : { "1" : "3", "2" : "7", "3" : "1" } }
+
+
+class FeasibilityCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmpdir, "probes.db")
+        self.cache = FeasibilityCache(self.fname)
+        self.ihash = get_instance_hash(generate_instance(3, 2, 1, 1))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_exact(self):
+        self.assertEqual(self.cache.lookup(self.ihash, 10.0), None)
+        self.cache.store(self.ihash, 10.0, 3, True, SOLUTION)
+        self.cache.store(self.ihash, 5.0, 3, False, None)
+
+        result = self.cache.lookup(self.ihash, 10.0, need_solution=True)
+        self.assertTrue(result["has_solution"])
+        self.assertEqual(result["solution"], SOLUTION)
+        self.assertEqual(self.cache.lookup(self.ihash, 5.0), { "has_solution" : False, "solution" : None })
+        # lambda is rounded to LAMBDA_DIGITS digits
+        self.assertEqual(self.cache.lookup(self.ihash, 10.0 + 1e-12)["solution"], SOLUTION)
+        # other instances are not answered
+        self.assertEqual(self.cache.lookup("0" * 40, 10.0), None)
+
+    def test_monotone(self):
+        self.cache.store(self.ihash, 10.0, 3, True, SOLUTION)
+        self.cache.store(self.ihash, 5.0, 3, False, None)
+
+        self.assertEqual(self.cache.lookup(self.ihash, 20.0), { "has_solution" : True, "solution" : None })
+        self.assertEqual(self.cache.lookup(self.ihash, 2.0), { "has_solution" : False, "solution" : None })
+        # between the limits the solver has to decide
+        self.assertEqual(self.cache.lookup(self.ihash, 7.0), None)
+
+        # a feasible answer without solution is no use with need_solution
+        self.assertEqual(self.cache.lookup(self.ihash, 20.0, need_solution=True), None)
+        self.assertEqual(self.cache.lookup(self.ihash, 2.0, need_solution=True)["has_solution"], False)
+
+    def test_not_monotone(self):
+        # infeasible above a feasible lambda: the limits contradict
+        self.cache.store(self.ihash, 5.0, 3, True, SOLUTION)
+        self.cache.store(self.ihash, 10.0, 3, False, None)
+        self.assertEqual(self.cache.lookup(self.ihash, 7.0), None)
+        self.assertEqual(self.cache.lookup(self.ihash, 20.0), { "has_solution" : True, "solution" : None })
+
+    def test_reopen(self):
+        self.cache.store(self.ihash, 10.0, 3, True, SOLUTION)
+        self.cache.store(self.ihash, 5.0, 3, False, None)
+        self.cache.close()
+
+        self.cache = FeasibilityCache(self.fname)
+        self.assertEqual(self.cache.lookup(self.ihash, 10.0)["solution"], SOLUTION)
+        self.assertEqual(self.cache.lookup(self.ihash, 20.0)["has_solution"], True)
+        self.assertEqual(self.cache.lookup(self.ihash, 2.0)["has_solution"], False)
+        self.assertEqual(self.cache.lookup(self.ihash, 7.0), None)
+
+    def test_lru(self):
+        # exact entries evicted from the LRU front come from the database
+        self.cache.close()
+        self.cache = FeasibilityCache(self.fname, lru_size=2)
+        for i in xrange(1, 6):
+            self.cache.store(self.ihash, float(i), 3, True, SOLUTION)
+        self.assertEqual(len(self.cache.lru), 2)
+        self.assertEqual(self.cache.lookup(self.ihash, 1.0, need_solution=True)["solution"], SOLUTION)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bounds import get_base_lower_bound, get_base_upper_bound
+from mip_model import FeasibilityModel, ModelWriter
+from problem_generator import generate_instance
+
+
+def read_file(fname):
+    fh = open(fname, "rb")
+    content = fh.read()
+    fh.close()
+    return content
+
+
+class ModelWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_incremental_same_as_fresh(self):
+        # probes in the order of a bisection and in random order, the
+        # writer rebuilds only the tasks whose signature changed
+        fresh_fname = os.path.join(self.tmpdir, "fresh.mps")
+        inc_fname = os.path.join(self.tmpdir, "inc.mps")
+        nb_probes = 0
+        nb_unchanged = 0
+        for seed, ( n, m, k ) in enumerate([ (30, 8, 2), (50, 16, 4), (20, 3, 1) ]):
+            instance = generate_instance(n, m, k, seed)
+            lower = get_base_lower_bound(instance)
+            upper = get_base_upper_bound(instance)
+            lambdas = []
+            lo, hi = lower, upper
+            for _ in xrange(15):
+                mid = lo + (hi-lo)/2.0
+                lambdas.append(mid)
+                if seed % 2 == 0:
+                    hi = mid
+                else:
+                    lo = mid
+            lambdas += np.random.RandomState(seed).uniform(lower, upper / 4.0, 20).tolist()
+            lambdas.append(lambdas[-1])
+
+            writer = ModelWriter(instance)
+            for lambval in lambdas:
+                model = FeasibilityModel(instance, lambval)
+                model.write_mps(fresh_fname)
+                nb_changed = writer.write(model, inc_fname)
+                self.assertEqual(read_file(inc_fname), read_file(fresh_fname), "lambda %r" % ( lambval ))
+                nb_probes += 1
+                nb_unchanged += n - nb_changed
+            # the same lambda twice changes nothing
+            self.assertEqual(nb_changed, 0)
+        self.assertEqual(nb_probes, 108)
+        self.assertTrue(nb_unchanged > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mip_solver import MipSolver, GlpsolSolver, SymphonySolver, SolverPool, OPTIMAL, INFEASIBLE, UNKNOWN
+from feasibility_cache import FeasibilityCache, get_instance_hash
+from problem_generator import generate_instance
+from bounds import get_base_upper_bound
+
+
+class FakeSolver(MipSolver):
+    # every run ends with outcome and no task in any set
+
+    name = "fake"
+
+    def __init__(self, outcome):
+        MipSolver.__init__(self, None)
+        self.outcome = outcome
+        self.nb_runs = 0
+
+    def run(self, model, workdir, probe=None):
+        self.nb_runs += 1
+        return self.outcome, 0.0, {}
+
+
+class SolverOutcomeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_glpsol_status(self):
+        sol_fname = os.path.join(self.tmpdir, "model.sol")
+        solver = GlpsolSolver("glpsol")
+        self.assertEqual(solver.read_solution(None, "", sol_fname)[0], UNKNOWN)
+        for status, outcome in [ ("o", OPTIMAL), ("n", INFEASIBLE), ("f", UNKNOWN), ("u", UNKNOWN) ]:
+            fh = open(sol_fname, "w")
+            fh.write("c model\ns mip 10 5 %s 3.5\ne o f\n" % ( status ))
+            fh.close()
+            self.assertEqual(solver.read_solution(None, "", sol_fname)[0], outcome)
+        # older glpk
+        for status, outcome in [ (5, OPTIMAL), (4, INFEASIBLE), (2, UNKNOWN), (1, UNKNOWN) ]:
+            fh = open(sol_fname, "w")
+            fh.write("0 0\n%d 3.5\n" % ( status ))
+            fh.close()
+            self.assertEqual(solver.read_solution(None, "", sol_fname)[0], outcome)
+
+    def test_symphony_status(self):
+        solver = SymphonySolver("symphony")
+        output = "* Optimal Solution Found *\nSolution Cost: 3.5\nColumn names and values of nonzeros in the solution\n" \
+                 "+----+\nx1_3 1.000\n\n"
+        self.assertEqual(solver.read_solution(None, output, None), (OPTIMAL, 3.5, { "x1_3" : 1.0 }))
+        self.assertEqual(solver.read_solution(None, "* Problem Infeasible *\n", None)[0], INFEASIBLE)
+        self.assertEqual(solver.read_solution(None, "* Time Limit Reached *\n", None)[0], UNKNOWN)
+
+
+class SolverPoolCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = FeasibilityCache(os.path.join(self.tmpdir, "probes.db"))
+        self.instance = generate_instance(10, 4, 1, 1)
+        self.ihash = get_instance_hash(self.instance)
+        # the pre-check passes, the solver decides
+        self.lambval = get_base_upper_bound(self.instance)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmpdir)
+
+    def solve(self, outcome, lambval):
+        pool = SolverPool(FakeSolver(outcome), cache=self.cache)
+        try:
+            return pool.solve(self.instance, lambval)
+        finally:
+            pool.close()
+
+    def test_unknown_not_stored(self):
+        ret = self.solve(UNKNOWN, self.lambval)
+        self.assertFalse(ret["has_solution"])
+        self.assertEqual(self.cache.lookup(self.ihash, self.lambval), None)
+        # smaller lambdas are not infeasible because of it
+        self.assertEqual(self.cache.lookup(self.ihash, self.lambval / 2), None)
+
+    def test_proven_stored(self):
+        ret = self.solve(INFEASIBLE, self.lambval / 2)
+        self.assertFalse(ret["has_solution"])
+        self.assertEqual(self.cache.lookup(self.ihash, self.lambval / 4)["has_solution"], False)
+
+        ret = self.solve(OPTIMAL, self.lambval)
+        self.assertTrue(ret["has_solution"])
+        self.assertTrue(self.cache.lookup(self.ihash, self.lambval, need_solution=True)["has_solution"])
+        self.assertTrue(self.solve(UNKNOWN, self.lambval)["cached"])
+
+
+if __name__ == "__main__":
+    unittest.main()
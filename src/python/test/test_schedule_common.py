@@ -0,0 +1,189 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import random
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from schedule_common import Core, GPU, PUQueue, FreeIntervals, PUIntervals, MoldSchedule, TaskRect
+
+
+def make_cores(lasttimes):
+    cores = [ Core(i) for i in xrange(0, len(lasttimes)) ]
+    for core, lasttime in zip(cores, lasttimes):
+        core.set_lasttime(lasttime)
+    return cores
+
+
+class PUQueueTest(unittest.TestCase):
+
+    def test_pop_lowest_pid_first(self):
+        queue = PUQueue(make_cores([ 0.0 ] * 5))
+        pids = [ queue.pop(1.0)[1].get_pid() for i in xrange(0, 5) ]
+        self.assertEqual(pids, [ 0, 1, 2, 3, 4 ])
+
+    def test_pop_earliest_finish(self):
+        queue = PUQueue(make_cores([ 3.0, 1.0, 2.0 ]))
+        eft, core = queue.pop(2.0)
+        self.assertEqual(( eft, core.get_pid() ), ( 3.0, 1 ))
+
+    def test_pop_equal_eft_from_different_lasttimes(self):
+        # 1.0 + 1e-17 == 1.0, so cores 1 and 2 tie and core 1 wins
+        queue = PUQueue(make_cores([ 1.0, 1e-17, 0.0 ]))
+        eft, core = queue.pop(1.0)
+        self.assertEqual(( eft, core.get_pid() ), ( 1.0, 1 ))
+
+    def test_pop_within_bound_ties(self):
+        queue = PUQueue(make_cores([ 2.0, 1.0, 1.0, 1.0 ]))
+        # an eft equal to the bound is accepted
+        self.assertEqual(queue.pop_within_bound(1.0, 2.0).get_pid(), 1)
+        self.assertEqual(queue.pop_within_bound(1.0, 2.0).get_pid(), 2)
+        self.assertEqual(queue.pop_within_bound(1.0, 2.0).get_pid(), 3)
+        self.assertEqual(len(queue), 1)
+
+    def test_pop_within_bound_equal_eft_from_different_lasttimes(self):
+        queue = PUQueue(make_cores([ 0.0, 1e-17, 5.0 ]))
+        core = queue.pop_within_bound(1.0, 1.0)
+        self.assertEqual(core.get_pid(), 0)
+        core.set_lasttime(1.0)
+        queue.push(core)
+        self.assertEqual(queue.pop_within_bound(1.0, 1.0).get_pid(), 1)
+
+    def test_pop_within_bound_keeps_pu(self):
+        queue = PUQueue(make_cores([ 2.0, 3.0 ]))
+        self.assertEqual(queue.pop_within_bound(1.0, 2.5), None)
+        self.assertEqual(len(queue), 2)
+        # the PU that was not taken is still the first one
+        self.assertEqual(queue.pop(1.0)[1].get_pid(), 0)
+
+    def test_pop_within_bound_empty(self):
+        self.assertEqual(PUQueue([]).pop_within_bound(1.0, 10.0), None)
+
+
+class FreeIntervalsTest(unittest.TestCase):
+
+    def test_against_scan(self):
+        # gaps as [start, end, pid], the earliest one that fits by scan
+        rand = random.Random(1)
+        for trial in xrange(0, 200):
+            min_length = rand.choice([ 0.0, 0.5 ])
+            intervals = FreeIntervals(min_length)
+            gaps = []
+            for op in xrange(0, rand.randint(1, 100)):
+                if rand.random() < 0.5:
+                    # coarse times, so that starts tie between pids
+                    start = rand.randint(0, 20) / 2.0
+                    end = start + rand.randint(1, 8) / 4.0
+                    pid = rand.randint(0, 5)
+                    if any([ g[2] == pid and g[0] < end and start < g[1] for g in gaps ]):
+                        continue
+                    intervals.add(start, end, pid)
+                    if end - start >= min_length:
+                        gaps.append([ start, end, pid ])
+                else:
+                    duration = rand.randint(1, 8) / 4.0
+                    fitting = [ g for g in gaps if g[1] - g[0] >= duration ]
+                    gap = intervals.find(duration)
+                    if len(fitting) == 0:
+                        self.assertEqual(gap, None)
+                        continue
+                    expected = min(fitting, key=lambda g: ( g[0], g[2] ))
+                    self.assertEqual([ gap.start, gap.end, gap.pid ], expected)
+                    self.assertEqual(intervals.fill(gap, duration), expected[0])
+                    expected[0] += duration
+                    if expected[1] - expected[0] <= 0.0 or expected[1] - expected[0] < min_length:
+                        gaps.remove(expected)
+                self.assertEqual(len(intervals), len(gaps))
+
+
+class PUIntervalsTest(unittest.TestCase):
+
+    def test_earliest_append_lowest_pid(self):
+        index = PUIntervals(5)
+        index.append([ 0, 1 ], 0.0, 2.0)
+        self.assertEqual(index.earliest_finish(1.0), ( 1.0, 2, None ))
+        # 1.0 + 1e-17 == 1.0, pid 2 wins over pid 3
+        index.append([ 2 ], 1e-17, 1e-17)
+        index.append([ 4 ], 0.0, 5.0)
+        self.assertEqual(index.earliest_finish(1.0)[:2], ( 1.0, 2 ))
+
+    def test_gap_wins_ties(self):
+        index = PUIntervals(2)
+        index.append([ 0 ], 0.0, 1.0)
+        # gap [0, 2) on pid 1
+        index.append([ 1 ], 2.0, 3.0)
+        eft, pid, gap = index.earliest_finish(1.0)
+        self.assertEqual(( eft, pid, gap.start, gap.end ), ( 1.0, 1, 0.0, 2.0 ))
+        self.assertEqual(index.fill_gap(gap, 1.0), 0.0)
+        # the rest of the gap [1, 2) ties with pid 0 at 1.0
+        eft, pid, gap = index.earliest_finish(1.0)
+        self.assertEqual(( eft, pid, gap.start ), ( 2.0, 1, 1.0 ))
+        self.assertEqual(index.fill_gap(gap, 1.0), 1.0)
+        self.assertEqual(len(index.gaps), 0)
+        self.assertEqual(index.earliest_finish(1.0), ( 2.0, 0, None ))
+
+    def test_short_gaps_are_dropped(self):
+        index = PUIntervals(2, 1.0)
+        index.append([ 0 ], 0.5, 1.0)
+        index.append([ 1 ], 1.0, 2.0)
+        self.assertEqual(len(index.gaps), 1)
+        self.assertEqual(index.earliest_finish(1.0)[2].pid, 1)
+
+    def test_order(self):
+        rand = random.Random(2)
+        index = PUIntervals(9)
+        for i in xrange(0, 200):
+            order = index.get_order()
+            pids = order[:rand.randint(1, 4)].tolist()
+            start = float(index.lasttimes[pids].max())
+            index.append(pids, start, start + rand.randint(0, 3))
+            expected = np.lexsort((np.arange(9), index.lasttimes))
+            self.assertEqual(index.get_order().tolist(), expected.tolist())
+
+
+class TaskRectListTest(unittest.TestCase):
+
+    def make_schedule(self):
+        schedule = MoldSchedule(4, 1)
+        for task_id in xrange(1, 6):
+            task_rect = TaskRect(task_id, Core.arch_id if task_id % 2 else GPU.arch_id, 0)
+            task_rect.set_procs([ (0, 1) ])
+            task_rect.set_times(float(task_id), float(task_id+1))
+            schedule.add_task_rect(task_rect)
+        return schedule
+
+    def test_index(self):
+        task_rects = self.make_schedule().get_task_rects()
+        self.assertEqual(task_rects[0].get_task_id(), 1)
+        self.assertEqual(task_rects[-1].get_task_id(), 5)
+        self.assertRaises(IndexError, task_rects.__getitem__, 5)
+        self.assertRaises(IndexError, task_rects.__getitem__, -6)
+
+    def test_slice(self):
+        task_rects = self.make_schedule().get_task_rects()
+        for sl in [ slice(1, 3), slice(None, None, -1), slice(-2, None), slice(3, 1), slice(0, 10, 2) ]:
+            self.assertEqual([ r.get_task_id() for r in task_rects[sl] ], range(1, 6)[sl])
+        self.assertEqual(task_rects[1:3][1].get_start_time(), 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+# SCHEDULING INDEPENDENT MOLDABLE TASKS ON MULTI-CORES WITH GPUS
+# Copyright (C) 2014 Sascha Hunold <sascha@hunoldscience.net>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# run from src/python: python -m unittest discover -s test
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from schedule_common import Core, GPU, MoldSchedule, TaskRect
+from instance_common import SchedulingInstance
+from schedule_validation import validate_schedule, check_overlaps
+
+
+def make_instance():
+    # 4 tasks, 4 cores, 2 GPUs, time on p cores = seq / p
+    seq_times = np.array([ 4.0, 8.0, 2.0, 6.0 ])
+    cpudata = seq_times[:,None] / np.arange(1, 5, dtype=np.float64)[None,:]
+    gpudata = np.array([ 1.0, 2.0, 3.0, 1.5 ])
+    return SchedulingInstance(4, 4, 2, cpudata, gpudata)
+
+def add_rect(schedule, task_id, arch, resources, start, end):
+    task_rect = TaskRect(task_id, arch.arch_id, 0)
+    task_rect.set_procs(resources)
+    task_rect.set_times(start, end)
+    schedule.add_task_rect(task_rect)
+
+def has_overlap(firsts, nbs, starts, ends):
+    # pairwise check on PU ranges and times
+    for a in xrange(len(firsts)):
+        for b in xrange(a+1, len(firsts)):
+            if firsts[a] < firsts[b] + nbs[b] and firsts[b] < firsts[a] + nbs[a] and \
+               starts[a] < ends[b] and starts[b] < ends[a]:
+                return True
+    return False
+
+def make_valid_schedule():
+    # task 2 on cores 0-3, then task 1 on cores 0-1 next to task 3 on
+    # core 2 and core 3, task 4 on GPU 1
+    schedule = MoldSchedule(4, 2)
+    add_rect(schedule, 2, Core, [ (0, 4) ], 0.0, 2.0)
+    add_rect(schedule, 1, Core, [ (0, 2) ], 2.0, 4.0)
+    add_rect(schedule, 3, Core, [ (2, 1), (3, 1) ], 2.0, 3.0)
+    add_rect(schedule, 4, GPU, [ (1, 1) ], 0.0, 1.5)
+    return schedule
+
+
+class ValidateScheduleTest(unittest.TestCase):
+
+    def assertProblem(self, problems, msg):
+        self.assertEqual(len(problems), 1, problems)
+        self.assertTrue(problems[0].startswith(msg), problems)
+
+    def test_valid(self):
+        self.assertEqual(validate_schedule(make_instance(), make_valid_schedule()), [])
+
+    def test_overlap_on_core(self):
+        schedule = make_valid_schedule()
+        # task 3 starts on cores 2 and 3 while task 2 still runs there
+        schedule.get_task_rects()[2].set_times(1.0, 2.0)
+        self.assertProblem(validate_schedule(make_instance(), schedule), "overlap on core: 1 (task 3)")
+
+    def test_overlap_on_gpu(self):
+        schedule = MoldSchedule(4, 2)
+        add_rect(schedule, 2, Core, [ (0, 4) ], 0.0, 2.0)
+        add_rect(schedule, 1, Core, [ (0, 2) ], 2.0, 4.0)
+        add_rect(schedule, 4, GPU, [ (1, 1) ], 0.0, 1.5)
+        add_rect(schedule, 3, GPU, [ (1, 1) ], 1.0, 4.0)
+        self.assertProblem(validate_schedule(make_instance(), schedule), "overlap on GPU: 1 (task 3)")
+
+    def test_touching_rects_do_not_overlap(self):
+        schedule = MoldSchedule(4, 2)
+        add_rect(schedule, 1, GPU, [ (0, 1) ], 0.0, 1.0)
+        add_rect(schedule, 2, GPU, [ (0, 1) ], 1.0, 3.0)
+        add_rect(schedule, 3, GPU, [ (0, 1) ], 3.0, 6.0)
+        add_rect(schedule, 4, GPU, [ (0, 1) ], 6.0, 7.5)
+        self.assertEqual(validate_schedule(make_instance(), schedule), [])
+
+    def test_overlap_inside_a_wide_block(self):
+        schedule = MoldSchedule(4, 2)
+        add_rect(schedule, 3, Core, [ (0, 1) ], 0.0, 2.0)
+        add_rect(schedule, 4, Core, [ (3, 1) ], 0.0, 6.0)
+        # cores 1 and 2 are free next to tasks 3 and 4
+        add_rect(schedule, 1, Core, [ (1, 2) ], 0.5, 2.5)
+        # task 2 needs all cores, core 3 is still busy with task 4
+        add_rect(schedule, 2, Core, [ (0, 4) ], 2.5, 4.5)
+        problems = validate_schedule(make_instance(), schedule)
+        self.assertEqual(problems, [ "overlap on core: 1 (task 2)" ])
+
+    def test_overlaps_of_random_blocks(self):
+        rs = np.random.RandomState(7)
+        nb_invalid = 0
+        for _ in xrange(300):
+            nb_blocks = rs.randint(2, 8)
+            m = 6
+            firsts = rs.randint(0, m, nb_blocks)
+            nbs = np.minimum(rs.randint(1, 4, nb_blocks), m - firsts)
+            starts = rs.randint(0, 10, nb_blocks).astype(np.float64)
+            ends = starts + rs.randint(1, 4, nb_blocks)
+            task_ids = np.arange(1, nb_blocks+1)
+            expected = has_overlap(firsts, nbs, starts, ends)
+            found = check_overlaps(firsts, nbs, starts, ends, task_ids, 1e-9)
+            self.assertEqual(len(found) > 0, expected)
+            nb_invalid += int(expected)
+        self.assertTrue(0 < nb_invalid < 300)
+
+    def test_too_many_cores(self):
+        schedule = make_valid_schedule()
+        # 4 cores from core 1 on need a fifth core
+        schedule.get_task_rects()[0].set_procs([ (1, 4) ])
+        self.assertProblem(validate_schedule(make_instance(), schedule), "invalid cores: 1 (task 2)")
+
+    def test_more_than_one_gpu(self):
+        schedule = make_valid_schedule()
+        schedule.get_task_rects()[3].set_procs([ (0, 2) ])
+        self.assertProblem(validate_schedule(make_instance(), schedule), "invalid GPU: 1 (task 4)")
+
+    def test_unknown_gpu(self):
+        schedule = make_valid_schedule()
+        schedule.get_task_rects()[3].set_procs([ (2, 1) ])
+        self.assertProblem(validate_schedule(make_instance(), schedule), "invalid GPU: 1 (task 4)")
+
+    def test_missing_and_repeated_task(self):
+        schedule = make_valid_schedule()
+        add_rect(schedule, 4, GPU, [ (0, 1) ], 0.0, 1.5)
+        problems = validate_schedule(make_instance(), schedule)
+        self.assertEqual(problems, [ "task scheduled more than once: 2 (task 4, 4)" ])
+
+        schedule = MoldSchedule(4, 2)
+        add_rect(schedule, 2, Core, [ (0, 4) ], 0.0, 2.0)
+        problems = validate_schedule(make_instance(), schedule)
+        self.assertEqual(problems, [ "task not scheduled: 3 (task 1, 3, 4)" ])
+
+    def test_wrong_duration(self):
+        schedule = make_valid_schedule()
+        # task 1 on 2 cores takes 2.0
+        schedule.get_task_rects()[1].set_times(2.0, 3.0)
+        self.assertProblem(validate_schedule(make_instance(), schedule), "duration does not match instance: 1 (task 1)")
+
+
+if __name__ == "__main__":
+    unittest.main()